@@ -0,0 +1,89 @@
+class AnnotationStyle:
+    """How click markers are drawn onto step screenshots."""
+
+    def __init__(self, radius=20, color=(255, 0, 0), ring=True, ring_width=2, fill=True,
+                 fill_alpha=64, crosshair=False, crosshair_length=10, step_badge=False,
+                 badge_radius=11):
+        self.radius = radius
+        self.color = color
+        self.ring = ring
+        self.ring_width = ring_width
+        self.fill = fill
+        self.fill_alpha = fill_alpha  # 64 = 25% opacity
+        self.crosshair = crosshair
+        self.crosshair_length = crosshair_length
+        self.step_badge = step_badge
+        self.badge_radius = badge_radius
+
+
+def annotate_image(image, x, y, style=None, step_number=None):
+    """Draws the click marker onto an in-memory image and returns it.
+
+    The image is modified in place through a single RGBA draw context, so the
+    caller can hand it straight to the encoder without a save/reopen round trip.
+    """
+    from PIL import ImageDraw
+    style = style or AnnotationStyle()
+    draw = ImageDraw.Draw(image, 'RGBA')
+    radius = style.radius
+    color = tuple(style.color)
+
+    # Semi-transparent fill first so the ring is drawn on top of it
+    if style.fill:
+        draw.ellipse([
+            (x - radius + 2, y - radius + 2),
+            (x + radius - 2, y + radius - 2)
+        ], fill=color + (style.fill_alpha,))
+
+    if style.ring:
+        draw.ellipse([
+            (x - radius, y - radius),
+            (x + radius, y + radius)
+        ], outline=color + (255,), width=style.ring_width)
+
+    if style.crosshair:
+        line_length = style.crosshair_length
+        draw.line([(x - line_length, y), (x + line_length, y)], fill=color + (255,), width=2)  # Horizontal
+        draw.line([(x, y - line_length), (x, y + line_length)], fill=color + (255,), width=2)  # Vertical
+
+    if style.step_badge and step_number is not None:
+        # Numbered badge sitting on the top-right edge of the ring
+        badge_x = x + radius
+        badge_y = y - radius
+        badge_radius = style.badge_radius
+        draw.ellipse([
+            (badge_x - badge_radius, badge_y - badge_radius),
+            (badge_x + badge_radius, badge_y + badge_radius)
+        ], fill=color + (255,))
+        draw.text((badge_x, badge_y), str(step_number), fill=(255, 255, 255, 255),
+                  font=_badge_font(badge_radius), anchor="mm")
+
+    return image
+
+
+def annotation_bounds(x, y, style=None, step_number=None):
+    """Box (left, top, right, bottom) that annotate_image can draw into, with a little slack."""
+    style = style or AnnotationStyle()
+    reach = style.radius + style.ring_width
+    if style.crosshair:
+        reach = max(reach, style.crosshair_length + 1)
+    left, top, right, bottom = x - reach, y - reach, x + reach, y + reach
+    if style.step_badge and step_number is not None:
+        # The badge is centred on the ring's top-right edge
+        top = min(top, y - style.radius - style.badge_radius)
+        right = max(right, x + style.radius + style.badge_radius)
+    return left - 2, top - 2, right + 3, bottom + 3
+
+
+_fonts = {}
+
+
+def _badge_font(badge_radius):
+    size = int(badge_radius * 1.2)
+    if size not in _fonts:
+        from PIL import ImageFont
+        try:
+            _fonts[size] = ImageFont.load_default(size=size)
+        except TypeError:  # Pillow < 10.1 has a single fixed-size default font
+            _fonts[size] = ImageFont.load_default()
+    return _fonts[size]
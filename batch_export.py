@@ -0,0 +1,197 @@
+"""Exports every recording session under a folder to PDF, without the GUI.
+
+Usage: python batch_export.py ROOT [--jobs 4] [--backend native] [--dpi 200]
+                              [--chunk-size 10] [--force] [--dry-run]
+
+A session is any folder with a journal.jsonl (or, for sessions recorded
+before the journal, an installation_steps_*.md), or a single-file session
+container (*.scribe, see container.py). Sessions whose PDF is newer than
+their journal and screenshots (or their container) are skipped unless --force is given, so
+re-running after recording a few new sessions only exports those. Sessions
+export in parallel, one per worker process.
+"""
+import argparse
+import fnmatch
+import glob
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from container import CONTAINER_SUFFIX, container_pdf_path
+from export import PDF_FILE_NAME, export_pdf
+from journal import JOURNAL_FILE_NAME
+from metrics import METRICS_FILE_NAME, SessionMetrics
+
+MARKDOWN_PATTERN = "installation_steps_*.md"
+
+
+class Session:
+    """A recording folder (or container) and the files its PDF is built from."""
+
+    def __init__(self, path):
+        self.path = path
+        self.container_file = path if path.endswith(CONTAINER_SUFFIX) else None
+        if self.container_file:
+            self.journal_file = self.markdown_file = None
+            self.pdf_file = container_pdf_path(path)
+            return
+        self.journal_file = os.path.join(path, JOURNAL_FILE_NAME)
+        if not os.path.exists(self.journal_file):
+            self.journal_file = None
+        markdown_files = sorted(glob.glob(os.path.join(glob.escape(path), MARKDOWN_PATTERN)))
+        self.markdown_file = markdown_files[-1] if markdown_files else None
+        self.pdf_file = os.path.join(path, PDF_FILE_NAME)
+
+    def input_mtime(self):
+        """Newest modification time of the journal (or markdown) and the screenshots."""
+        if self.container_file:
+            return os.path.getmtime(self.container_file)
+        newest = os.path.getmtime(self.journal_file or self.markdown_file)
+        screenshots_dir = os.path.join(self.path, "screenshots")
+        if os.path.isdir(screenshots_dir):
+            # Page-fit renditions live in subfolders and are outputs, so only files count
+            for entry in os.scandir(screenshots_dir):
+                if entry.is_file() and not entry.name.endswith(".part"):
+                    newest = max(newest, entry.stat().st_mtime)
+        return newest
+
+    def is_up_to_date(self):
+        return os.path.exists(self.pdf_file) and os.path.getmtime(self.pdf_file) >= self.input_mtime()
+
+
+def is_session_folder(files):
+    return JOURNAL_FILE_NAME in files or any(fnmatch.fnmatch(name, MARKDOWN_PATTERN) for name in files)
+
+
+def find_sessions(root):
+    """Finds the session folders under `root` (including `root` itself), sorted by path."""
+    sessions = []
+    for path, folders, files in os.walk(root):
+        if is_session_folder(files):
+            sessions.append(Session(path))
+            folders.clear()  # Sessions don't nest; skip screenshots/ and export/
+        else:
+            folders.sort()
+            sessions.extend(Session(os.path.join(path, name)) for name in files if name.endswith(CONTAINER_SUFFIX))
+    return sorted(sessions, key=lambda session: session.path)
+
+
+def export_session(path, journal_file, markdown_file, backend, image_dpi, chunk_size, workers):
+    """Exports one session. Runs in a worker process; returns (pdf_file, seconds)."""
+    started = time.perf_counter()
+    pdf_file = export_pdf(
+        path,
+        journal_file=journal_file,
+        markdown_file=markdown_file,
+        chunk_size=chunk_size,
+        workers=workers,
+        image_dpi=image_dpi,
+        backend=backend,
+        # Containers are read-only archives; their export metrics aren't kept
+        metrics=None if path.endswith(CONTAINER_SUFFIX) else SessionMetrics(os.path.join(path, METRICS_FILE_NAME)),
+    )
+    if pdf_file is None:
+        raise RuntimeError("wkhtmltopdf is not installed")
+    return pdf_file, time.perf_counter() - started
+
+
+def export_sessions(sessions, jobs=None, backend="wkhtmltopdf", image_dpi=200, chunk_size=10, progress=None):
+    """Exports `sessions` with up to `jobs` at once and returns the failed ones.
+
+    Each session is exported in its own worker process; with more than one
+    job, each export runs single-threaded so the sessions don't compete for
+    the same cores. `progress(done, total, session, seconds, error)` is called
+    as each session finishes.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    workers = 1 if jobs > 1 else None
+    failed = []
+
+    def finished(done, session, result=None, error=None):
+        if error is not None:
+            failed.append(session)
+        if progress:
+            progress(done, len(sessions), session, result[1] if result else None, error)
+
+    if jobs == 1 or len(sessions) == 1:
+        for done, session in enumerate(sessions, 1):
+            try:
+                result = export_session(session.path, session.journal_file, session.markdown_file,
+                                        backend, image_dpi, chunk_size, workers)
+            except Exception as e:
+                finished(done, session, error=e)
+            else:
+                finished(done, session, result)
+        return failed
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(sessions))) as executor:
+        futures = {executor.submit(export_session, session.path, session.journal_file, session.markdown_file,
+                                   backend, image_dpi, chunk_size, workers): session
+                   for session in sessions}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    finished(done, futures[future], error=e)
+                else:
+                    finished(done, futures[future], result)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    return failed
+
+
+def print_progress(done, total, session, seconds, error):
+    width = len(str(total))
+    if error is None:
+        print(f"[{done:>{width}}/{total}] {session.path}: exported in {seconds:.1f} s", flush=True)
+    else:
+        print(f"[{done:>{width}}/{total}] {session.path}: FAILED: {error}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="folder to search for recording sessions")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="sessions to export at once (default: one per CPU core)")
+    parser.add_argument("--backend", choices=("wkhtmltopdf", "native"), default="wkhtmltopdf")
+    parser.add_argument("--dpi", type=int, default=200,
+                        help="DPI of the embedded screenshots (0 embeds the originals)")
+    parser.add_argument("--chunk-size", type=int, default=10, help="steps per wkhtmltopdf chunk")
+    parser.add_argument("--force", action="store_true", help="export sessions that are up to date too")
+    parser.add_argument("--dry-run", action="store_true", help="only list the sessions that would be exported")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a folder")
+    sessions = find_sessions(args.root)
+    stale = sessions if args.force else [session for session in sessions if not session.is_up_to_date()]
+    print(f"{len(sessions)} sessions found, {len(sessions) - len(stale)} up to date, "
+          f"{len(stale)} to export", flush=True)
+    if args.dry_run:
+        for session in stale:
+            print(session.path)
+        return 0
+    if not stale:
+        return 0
+
+    started = time.perf_counter()
+    failed = export_sessions(stale, jobs=args.jobs, backend=args.backend, image_dpi=args.dpi or None,
+                             chunk_size=args.chunk_size, progress=print_progress)
+    print(f"{len(stale) - len(failed)} exported, {len(failed)} failed in "
+          f"{time.perf_counter() - started:.1f} s", flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # Required for process pool workers on Windows and in a frozen build
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Compares the old save/reopen/annotate/save path with in-memory annotation.
+
+Usage: python benchmarks/bench_annotation.py [--repeat N]
+"""
+import argparse
+import os
+import tempfile
+
+from common import RESOLUTIONS, synthetic_screenshot, timed
+
+from PIL import Image, ImageDraw
+
+from annotation import annotate_image
+
+
+def legacy_path(screenshot, path, x, y):
+    """The pre-pipeline behaviour: encode, decode, draw twice, encode again."""
+    screenshot.save(path, format='PNG', optimize=False, dpi=(600, 600))
+    image = Image.open(path)
+    draw = ImageDraw.Draw(image)
+    radius = 20
+    draw.ellipse([(x - radius, y - radius), (x + radius, y + radius)], outline="red", width=2)
+    draw_with_alpha = ImageDraw.Draw(image, 'RGBA')
+    draw_with_alpha.ellipse([(x - radius + 2, y - radius + 2), (x + radius - 2, y + radius - 2)],
+                            fill=(255, 0, 0, 64))
+    image.save(path)
+
+
+def in_memory_path(screenshot, path, x, y):
+    annotate_image(screenshot.copy(), x, y, step_number=1).save(
+        path, format='PNG', optimize=False, dpi=(600, 600))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "step.png")
+        print(f"{'resolution':<10} {'legacy ms':>10} {'in-memory ms':>13} {'speedup':>8}")
+        for name, (width, height) in RESOLUTIONS.items():
+            screenshot = synthetic_screenshot(width, height)
+            x, y = width // 2, height // 2
+            # The in-memory path copies the frame so both variants start from a clean image
+            legacy = timed(lambda: legacy_path(screenshot.copy(), path, x, y), args.repeat)
+            in_memory = timed(lambda: in_memory_path(screenshot, path, x, y), args.repeat)
+            print(f"{name:<10} {legacy:>10.1f} {in_memory:>13.1f} {legacy / in_memory:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Screen grab latency of each capture backend at 1080p, 1440p and 4K.
+
+Usage: python benchmarks/bench_capture.py [--repeat N] [--backend mss|pyautogui]
+
+Each region is anchored at the top-left of the virtual desktop. Regions
+larger than the desktop are still grabbed (the part outside comes back
+black), so the table notes how much of each one was real screen. Fresh
+allocations and grabs into a reused buffer are timed separately.
+"""
+import argparse
+
+from common import RESOLUTIONS, timed
+
+from PIL import Image
+
+from capture import CAPTURE_BACKENDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--backend", choices=CAPTURE_BACKENDS, action="append",
+                        help="backend to measure (repeatable, default: all available)")
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'size':<6} {'on screen':>9} {'fresh ms':>9} {'reused ms':>10}")
+    for name in args.backend or CAPTURE_BACKENDS:
+        try:
+            backend = CAPTURE_BACKENDS[name]()
+        except Exception as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+        left, top, desktop_width, desktop_height = backend.desktop()
+        for label, (width, height) in RESOLUTIONS.items():
+            visible = min(width, desktop_width) * min(height, desktop_height) / (width * height)
+            backend.grab(left, top, width, height)  # Warm-up
+            fresh = timed(lambda: backend.grab(left, top, width, height), args.repeat)
+            buffer = Image.new("RGB", (width, height))
+            reused = timed(lambda: backend.grab(left, top, width, height, into=buffer), args.repeat)
+            print(f"{name:<10} {label:<6} {visible:>8.0%} {fresh:>9.1f} {reused:>10.1f}")
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
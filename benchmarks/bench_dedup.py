@@ -0,0 +1,140 @@
+"""Bytes saved by frame dedup, and whether every rebuilt step matches the full recording.
+
+Usage: python benchmarks/bench_dedup.py [--steps 30] [--format png] [--size 1280x800] [--keep DIR]
+
+Replays one scripted session twice through the recorder, with dedup off and
+on: a wizard page whose checkbox gets ticked (a 45-pixel checkmark, with the
+click in the same place), a click on the unchanged page (a reference), then
+a progress bar growing a few pixels per step with the click moving between
+two buttons. The dedup session's steps are rebuilt with materialize_frames
+and compared with the screenshots recorded without dedup, as PNG. With a
+lossless format every step must match exactly; with a lossy one no step
+may be further off than the first step rebuilt from the same full frame,
+so the error doesn't grow along the delta chain (exit status 1 otherwise).
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from common import synthetic_screenshot
+from PIL import Image, ImageDraw
+
+from dedup import materialize_frames
+from encoders import ENCODER_PROFILES
+from journal import read_journal, resolve_image_path
+from recorder import InstallationRecorder
+from replay import ReplayDriver, replay_providers
+
+CHECKBOX = (80, 300, 100, 320)
+
+
+def build_frames(folder, steps, size):
+    """Writes the frames and returns the script that clicks through them."""
+    width, height = size
+    page = synthetic_screenshot(width, height, seed=1)
+    draw = ImageDraw.Draw(page)
+    draw.rectangle(CHECKBOX, fill=(255, 255, 255), outline=(0, 0, 0))
+    draw.rectangle([80, 400, width - 80, 420], fill=(255, 255, 255), outline=(0, 0, 0))
+    ticked = page.copy()
+    # A checkmark of 45 pixels: two short strokes, two pixels wide
+    ImageDraw.Draw(ticked).line([(84, 310), (88, 315), (96, 303)], fill=(0, 0, 0), width=2)
+    checked = np.count_nonzero(np.any(np.asarray(ticked) != np.asarray(page), axis=2))
+
+    frames = [page, ticked, ticked]
+    clicks = [(90, 310), (90, 310), (90, 310)]
+    for index in range(steps - len(frames)):
+        frame = ticked.copy()
+        ImageDraw.Draw(frame).rectangle([81, 401, 81 + 3 * (index + 1), 419], fill=(40, 160, 40))
+        frames.append(frame)
+        clicks.append((width - 190, height - 35) if index % 2 else (width - 295, height - 35))
+
+    os.makedirs(folder, exist_ok=True)
+    script = [{"type": "window", "title": "Setup Wizard", "left": 0, "top": 0, "width": width, "height": height}]
+    for index, (frame, (x, y)) in enumerate(zip(frames, clicks)):
+        path = os.path.join(folder, f"frame_{index}.png")
+        frame.save(path)
+        script.append({"type": "frame", "image": path})
+        script.append({"type": "click", "x": x, "y": y})
+    return script, checked
+
+
+def record(parent, script, image_format, dedup):
+    recorder = InstallationRecorder(providers=replay_providers())
+    recorder.image_format = image_format
+    recorder.dedup_frames = dedup
+    recorder.ocr_cache_persist = False
+    recorder.search_index = False
+    recorder.set_working_directory(parent)
+    recorder.start_recording(listeners=False)
+    ReplayDriver(recorder).run(script)
+    recorder.stop_recording()
+    return recorder.journal_file
+
+
+def stored_bytes(journal_file):
+    session_dir = os.path.dirname(journal_file)
+    screenshots = os.path.join(session_dir, "screenshots")
+    return sum(entry.stat().st_size for entry in os.scandir(screenshots) if entry.is_file())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--format", default="png", choices=ENCODER_PROFILES)
+    parser.add_argument("--size", default="1280x800")
+    parser.add_argument("--keep", help="record into this folder and keep it")
+    args = parser.parse_args()
+    # OCR isn't what's measured; without Tesseract every step would log an error
+    logging.basicConfig(level=logging.CRITICAL)
+
+    size = tuple(int(value) for value in args.size.split("x"))
+    root = args.keep or tempfile.mkdtemp(prefix="screenscribe-dedup-")
+    try:
+        script, checked = build_frames(os.path.join(root, "frames"), max(args.steps, 4), size)
+        lossless = not ENCODER_PROFILES[args.format]().lossy
+        exact = record(os.path.join(root, "exact"), script, "png", dedup=False)
+        full = exact if args.format == "png" else record(os.path.join(root, "full"), script, args.format,
+                                                         dedup=False)
+        deduped = record(os.path.join(root, "dedup"), script, args.format, dedup=True)
+        full_bytes, dedup_bytes = stored_bytes(full), stored_bytes(deduped)
+        materialize_frames(deduped)
+
+        print(f"checkmark: {checked} pixels, format: {args.format}\n")
+        print(f"{'step':>4} {'stored as':<10} {'differing px':>12} {'mean error':>11}")
+        failed = 0
+        chain_error = None
+        for expected, event in zip(read_journal(exact), read_journal(deduped)):
+            if event.get("type") != "step":
+                continue
+            with Image.open(resolve_image_path(expected, os.path.dirname(exact))) as image:
+                a = np.asarray(image.convert("RGB"), dtype=np.int16)
+            with Image.open(resolve_image_path(event, os.path.dirname(deduped))) as image:
+                b = np.asarray(image.convert("RGB"), dtype=np.int16)
+            differing = int(np.count_nonzero(np.any(a != b, axis=2)))
+            error = float(np.abs(a - b).mean())
+            mode = (event.get("dedup") or {}).get("mode", "full")
+            if mode == "full":
+                chain_error = None
+            elif chain_error is None:
+                chain_error = error
+            # Rounding in the encoder may shift the error a little either way
+            flag = "  MISMATCH" if (differing if lossless else error > 1.02 * (chain_error or error)) else ""
+            failed += bool(flag)
+            print(f"{event['step']:>4} {mode:<10} {differing:>12} {error:>11.3f}{flag}")
+        print(f"\nstored {dedup_bytes / 1024:.0f} KiB with dedup, {full_bytes / 1024:.0f} KiB without "
+              f"({100 - 100 * dedup_bytes / full_bytes:.0f}% saved)")
+        if failed:
+            print(f"{failed} rebuilt steps differ from the recording")
+            return 1
+        return 0
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Encode time and bytes per step for every screenshot encoder profile.
+
+Usage: python benchmarks/bench_encoders.py [--repeat N] [--quality Q] [--max-bytes B]
+"""
+import argparse
+
+from common import RESOLUTIONS, synthetic_screenshot, timed
+
+from encoders import ENCODER_PROFILES, create_encoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--max-bytes", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'resolution':<10} {'profile':<14} {'encode ms':>10} {'KiB/step':>10} {'quality':>8}")
+    for name, (width, height) in RESOLUTIONS.items():
+        screenshot = synthetic_screenshot(width, height)
+        for profile in ENCODER_PROFILES:
+            encoder = create_encoder(profile, args.quality, args.max_bytes)
+            encoded = encoder.encode(screenshot)
+            elapsed = timed(lambda: encoder.encode(screenshot), args.repeat)
+            quality = encoded.quality if encoded.quality is not None else "-"
+            flag = " over budget" if encoded.over_budget else ""
+            print(f"{name:<10} {profile:<14} {elapsed:>10.1f} {len(encoded.data) / 1024:>10.1f} {quality:>8}{flag}")
+
+
+if __name__ == "__main__":
+    main()
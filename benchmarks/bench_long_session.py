@@ -0,0 +1,144 @@
+"""Peak RSS of the export stages against session length, from 100 to 10,000 steps.
+
+Usage: python benchmarks/bench_long_session.py [--steps 100 1000 3000 10000] [--chunk-size 10]
+                                               [--baseline] [--max-growth 32] [--keep DIR]
+
+Every stage runs in a fresh process per session length:
+  html   journal -> markdown sections -> HTML, chunk by chunk, as export_pdf
+         feeds wkhtmltopdf (the chunks are written to a file here)
+  merge  concatenating one fragment PDF per chunk into the final PDF
+With --baseline the whole-document versions run too: one markdown string
+rendered to one HTML string, and the fragments merged with pypdf's
+PdfWriter. Screenshots aren't read by these stages, so the sessions are
+journals only; the merge fragments are the same native PDF of one chunk.
+Exits with status 1 when a streaming stage's peak grows by more than
+--max-growth MiB between the shortest and the longest session.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from common import build_synthetic_session, peak_rss_mb
+
+
+def write_journal(session_dir, steps):
+    """A journal-only session with some typing and keys between the steps."""
+    os.makedirs(session_dir, exist_ok=True)
+    journal_file = os.path.join(session_dir, "journal.jsonl")
+    with open(journal_file, "w", encoding="utf-8") as f:
+        for step in range(1, steps + 1):
+            f.write(json.dumps({
+                "type": "step", "step": step, "time": step, "window_title": f"Setup Wizard - page {step % 7}",
+                "x": 600, "y": 400, "clicked_text": "Next >", "typed_text": "",
+                "image": f"screenshots/step_{step}.png",
+            }) + "\n")
+            if step % 3 == 0:
+                f.write(json.dumps({"type": "typed", "time": step, "text": "C:\\Program Files\\Example"}) + "\n")
+                f.write(json.dumps({"type": "key", "time": step, "key": "Tab", "count": 2}) + "\n")
+    return journal_file
+
+
+def html_streamed(journal_file, output, chunk_size):
+    from export import chunk_html, section_chunks, session_sections
+
+    with open(output, "w", encoding="utf-8") as f:
+        for chunk in section_chunks(session_sections(journal_file), chunk_size):
+            f.write(chunk_html(chunk))
+
+
+def html_whole(journal_file, output, chunk_size):
+    from export import CSS
+    from journal import render_markdown
+    from markdown2 import markdown
+
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(CSS + markdown(render_markdown(journal_file)))
+
+
+def merge_streamed(fragments, output):
+    from export import merge_pdfs
+
+    merge_pdfs(fragments, output)
+
+
+def merge_whole(fragments, output):
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for fragment in fragments:
+        writer.append(fragment)
+    with open(output, "wb") as f:
+        writer.write(f)
+
+
+def run_stage(stage, journal_file, fragment, steps, chunk_size, output, results):
+    started = time.perf_counter()
+    if stage.startswith("html"):
+        (html_streamed if stage == "html" else html_whole)(journal_file, output, chunk_size)
+    else:
+        fragments = [fragment] * -(-steps // chunk_size)
+        (merge_streamed if stage == "merge" else merge_whole)(fragments, output)
+    elapsed = time.perf_counter() - started
+    results.put((elapsed, peak_rss_mb()[0], os.path.getsize(output)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, nargs="+", default=[100, 1000, 3000, 10000])
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument("--baseline", action="store_true", help="also run the whole-document versions")
+    parser.add_argument("--max-growth", type=float, default=32, help="MiB")
+    parser.add_argument("--keep", help="build the sessions in this folder and keep them")
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="screenscribe-long-")
+    os.makedirs(root, exist_ok=True)
+    from native_pdf import export_native_pdf
+    chunk_dir = os.path.join(root, "chunk")
+    fragment = export_native_pdf(build_synthetic_session(chunk_dir, args.chunk_size, size=(1280, 720)),
+                                 os.path.join(root, "fragment.pdf"), workers=1)
+    print(f"fragment: {args.chunk_size} steps, {os.path.getsize(fragment) / 1024:.0f} KiB")
+
+    stages = ["html", "merge"]
+    if args.baseline:
+        stages = ["html", "html-whole", "merge", "merge-whole"]
+    context = multiprocessing.get_context("spawn")
+    peaks = {}
+    print(f"\n{'stage':<12} {'steps':>6} {'wall s':>8} {'peak RSS MiB':>13} {'output MiB':>11}")
+    try:
+        for steps in sorted(args.steps):
+            journal_file = write_journal(os.path.join(root, f"session-{steps}"), steps)
+            for stage in stages:
+                output = os.path.join(root, f"{stage}-{steps}" + (".html" if stage.startswith("html") else ".pdf"))
+                results = context.Queue()
+                process = context.Process(target=run_stage, args=(stage, journal_file, fragment, steps,
+                                                                  args.chunk_size, output, results))
+                process.start()
+                elapsed, peak, size = results.get()
+                process.join()
+                os.remove(output)
+                peaks.setdefault(stage, []).append(peak)
+                print(f"{stage:<12} {steps:>6} {elapsed:>8.2f} {peak:>13.0f} {size / 1024 / 1024:>11.1f}",
+                      flush=True)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print()
+    over = False
+    for stage in ("html", "merge"):
+        growth = peaks[stage][-1] - peaks[stage][0]
+        result = "ok" if growth <= args.max_growth else "OVER BUDGET"
+        over = over or growth > args.max_growth
+        print(f"{stage:<12} peak grew {growth:.0f} MiB from {min(args.steps)} to {max(args.steps)} steps "
+              f"(budget {args.max_growth:.0f})  {result}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
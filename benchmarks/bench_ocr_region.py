@@ -0,0 +1,136 @@
+"""Fixed vs adaptive OCR click regions on synthetic installer windows.
+
+Usage: python benchmarks/bench_ocr_region.py [--repeat 20] [--ocr]
+
+Draws a light and a dark themed wizard page (plain, filled and wide
+buttons, a checkbox caption, a wrapped paragraph, a text field clicked on
+its caret) and clicks each element.
+For both region modes it reports the pixels sent to OCR, the time to crop
+and binarize, and how much of the element's label the crop covers. With
+--ocr (needs Tesseract) it also OCRs each crop and checks the label was read.
+"""
+import argparse
+
+from common import timed
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr import crop_click_region, get_ocr_engine, recognize_crop
+
+THEMES = {
+    "light": {"background": (240, 240, 240), "text": (0, 0, 0), "border": (120, 120, 120)},
+    "dark": {"background": (32, 32, 36), "text": (220, 220, 220), "border": (90, 90, 96)},
+}
+
+
+def wizard_page(theme, size=(1024, 640)):
+    """Returns the page and a list of (label, click point, label box)."""
+    colors = THEMES[theme]
+    image = Image.new("RGB", size, colors["background"])
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=15)
+    except TypeError:  # Pillow < 10.1
+        font = ImageFont.load_default()
+    elements = []
+
+    def label(text, left, top, color=None):
+        draw.text((left, top), text, fill=color or colors["text"], font=font)
+        return draw.textbbox((left, top), text, font=font)
+
+    def button(text, left, top, width, fill=None, color=None):
+        draw.rectangle([left, top, left + width, top + 32], fill=fill or colors["background"],
+                       outline=colors["border"])
+        text_width = draw.textlength(text, font=font)
+        box = label(text, left + (width - text_width) / 2, top + 7, color)
+        elements.append((text, (left + width // 2, top + 16), box))
+
+    draw.rectangle([0, 0, size[0], 36], fill=(30, 30, 60))
+    label("Setup - Example Application", 12, 10, (255, 255, 255))
+    paragraph = ["Please read the following License Agreement. You must accept the terms",
+                 "of this agreement before continuing with the installation."]
+    first = label(paragraph[0], 40, 80)
+    last = label(paragraph[1], 40, 100)
+    elements.append((" ".join(paragraph), (220, 88), (first[0], first[1], max(first[2], last[2]), last[3])))
+    draw.rectangle([40, 300, 54, 314], outline=colors["text"])
+    caption = label("I accept the agreement", 62, 298)
+    elements.append(("I accept the agreement", (47, 307), (40, 300, caption[2], caption[3])))
+    button("Install for all users of this computer (recommended)", 40, 360, 440)
+    # A text field clicked on its caret: a 2 px solid bar with no inside of its own
+    draw.rectangle([40, 440, 480, 470], fill=colors["background"], outline=colors["border"])
+    path = label("C:\\Program Files\\Example", 46, 447)
+    draw.rectangle([path[2] + 2, 444, path[2] + 3, 466], fill=colors["text"])
+    elements.append(("C:\\Program Files\\Example", (path[2] + 3, 455), path))
+    draw.line([0, 560, size[0], 560], fill=colors["border"])
+    button("< Back", 680, 580, 100)
+    button("Next >", 790, 580, 100, fill=(0, 90, 200), color=(255, 255, 255))
+    button("Cancel", 900, 580, 100)
+    return image, elements
+
+
+def coverage(region, box):
+    """Fraction of the label box inside the region."""
+    left, top, right, bottom = box
+    inside = (max(0, min(right, region[2]) - max(left, region[0]))
+              * max(0, min(bottom, region[3]) - max(top, region[1])))
+    return inside / ((right - left) * (bottom - top))
+
+
+def crop_bounds(page, x, y, mode):
+    """Locates the crop on the page by matching it back, for the coverage figure."""
+    if mode == "fixed":
+        return max(0, x - 50), max(0, y - 50), min(page.width, x + 50), min(page.height, y + 50)
+    from ocr import SEARCH_MARGIN, find_click_region
+    import numpy as np
+    left, top = max(0, x - SEARCH_MARGIN[0]), max(0, y - SEARCH_MARGIN[1])
+    gray = np.asarray(page.crop((left, top, min(page.width, x + SEARCH_MARGIN[0]),
+                                 min(page.height, y + SEARCH_MARGIN[1]))).convert("L"))
+    box = find_click_region(gray, x - left, y - top)
+    if box is None:
+        return crop_bounds(page, x, y, "fixed")
+    return box[0] + left, box[1] + top, box[2] + left, box[3] + top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--ocr", action="store_true", help="also OCR the crops (needs Tesseract)")
+    args = parser.parse_args()
+    engine = get_ocr_engine() if args.ocr else None
+
+    print(f"{'theme':<6} {'element':<28} {'mode':<9} {'pixels':>8} {'ms':>6} {'label':>6}"
+          + ("  read" if engine else ""))
+    totals = {}
+    for theme in THEMES:
+        page, elements = wizard_page(theme)
+        for text, (x, y), box in elements:
+            for mode in ("fixed", "adaptive"):
+                crop = crop_click_region(page, x, y, mode)
+                milliseconds = timed(lambda: crop_click_region(page, x, y, mode), args.repeat)
+                covered = coverage(crop_bounds(page, x, y, mode), box)
+                pixels = crop.width * crop.height
+                total = totals.setdefault(mode, [0, 0.0, 0.0, 0])
+                total[0] += pixels
+                total[1] += milliseconds
+                total[2] += covered
+                line = (f"{theme:<6} {text[:28]:<28} {mode:<9} {pixels:>8} {milliseconds:>6.2f} "
+                        f"{covered:>6.0%}")
+                if engine:
+                    read = recognize_crop(crop, engine) or ""
+                    correct = " ".join(read.split()).lower() == text.lower()
+                    total[3] += correct
+                    line += f"  {'ok' if correct else repr(read[:30])}"
+                print(line)
+
+    clicks = sum(len(wizard_page(theme)[1]) for theme in THEMES)
+    print()
+    for mode, (pixels, milliseconds, covered, correct) in totals.items():
+        summary = (f"{mode:<9} {pixels / clicks:>8.0f} px/click {milliseconds / clicks:>6.2f} ms/click "
+                   f"{covered / clicks:>5.0%} of each label")
+        if engine:
+            summary += f", {correct}/{clicks} read correctly"
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
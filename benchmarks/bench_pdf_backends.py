@@ -0,0 +1,79 @@
+"""Wall time and peak RSS of the wkhtmltopdf and native PDF backends on a synthetic session.
+
+Usage: python benchmarks/bench_pdf_backends.py [--steps 500] [--keep DIR]
+
+Each backend runs in a fresh process with an empty export cache, so the
+page-fit image stage is included in both timings.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from common import build_synthetic_session, peak_rss_mb
+
+
+def clear_export_cache(session_dir):
+    for path in (os.path.join(session_dir, "export"),
+                 *[os.path.join(session_dir, "screenshots", name)
+                   for name in os.listdir(os.path.join(session_dir, "screenshots"))
+                   if name.startswith("page_")]):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def run_backend(session_dir, backend, results):
+    from export import export_pdf
+
+    started = time.perf_counter()
+    pdf_file = export_pdf(session_dir, journal_file=os.path.join(session_dir, "journal.jsonl"),
+                          backend=backend)
+    elapsed = time.perf_counter() - started
+    own, children = peak_rss_mb()
+    size = os.path.getsize(pdf_file) if pdf_file else None
+    results.put((elapsed, own, children, size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--keep", help="build the session in this folder and keep it")
+    args = parser.parse_args()
+
+    session_dir = args.keep or tempfile.mkdtemp(prefix="screenscribe-bench-")
+    os.makedirs(session_dir, exist_ok=True)
+    print(f"Building a {args.steps}-step session in {session_dir}...")
+    build_synthetic_session(session_dir, args.steps)
+
+    from export import find_wkhtmltopdf
+    backends = ["native"]
+    if find_wkhtmltopdf():
+        backends.insert(0, "wkhtmltopdf")
+    else:
+        print("wkhtmltopdf not installed, only benchmarking the native backend")
+
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for backend in backends:
+        clear_export_cache(session_dir)
+        results = context.Queue()
+        process = context.Process(target=run_backend, args=(session_dir, backend, results))
+        process.start()
+        rows.append((backend, *results.get()))
+        process.join()
+
+    def mib(value):
+        return f"{value:.0f}" if value is not None else "n/a"
+
+    print(f"\n{'backend':<12} {'wall s':>8} {'peak RSS MiB':>13} {'child peak MiB':>15} {'PDF MiB':>8}")
+    for backend, elapsed, own, children, size in rows:
+        print(f"{backend:<12} {elapsed:>8.1f} {mib(own):>13} {mib(children):>15} "
+              f"{mib(size / 1024 / 1024 if size else None):>8}")
+
+    if not args.keep:
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Replays a synthetic session through the recorder headlessly and reports throughput.
+
+Usage: python benchmarks/bench_replay.py [--steps 100] [--resolution 1080p]
+                                          [--workers 2] [--mode thread] [--script FILE]
+
+Reports events per second, per-step latency percentiles for every stage
+(listener handlers, capture, resize, OCR, annotate, encode, journal write,
+markdown and PDF export) and the bytes each stage wrote. No display, input
+hooks or wkhtmltopdf are needed; the PDF is built with the native backend.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from common import RESOLUTIONS, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--resolution", choices=RESOLUTIONS, default="1080p")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--script", help="replay this JSONL script instead of a synthetic one")
+    parser.add_argument("--keep", help="record into this folder and keep it")
+    args = parser.parse_args()
+
+    from export import export_pdf
+    from journal import write_markdown
+    from recorder import InstallationRecorder
+    from replay import ReplayDriver, replay_providers, synthetic_script
+
+    parent = args.keep or tempfile.mkdtemp(prefix="screenscribe-replay-")
+    recorder = InstallationRecorder(providers=replay_providers())
+    recorder.worker_count = args.workers
+    recorder.worker_mode = args.mode
+    recorder.ocr_cache_persist = False
+    recorder.set_working_directory(parent)
+
+    samples = {}
+
+    def collect(result):
+        for stage, seconds in result.timings.items():
+            samples.setdefault(stage, []).append(seconds)
+
+    script = args.script or synthetic_script(args.steps, RESOLUTIONS[args.resolution])
+    recorder.start_recording(listeners=False)
+    recorder.pipeline.on_step = collect
+    driver = ReplayDriver(recorder)
+    started = time.perf_counter()
+    driver.run(script)
+    handlers_done = time.perf_counter() - started
+    pipeline = recorder.pipeline
+    recorder.stop_recording()  # Drains the pipeline and writes the markdown
+    drained = time.perf_counter() - started
+    samples["click handler"] = driver.latencies["click"]
+    samples["key handler"] = driver.latencies["key"]
+
+    started = time.perf_counter()
+    write_markdown(recorder.journal_file, recorder.markdown_file)
+    samples["markdown"] = [time.perf_counter() - started]
+    started = time.perf_counter()
+    pdf_file = export_pdf(recorder.working_directory, journal_file=recorder.journal_file,
+                          markdown_file=recorder.markdown_file, backend="native")
+    samples["pdf export"] = [time.perf_counter() - started]
+
+    print(f"\n{driver.events} events in {handlers_done:.2f} s through the handlers "
+          f"({driver.events / handlers_done:.0f} events/s), {drained:.2f} s until the last step was written "
+          f"({pipeline.written_steps / drained:.1f} steps/s, {pipeline.dropped} dropped with the pipeline full)")
+    print(f"\n{'stage':<14} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, values in samples.items():
+        if not values:
+            continue
+        print(f"{stage:<14} {len(values):>6} " + " ".join(
+            f"{percentile(values, fraction) * 1000:>9.1f}" for fraction in (0.5, 0.95, 0.99, 1.0)))
+
+    def size(path):
+        return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+    print(f"\n{'output':<14} {'KiB':>10}")
+    for label, written in (("images", pipeline.image_bytes), ("journal", size(recorder.journal_file)),
+                           ("markdown", size(recorder.markdown_file)), ("pdf", size(pdf_file))):
+        print(f"{label:<14} {written / 1024:>10.1f}")
+
+    if not args.keep:
+        shutil.rmtree(parent, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Search index build, update and query times over many synthetic sessions.
+
+Usage: python benchmarks/bench_search.py [--sessions 10000] [--steps 20] [--queries 200] [--keep DIR]
+
+Writes journal-only session folders (no screenshots are needed to index)
+with window titles, clicked text, typing and clipboard events drawn from a
+vocabulary of installer words plus a rare word per session. Reports the
+time to backfill them all, to re-run the backfill with nothing changed and
+with one session grown by an event, the index size, and query latency percentiles for
+common words, rare words, prefixes and restricted fields.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from common import percentile
+
+from search import INDEX_FILE_NAME, SearchIndex
+
+WORDS = ("Next", "Back", "Cancel", "Install", "Finish", "Browse", "License", "Agreement", "accept", "Options",
+         "Components", "Destination", "Folder", "Shortcut", "Desktop", "Start", "Menu", "Ready", "Completing",
+         "Setup", "Wizard", "Update", "Driver", "Runtime", "Service", "Port", "Database", "Password", "Proxy")
+PRODUCTS = ("Example", "Contoso", "Fabrikam", "Northwind", "Tailspin", "Litware", "Adatum", "Wingtip")
+
+
+def write_session(directory, steps, rng, session):
+    os.makedirs(directory, exist_ok=True)
+    product = rng.choice(PRODUCTS)
+    with open(os.path.join(directory, "journal.jsonl"), "w", encoding="utf-8") as f:
+        for step in range(1, steps + 1):
+            f.write(json.dumps({
+                "type": "step", "step": step, "time": step,
+                "window_title": f"{product} {rng.choice(WORDS)} Setup", "x": 600, "y": 400,
+                "clicked_text": " ".join(rng.sample(WORDS, 2)),
+                "typed_text": f"C:\\Program Files\\{product}" if step % 7 == 0 else "",
+                "image": f"screenshots/step_{step}.png",
+            }) + "\n")
+            if step % 5 == 0:
+                f.write(json.dumps({"type": "typed", "time": step, "text": f"serial{session:05d}"}) + "\n")
+            if step % 9 == 0:
+                f.write(json.dumps({"type": "clipboard", "time": step, "action": "paste",
+                                    "text": f"{product} licence key {rng.randrange(10 ** 8)}"}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind")
+    parser.add_argument("--keep", help="build the sessions in this folder and keep them")
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="screenscribe-search-")
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for session in range(args.sessions):
+        write_session(os.path.join(root, f"session-{session:05d}"), args.steps, rng, session)
+    print(f"wrote {args.sessions} sessions x {args.steps} steps in {time.perf_counter() - started:.1f} s")
+
+    try:
+        with SearchIndex(os.path.join(root, INDEX_FILE_NAME)) as index:
+            for label in ("backfill", "unchanged"):
+                started = time.perf_counter()
+                seen, updated, events = index.backfill(root)
+                print(f"{label:<10} {time.perf_counter() - started:>7.2f} s  {updated} sessions, {events} events")
+            with open(os.path.join(root, "session-00000", "journal.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"type": "typed", "time": 0, "text": "typed after the last backfill"}) + "\n")
+            started = time.perf_counter()
+            seen, updated, events = index.backfill(root)
+            print(f"{'one grew':<10} {time.perf_counter() - started:>7.2f} s  {updated} sessions, {events} events")
+            stats = index.stats()
+            size = sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root)
+                       if name.startswith(INDEX_FILE_NAME))
+            print(f"index      {size / 1024 / 1024:>7.1f} MiB  {stats['documents']} entries")
+
+            queries = {
+                "common word": lambda: (rng.choice(WORDS), None, False),
+                "two words": lambda: (" ".join(rng.sample(WORDS, 2)), None, False),
+                "rare word": lambda: (f"serial{rng.randrange(args.sessions):05d}", None, False),
+                "prefix": lambda: (rng.choice(WORDS)[:3].lower() + "*", None, True),
+                "window only": lambda: (rng.choice(PRODUCTS), ("window",), False),
+            }
+            print()
+            print(f"{'query':<12} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'hits':>6}")
+            for name, make in queries.items():
+                times = []
+                hits = 0
+                for _ in range(args.queries):
+                    words, kinds, raw = make()
+                    started = time.perf_counter()
+                    hits += len(index.search(words, 20, kinds, raw))
+                    times.append((time.perf_counter() - started) * 1000)
+                print(f"{name:<12} {percentile(times, 0.5):>8.2f} {percentile(times, 0.95):>8.2f} "
+                      f"{max(times):>8.2f} {hits / args.queries:>6.1f}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cold-start time of the recorder core and the GUI, checked against a budget.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--core-budget 120] [--gui-budget 300]
+
+Each measurement runs in a fresh interpreter: "core" imports recorder.py
+(what headless tools and the batch exporter pay), "gui" imports gui.py and
+builds the window up to its first paint (what a user waits for after
+launching main.py). Without a display the GUI figure covers the import only.
+Interpreter startup itself is not counted. The heavy dependencies that
+must stay lazy are listed if either start loaded them. Exits with status 1
+when a median is over budget or a heavy module was loaded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import percentile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once recording starts or a PDF is exported
+HEAVY_MODULES = ("PIL", "numpy", "pdfkit", "markdown2", "pypdf", "pynput", "pyautogui", "pyperclip",
+                 "pytesseract", "tesserocr", "mss", "pipeline", "processing", "capture")
+
+CORE = """
+import recorder
+"""
+
+GUI = """
+import gui
+try:
+    root = gui.build_window()
+    root.update()
+    shown = True
+except gui.tk.TclError:  # No display
+    shown = False
+"""
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy, "shown": globals().get("shown")}}))
+"""
+
+
+def measure(code):
+    probe = PROBE.format(repo=REPO, code=code.strip(), heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True,
+                            cwd=REPO).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--core-budget", type=float, default=120, help="milliseconds")
+    parser.add_argument("--gui-budget", type=float, default=300, help="milliseconds")
+    args = parser.parse_args()
+
+    over = False
+    print(f"{'start':<6} {'p50 ms':>8} {'max ms':>8} {'budget':>8}  result")
+    for name, code, budget in (("core", CORE, args.core_budget), ("gui", GUI, args.gui_budget)):
+        runs = [measure(code) for _ in range(args.repeat)]
+        times = sorted(run["ms"] for run in runs)
+        heavy = runs[-1]["heavy"]
+        median = percentile(times, 0.5)
+        result = "ok" if median <= budget and not heavy else "OVER BUDGET"
+        if heavy:
+            result += f" (loaded {', '.join(heavy)})"
+        if name == "gui" and not runs[-1]["shown"]:
+            result += " (no display, import only)"
+        over = over or not result.startswith("ok")
+        print(f"{name:<6} {median:>8.1f} {times[-1]:>8.1f} {budget:>8.0f}  {result}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
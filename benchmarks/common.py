@@ -0,0 +1,111 @@
+"""Shared helpers for the benchmark scripts in this folder."""
+import os
+import random
+import sys
+import time
+
+# Make the repository modules importable when running `python benchmarks/<script>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4K": (3840, 2160),
+}
+
+
+def synthetic_screenshot(width, height, seed=0):
+    """Builds a screenshot-like image: flat panels, buttons and text-ish strokes.
+
+    Random noise would be far harder to compress than a real UI, so the image is
+    made of the same kind of large flat areas a desktop window has.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 32], fill=(30, 30, 60))
+    for _ in range(40):
+        left = rng.randrange(0, width - 200)
+        top = rng.randrange(40, height - 60)
+        shade = rng.randrange(180, 255)
+        draw.rectangle([left, top, left + rng.randrange(80, 400), top + rng.randrange(24, 160)],
+                       fill=(shade, shade, 255), outline=(90, 90, 90))
+    for _ in range(300):
+        left = rng.randrange(0, width - 120)
+        top = rng.randrange(40, height - 20)
+        draw.text((left, top), "Lorem ipsum %d" % rng.randrange(1000), fill=(20, 20, 20))
+    return image
+
+
+def timed(func, repeat):
+    """Runs func `repeat` times and returns the mean wall time in milliseconds."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None if it's empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children, in MiB.
+
+    Child figures are the largest single child (wkhtmltopdf, pool workers),
+    not a sum. Returns (self, children); children is None where unsupported.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024, None
+        except ImportError:
+            return None, None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+    return own, children
+
+
+def build_synthetic_session(directory, steps, size=(1920, 1080), distinct_frames=8):
+    """Writes a journal plus one screenshot file per step, like a recorded session.
+
+    Only `distinct_frames` images are generated; the rest are byte copies so
+    building a large session stays quick. Returns the journal path.
+    """
+    import json
+    import shutil
+
+    screenshots_dir = os.path.join(directory, "screenshots")
+    os.makedirs(screenshots_dir, exist_ok=True)
+    templates = []
+    for index in range(distinct_frames):
+        path = os.path.join(screenshots_dir, f"template_{index}.png")
+        synthetic_screenshot(*size, seed=index).save(path, compress_level=1)
+        templates.append(path)
+
+    journal_file = os.path.join(directory, "journal.jsonl")
+    with open(journal_file, "w", encoding="utf-8") as f:
+        for step in range(1, steps + 1):
+            image = os.path.join("screenshots", f"step_{step}.png")
+            shutil.copyfile(templates[step % distinct_frames], os.path.join(directory, image))
+            f.write(json.dumps({
+                "type": "step", "step": step, "time": step, "window_title": f"Setup Wizard - page {step % 7}",
+                "x": 600, "y": 400, "image_x": 600, "image_y": 400,
+                "clicked_text": "Next >", "typed_text": "C:\\Program Files\\Example" if step % 5 == 0 else "",
+                "image": image,
+            }) + "\n")
+            if step % 3 == 0:
+                f.write(json.dumps({"type": "key", "key": "Tab"}) + "\n")
+    for path in templates:
+        os.remove(path)
+    return journal_file
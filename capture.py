@@ -0,0 +1,150 @@
+import logging
+import threading
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureBackend:
+    """Grabs regions of the virtual desktop (all monitors, in desktop coordinates).
+
+    grab() returns an RGB image of exactly the requested size. Parts of the
+    region outside every monitor (a maximized window's hidden border, say)
+    come back black instead of failing the grab. Passing `into`, an RGB image
+    of the region's size, reuses that buffer instead of allocating a new one,
+    which is what the continuous capture loop does.
+    """
+
+    name = None
+
+    def desktop(self):
+        """(left, top, width, height) of the virtual desktop."""
+        raise NotImplementedError
+
+    def grab(self, left, top, width, height, into=None):
+        desktop_left, desktop_top, desktop_width, desktop_height = self.desktop()
+        clipped_left = max(left, desktop_left)
+        clipped_top = max(top, desktop_top)
+        clipped_right = min(left + width, desktop_left + desktop_width)
+        clipped_bottom = min(top + height, desktop_top + desktop_height)
+        if (clipped_left, clipped_top, clipped_right, clipped_bottom) == (left, top, left + width, top + height):
+            return self._grab(left, top, width, height, into)
+        canvas = into if into is not None else Image.new("RGB", (width, height))
+        canvas.paste((0, 0, 0), (0, 0, width, height))
+        if clipped_right > clipped_left and clipped_bottom > clipped_top:
+            part = self._grab(clipped_left, clipped_top, clipped_right - clipped_left,
+                              clipped_bottom - clipped_top, None)
+            canvas.paste(part, (clipped_left - left, clipped_top - top))
+        return canvas
+
+    def _grab(self, left, top, width, height, into):
+        raise NotImplementedError
+
+    def release(self):
+        """Frees what the calling thread holds; call it from a thread that's done grabbing."""
+
+    def close(self):
+        pass
+
+
+class MssCapture(CaptureBackend):
+    """Captures through mss, keeping one open grabber handle per thread until release() or close().
+
+    mss reads the desktop straight into a BGRA buffer (BitBlt on Windows,
+    XGetImage/XShm on Linux) and covers every monitor, including ones left
+    of or above the primary, which have negative coordinates.
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        import mss
+        self.mss = mss
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+        # monitors[0] is the bounding box of all monitors
+        with mss.mss() as handle:
+            monitor = handle.monitors[0]
+        self._desktop = (monitor["left"], monitor["top"], monitor["width"], monitor["height"])
+
+    def _handle(self):
+        # mss handles hold per-thread device contexts, so each thread gets its own
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = self._local.handle = self.mss.mss()
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def desktop(self):
+        return self._desktop
+
+    def _grab(self, left, top, width, height, into):
+        shot = self._handle().grab({"left": left, "top": top, "width": width, "height": height})
+        if into is not None and into.size == shot.size:
+            into.frombytes(shot.bgra, "raw", "BGRX")
+            return into
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def release(self):
+        handle = getattr(self._local, "handle", None)
+        if handle is not None:
+            self._local.handle = None
+            with self._lock:
+                if handle in self._handles:
+                    self._handles.remove(handle)
+            handle.close()
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles.clear()
+        self._local = threading.local()
+
+
+class PyAutoGuiCapture(CaptureBackend):
+    """The original pyautogui.screenshot path, kept as the fallback.
+
+    On Windows it only sees the primary monitor, so regions elsewhere come
+    back black.
+    """
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def desktop(self):
+        width, height = self.pyautogui.size()
+        return 0, 0, width, height
+
+    def _grab(self, left, top, width, height, into):
+        screenshot = self.pyautogui.screenshot(region=(left, top, width, height))
+        if into is not None and into.size == screenshot.size:
+            into.paste(screenshot)
+            return into
+        return screenshot
+
+
+CAPTURE_BACKENDS = {
+    MssCapture.name: MssCapture,
+    PyAutoGuiCapture.name: PyAutoGuiCapture,
+}
+
+
+def create_capture_backend(backend="auto"):
+    """Creates a capture backend. "auto" prefers mss and falls back to pyautogui."""
+    if backend == "auto":
+        try:
+            return MssCapture()
+        except Exception as e:
+            logger.info("mss unavailable (%s), falling back to pyautogui", e)
+            return PyAutoGuiCapture()
+    if backend not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend '{backend}', expected auto or one of "
+                         f"{', '.join(CAPTURE_BACKENDS)}")
+    return CAPTURE_BACKENDS[backend]()
@@ -0,0 +1,404 @@
+"""Single-file session containers: a whole recording in one SQLite file.
+
+Usage: python container.py pack FOLDER [--remove]
+       python container.py unpack CONTAINER FOLDER
+
+A session folder holds a journal plus one file per screenshot; thousands of
+sessions make millions of small files that are slow to move, sync and
+archive. A container (<session>.scribe) holds the same session:
+
+    events  the journal, one row per event, with an index on the step number
+    files   every session file by its relative path ("screenshots/step_3.png")
+    blobs   file contents by SHA-256, so identical screenshots are stored once
+
+Image paths stay relative to the session, so journal events read the same
+from either layout. Files are written and read in chunks through SQLite's
+incremental blob I/O, so neither packing a recording's video nor exporting
+a PDF loads a whole file into memory.
+
+"pack" converts every session folder under FOLDER (see batch_export.py),
+including the ones recorded before the journal, from their markdown file;
+with --remove each folder is deleted once its container is written.
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import ntpath
+import os
+import re
+import shutil
+import sqlite3
+import sys
+
+from journal import JOURNAL_FILE_NAME, read_journal, resolve_image_path
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_SUFFIX = ".scribe"
+FORMAT_VERSION = 1
+COPY_CHUNK = 256 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER NOT NULL, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, hash TEXT NOT NULL REFERENCES blobs (hash));
+CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY, type TEXT NOT NULL, step INTEGER,
+                                   data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS events_step ON events (step) WHERE step IS NOT NULL;
+"""
+
+# Rendered from the journal or cached by the exporters, so never packed
+SKIPPED_FOLDERS = ("export",)
+SKIPPED_PREFIXES = ("installation_steps",)
+
+
+def container_name(name):
+    """Container file names always use "/" separators."""
+    return name.replace("\\", "/")
+
+
+class SessionContainer:
+    """An open session container. Use it as a context manager."""
+
+    def __init__(self, path, create=False):
+        if not create and not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        if create:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('format', ?)", (str(FORMAT_VERSION),))
+        else:
+            version = self.meta("format")
+            if version is None or int(version) > FORMAT_VERSION:
+                raise ValueError(f"{path} is not a session container this version can read")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def meta(self, key):
+        try:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        except sqlite3.DatabaseError:  # Not a container at all
+            return None
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def add_event(self, event):
+        self.connection.execute("INSERT INTO events (type, step, data) VALUES (?, ?, ?)",
+                                (event.get("type", ""), event.get("step") if event.get("type") == "step" else None,
+                                 json.dumps(event, ensure_ascii=False)))
+
+    def events(self):
+        """Yields the journal events in order, like read_journal."""
+        for (data,) in self.connection.execute("SELECT data FROM events ORDER BY seq"):
+            yield json.loads(data)
+
+    def steps(self):
+        """Step events by step number, through the step index."""
+        return [json.loads(data) for (data,) in self.connection.execute(
+            "SELECT data FROM events WHERE step IS NOT NULL ORDER BY step")]
+
+    def add_file(self, name, source):
+        """Stores a file from a path, streaming it in chunks. Returns True if its content was new."""
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        size = os.path.getsize(source)
+        new = self.connection.execute("SELECT 1 FROM blobs WHERE hash = ?", (content_hash,)).fetchone() is None
+        if new:
+            cursor = self.connection.execute("INSERT INTO blobs VALUES (?, ?, zeroblob(?))",
+                                             (content_hash, size, size))
+            with self.connection.blobopen("blobs", "data", cursor.lastrowid) as blob, open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+                    blob.write(chunk)
+        self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (container_name(name), content_hash))
+        return new
+
+    def files(self):
+        return [name for (name,) in self.connection.execute("SELECT name FROM files ORDER BY name")]
+
+    def has_file(self, name):
+        return self.connection.execute("SELECT 1 FROM files WHERE name = ?",
+                                       (container_name(name),)).fetchone() is not None
+
+    def open_file(self, name):
+        """A read-only, seekable binary file for a stored file, read from the container on demand."""
+        row = self.connection.execute(
+            "SELECT blobs.rowid FROM files JOIN blobs ON blobs.hash = files.hash WHERE files.name = ?",
+            (container_name(name),)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"{name} is not in {self.path}")
+        return self.connection.blobopen("blobs", "data", row[0], readonly=True)
+
+    def extract_file(self, name, target):
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        with self.open_file(name) as blob, open(target, "wb") as f:
+            for chunk in iter(lambda: blob.read(COPY_CHUNK), b""):
+                f.write(chunk)
+
+    def stats(self):
+        files, stored = self.connection.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT hash) FROM files").fetchone()
+        size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        return {"files": files, "stored": stored, "bytes": size}
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def is_container(path):
+    return path.endswith(CONTAINER_SUFFIX) and os.path.isfile(path)
+
+
+def container_path(session_dir):
+    return os.path.normpath(session_dir) + CONTAINER_SUFFIX
+
+
+def session_files(session_dir):
+    """Relative paths of the files to pack: everything but outputs and caches."""
+    for folder, folders, files in os.walk(session_dir):
+        relative_folder = os.path.relpath(folder, session_dir)
+        # Page-fit renditions (screenshots/page_200dpi) and export/ are rebuilt on demand
+        folders[:] = sorted(name for name in folders
+                            if not (relative_folder == "." and name in SKIPPED_FOLDERS)
+                            and not (name.startswith("page_") and name.endswith("dpi")))
+        for name in sorted(files):
+            if relative_folder == "." and (name == JOURNAL_FILE_NAME or name.startswith(SKIPPED_PREFIXES)):
+                continue
+            if name.endswith(".part"):
+                continue
+            yield os.path.normpath(os.path.join(relative_folder, name))
+
+
+def session_image_name(image, session_dir):
+    """The name a step image is stored under: its path relative to the session.
+
+    Sessions recorded before the journal point at their screenshots by
+    absolute path, which is stale once the folder has been moved or copied
+    from another machine; those images are found by their screenshots/ tail.
+    """
+    if os.path.isabs(image):
+        try:
+            relative = os.path.relpath(image, session_dir)
+        except ValueError:  # On another drive
+            relative = os.pardir
+        if relative.split(os.sep)[0] != os.pardir:
+            return container_name(relative)
+    elif not ntpath.isabs(image):  # A Windows path read on another system isn't relative either
+        return container_name(os.path.normpath(image))
+    parts = [part for part in re.split(r"[\\/]", image) if part]
+    if "screenshots" in parts:
+        return "/".join(parts[len(parts) - 1 - parts[::-1].index("screenshots"):])
+    return "screenshots/" + parts[-1]
+
+
+def pack_session(session_dir, target=None, remove=False):
+    """Converts a session folder into a container and returns the container's path.
+
+    Steps recorded with frame dedup are materialized first, so every step
+    has its full image; identical images are then stored once anyway.
+    Sessions recorded before the journal are read from their markdown file
+    (see export.markdown_events). The container is written next to the
+    folder under a temporary name and only renamed into place once
+    complete. With remove=True the folder is deleted afterwards.
+    """
+    from batch_export import Session
+
+    session = Session(session_dir)
+    if session.journal_file:
+        from dedup import materialize_frames
+        materialize_frames(session.journal_file)
+        events = read_journal(session.journal_file)
+    elif session.markdown_file:
+        from export import markdown_events
+        events = markdown_events(session.markdown_file)
+    else:
+        raise ValueError(f"{session_dir} has no {JOURNAL_FILE_NAME} or markdown file to pack")
+    target = target or container_path(session_dir)
+    temp_path = target + ".part"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    with SessionContainer(temp_path, create=True) as container:
+        container.set_meta("session", os.path.basename(os.path.normpath(session_dir)))
+        # Step images that exist but not inside the session folder, by the name they're stored under
+        outside = {}
+        for event in events:
+            image = resolve_image_path(event, session_dir)
+            if image:
+                event["image"] = session_image_name(event["image"], session_dir)
+                if not os.path.exists(os.path.join(session_dir, event["image"])) and os.path.isfile(image):
+                    outside[event["image"]] = image
+            container.add_event(event)
+        for name in session_files(session_dir):
+            container.add_file(name, os.path.join(session_dir, name))
+        for name, source in outside.items():
+            container.add_file(name, source)
+        missing = [event["image"] for event in container.steps()
+                   if event.get("image") and not container.has_file(event["image"])]
+        if missing:
+            logger.warning("%s: %d step images are missing, e.g. %s", session_dir, len(missing), missing[0])
+        container.commit()
+        stats = container.stats()
+    os.replace(temp_path, target)
+    logger.info("Packed %s: %d files, %d stored (%d bytes)", session_dir, stats["files"], stats["stored"],
+                stats["bytes"])
+    if remove:
+        shutil.rmtree(session_dir)
+    return target
+
+
+def unpack_session(container_file, session_dir):
+    """Writes a container back out as a session folder and returns its journal path."""
+    from journal import MARKDOWN_HEADER, event_to_markdown
+
+    os.makedirs(session_dir, exist_ok=True)
+    journal_file = os.path.join(session_dir, JOURNAL_FILE_NAME)
+    with SessionContainer(container_file) as container:
+        for name in container.files():
+            container.extract_file(name, os.path.join(session_dir, *name.split("/")))
+        name = container.meta("session") or os.path.basename(session_dir)
+        with open(journal_file, "w", encoding="utf-8") as journal, \
+                open(os.path.join(session_dir, f"installation_steps_{name}.md"), "w", encoding="utf-8") as markdown:
+            markdown.write(MARKDOWN_HEADER)
+            for event in container.events():
+                journal.write(json.dumps(event, ensure_ascii=False) + "\n")
+                markdown.write(event_to_markdown(event, session_dir))
+    return journal_file
+
+
+def container_pdf_path(container_file):
+    """Where a container's PDF goes: next to it, with the same name."""
+    return container_file[:-len(CONTAINER_SUFFIX)] + ".pdf"
+
+
+def container_derivative(container_file, name, dpi, quality):
+    """Page-fit JPEG of one stored image, as bytes. Runs in a worker process."""
+    from derivatives import render_derivative
+    output = io.BytesIO()
+    with SessionContainer(container_file) as container, container.open_file(name) as blob:
+        render_derivative(blob, output, dpi, quality)
+    return output.getvalue()
+
+
+def page_images(container_file, names, dpi, workers=None):
+    """Yields a page-fit JPEG file (or None) for each image name, in order.
+
+    Images are decoded straight from the container's blobs and rendered a few
+    steps ahead in a process pool, so only that many are in memory at once.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from derivatives import JPEG_QUALITY
+
+    if workers == 1:
+        for name in names:
+            yield io.BytesIO(container_derivative(container_file, name, dpi, JPEG_QUALITY)) if name else None
+        return
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = []
+        names = iter(names)
+        ahead = 2 * workers
+        while True:
+            for name in names:
+                pending.append(executor.submit(container_derivative, container_file, name, dpi, JPEG_QUALITY)
+                               if name else None)
+                if len(pending) >= ahead:
+                    break
+            if not pending:
+                return
+            future = pending.pop(0)
+            yield io.BytesIO(future.result()) if future else None
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def export_container_pdf(container_file, pdf_file=None, backend="wkhtmltopdf", image_dpi=200, workers=None,
+                         progress=None, is_cancelled=None, metrics=None, phases=None, **options):
+    """Renders a container to PDF (next to it by default) and returns the PDF path.
+
+    The native backend reads everything from the container and writes
+    nothing but the PDF. wkhtmltopdf needs real files, so the session is
+    unpacked into a temporary folder and exported from there.
+    """
+    from export import export_phase
+
+    pdf_file = pdf_file or container_pdf_path(container_file)
+    phases = {} if phases is None else phases
+    if backend == "native":
+        from native_pdf import write_native_pdf
+        with SessionContainer(container_file) as container, \
+                export_phase(metrics, "export.pages", phases):
+            steps = container.steps()
+            names = [step.get("image") if step.get("image") and container.has_file(step["image"]) else None
+                     for step in steps]
+            images = page_images(container_file, names, image_dpi or 200, workers)
+            try:
+                write_native_pdf(container.events(), images, pdf_file, len(steps), progress, is_cancelled)
+            finally:
+                images.close()
+        if metrics:
+            metrics.export(backend, phases)
+        return pdf_file
+
+    import tempfile
+    from export import export_pdf
+    with tempfile.TemporaryDirectory(prefix="screenscribe-") as session_dir:
+        with export_phase(metrics, "export.unpack", phases):
+            journal_file = unpack_session(container_file, session_dir)
+        exported = export_pdf(session_dir, journal_file=journal_file, backend=backend, image_dpi=image_dpi,
+                              workers=workers, progress=progress, is_cancelled=is_cancelled,
+                              metrics=metrics, **options)
+        if exported is None:
+            return None
+        shutil.move(exported, pdf_file)
+    return pdf_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Packs session folders into single-file containers "
+                                                 "or unpacks a container into a folder.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="pack every session folder under FOLDER")
+    pack.add_argument("folder")
+    pack.add_argument("--remove", action="store_true", help="delete each folder once it's packed")
+    unpack = commands.add_parser("unpack", help="write CONTAINER out as a session folder")
+    unpack.add_argument("container")
+    unpack.add_argument("folder")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.command == "unpack":
+        unpack_session(args.container, args.folder)
+        return 0
+    from batch_export import find_sessions
+    failed = 0
+    for session in find_sessions(args.folder):
+        if session.container_file:
+            continue
+        try:
+            pack_session(session.path, remove=args.remove)
+        except Exception:
+            logger.exception("Error packing %s", session.path)
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
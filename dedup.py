@@ -0,0 +1,223 @@
+import logging
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from journal import read_journal, resolve_image_path
+
+logger = logging.getLogger(__name__)
+
+# Patches are stored next to the step image they stand in for, e.g. step_7.patch.png
+# (always PNG when the screenshots are in a lossy format)
+PATCH_SUFFIX = ".patch"
+
+# Decoded frames kept while compositing, so a run of deltas on one window
+# doesn't decode its base again for every step
+MATERIALIZE_CACHE_SIZE = 4
+
+
+class PreviousFrame:
+    """The raw capture a later step in the same window is diffed against."""
+
+    def __init__(self, frame):
+        self.step = frame.step
+        self.image = frame.image
+        self.x = frame.x
+        self.y = frame.y
+        self.window_left = frame.window_left
+        self.window_top = frame.window_top
+        self.window_width = frame.window_width
+        self.screenshot_path = frame.screenshot_path
+
+
+class FrameTracker:
+    """Remembers the last capture of each window for the recorder's dedup mode.
+
+    Every `keyframe_interval` steps in a row against the same window a full
+    frame is stored anyway, so a damaged file can't break a long delta chain.
+    """
+
+    def __init__(self, keyframe_interval=20, max_windows=16):
+        self.keyframe_interval = keyframe_interval
+        self.max_windows = max_windows
+        self.frames = OrderedDict()
+
+    def previous(self, window_title):
+        entry = self.frames.get(window_title)
+        if entry is None:
+            return None
+        previous, chain = entry
+        if self.keyframe_interval and chain >= self.keyframe_interval:
+            return None
+        return previous
+
+    def remember(self, frame):
+        """Records a frame that was handed to the pipeline."""
+        chain = 0
+        if frame.previous is not None:
+            chain = self.frames[frame.window_title][1] + 1
+        self.frames[frame.window_title] = (PreviousFrame(frame), chain)
+        self.frames.move_to_end(frame.window_title)
+        while len(self.frames) > self.max_windows:
+            self.frames.popitem(last=False)
+
+    def clear(self):
+        self.frames.clear()
+
+
+def changed_box(previous, current):
+    """Bounding box (left, top, right, bottom) of the pixels that differ, and how many do.
+
+    Both images must be the same size. Returns (None, 0) when they are identical.
+    """
+    a = np.asarray(previous.convert("RGB") if previous.mode != "RGB" else previous)
+    b = np.asarray(current.convert("RGB") if current.mode != "RGB" else current)
+    changed = np.any(a != b, axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return None, 0
+    columns = np.flatnonzero(changed.any(axis=0))
+    box = (int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1)
+    return box, int(np.count_nonzero(changed[box[1]:box[3], box[0]:box[2]]))
+
+
+def union_box(*boxes):
+    boxes = [box for box in boxes if box is not None]
+    if not boxes:
+        return None
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+def clip_box(box, width, height):
+    left, top, right, bottom = box
+    return max(0, left), max(0, top), min(width, right), min(height, bottom)
+
+
+def compare_frames(previous_image, current_image, previous_marker, current_marker,
+                   near_duplicate_pixels=0, max_delta_fraction=0.5, numbered=False):
+    """Decides how a step can be stored relative to the previous frame of its window.
+
+    Returns ("ref", None) when the screen is unchanged and the click marker is in
+    the same place, ("delta", box) when only `box` of the annotated image has to
+    be stored, or (None, None) for a full frame. The box covers every changed
+    pixel as well as both markers, so a ticked checkbox is never lost. Up to
+    `near_duplicate_pixels` changed pixels (a blinking caret, say) may be
+    opted into counting as unchanged; by default any change is kept.
+    Numbered markers differ on every step, so they never produce a reference.
+    """
+    if previous_image.size != current_image.size:
+        return None, None
+    width, height = current_image.size
+    box, changed = changed_box(previous_image, current_image)
+    if changed <= near_duplicate_pixels and previous_marker == current_marker and not numbered:
+        return "ref", None
+    # The old marker has to be painted over and the new one drawn in
+    box = clip_box(union_box(box, previous_marker, current_marker), width, height)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    if area > width * height * max_delta_fraction:
+        return None, None
+    return "delta", box
+
+
+def patch_path(screenshot_path, extension=None):
+    base, screenshot_extension = os.path.splitext(screenshot_path)
+    return base + PATCH_SUFFIX + (extension or screenshot_extension)
+
+
+def _save_like(image, path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jpg", ".jpeg"):
+        image.save(path, format="JPEG", quality=95)
+    elif extension == ".webp":
+        image.save(path, format="WEBP", lossless=True)
+    else:
+        image.save(path, format="PNG", compress_level=1)
+
+
+def materialize_frames(journal_file):
+    """Writes the full image of every deduplicated step that doesn't have one yet.
+
+    Steps recorded in dedup mode only store a reference to an earlier frame or a
+    patch of the region that changed; exporters call this first so every step's
+    `image` exists on disk. Returns the number of images written.
+
+    A delta step is composed from the full frame its chain starts at and the
+    patches after it, never from another rebuilt step's file, so a lossy format
+    loses quality once per image rather than once per link of the chain.
+    """
+    session_dir = os.path.dirname(journal_file)
+    # Step image -> (base image, box, patch file), box None for a reference
+    recipes = {}
+    targets = []
+    for event in read_journal(journal_file):
+        dedup = event.get("dedup")
+        if event.get("type") != "step" or not dedup:
+            continue
+        target = resolve_image_path(event, session_dir)
+        base = resolve_image_path({"image": dedup["base_image"]}, session_dir)
+        if dedup["mode"] == "ref":
+            recipes[target] = (base, None, None)
+        else:
+            recipes[target] = (base, tuple(dedup["box"]),
+                               resolve_image_path({"image": dedup["patch"]}, session_dir))
+        targets.append((event["step"], target))
+
+    decoded = OrderedDict()
+
+    def remember(path, image):
+        decoded[path] = image
+        decoded.move_to_end(path)
+        while len(decoded) > MATERIALIZE_CACHE_SIZE:
+            decoded.popitem(last=False)
+
+    def compose(path):
+        """The pixels of a step image, rebuilt from its chain; None if a file is missing."""
+        # Walk back to a decoded image or a stored full frame, then patch forward
+        chain = []
+        while path not in decoded and path in recipes:
+            chain.append(path)
+            path = recipes[path][0]
+        if path not in decoded:
+            if not os.path.exists(path):
+                logger.warning("Can't rebuild step images from %s: it is missing", path)
+                return None
+            with Image.open(path) as image:
+                remember(path, image.convert("RGB"))
+        image = decoded[path]
+        for path in reversed(chain):
+            _, box, patch_file = recipes[path]
+            if box is not None:
+                image = image.copy()
+                with Image.open(patch_file) as patch:
+                    image.paste(patch.convert("RGB"), box[:2])
+            remember(path, image)
+        return image
+
+    written = 0
+    for step, target in targets:
+        if os.path.exists(target):
+            continue
+        base, box, _ = recipes[target]
+        if box is None and os.path.exists(base):
+            # A reference has its base's pixels, so it can share the base's file
+            try:
+                os.link(base, target)
+            except OSError:
+                shutil.copyfile(base, target)
+        else:
+            image = compose(target)
+            if image is None:
+                logger.warning("Can't rebuild step %s", step)
+                continue
+            root, extension = os.path.splitext(target)
+            temp_path = root + ".part" + extension
+            _save_like(image, temp_path)
+            os.replace(temp_path, target)
+        written += 1
+    if written:
+        logger.info("Rebuilt %d deduplicated step images", written)
+    return written
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# A4 minus the 20mm margins the PDF export uses
+PAGE_CONTENT_MM = (170, 257)
+MM_PER_INCH = 25.4
+MANIFEST_NAME = "manifest.json"
+
+JPEG_QUALITY = 90
+
+# Below this many images a process pool costs more to start than it saves
+MIN_PARALLEL_IMAGES = 4
+
+
+def page_fit_size(width, height, dpi, page_mm=PAGE_CONTENT_MM):
+    """Largest size that fits the page content area at `dpi` without upscaling."""
+    max_width = int(page_mm[0] / MM_PER_INCH * dpi)
+    max_height = int(page_mm[1] / MM_PER_INCH * dpi)
+    scale = min(1.0, max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def render_derivative(source, output, dpi, quality):
+    """Writes a page-fit JPEG rendition of source (a path or binary file) to output."""
+    with Image.open(source) as image:
+        size = page_fit_size(image.width, image.height, dpi)
+        image.draft("RGB", size)  # JPEG sources decode straight at a reduced scale
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        image.save(output, format="JPEG", quality=quality, dpi=(dpi, dpi))
+
+
+def make_derivative(source, target, dpi, quality):
+    """Writes a page-fit JPEG rendition of source. Runs in a worker process."""
+    temp_path = target + ".part"
+    render_derivative(source, temp_path, dpi, quality)
+    os.replace(temp_path, target)
+
+
+class DerivativeCache:
+    """Page-fit renditions of step screenshots for the document export.
+
+    Full-resolution originals stay untouched; renditions live in a
+    `page_<dpi>dpi` folder next to them, with a manifest of the source
+    mtime and size each one was made from so edited screenshots are redone.
+    """
+
+    def __init__(self, dpi=200, quality=JPEG_QUALITY, workers=None):
+        self.dpi = dpi
+        self.quality = quality
+        self.workers = workers
+
+    def derivative_dir(self, source):
+        return os.path.join(os.path.dirname(source), f"page_{self.dpi}dpi")
+
+    def derivative_path(self, source):
+        name = os.path.splitext(os.path.basename(source))[0] + ".jpg"
+        return os.path.join(self.derivative_dir(source), name)
+
+    def prepare(self, sources):
+        """Makes sure every source has an up-to-date rendition.
+
+        Returns a dict mapping each existing source path to its rendition.
+        """
+        manifests = {}
+        mapping = {}
+        todo = []
+        for source in dict.fromkeys(sources):
+            if not os.path.exists(source):
+                continue
+            folder = self.derivative_dir(source)
+            if folder not in manifests:
+                manifests[folder] = self._load_manifest(folder)
+            target = self.derivative_path(source)
+            stat = os.stat(source)
+            stamp = [stat.st_mtime_ns, stat.st_size, self.quality]
+            mapping[source] = target
+            if manifests[folder].get(os.path.basename(target)) != stamp or not os.path.exists(target):
+                os.makedirs(folder, exist_ok=True)
+                todo.append((source, target, folder, stamp))
+
+        if todo:
+            logger.info("Preparing %d page-fit images at %s DPI...", len(todo), self.dpi)
+            jobs = [(source, target, self.dpi, self.quality) for source, target, _, _ in todo]
+            if len(todo) >= MIN_PARALLEL_IMAGES and self.workers != 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    list(executor.map(make_derivative, *zip(*jobs)))
+            else:
+                for job in jobs:
+                    make_derivative(*job)
+            for _, target, folder, stamp in todo:
+                manifests[folder][os.path.basename(target)] = stamp
+            for folder, manifest in manifests.items():
+                self._save_manifest(folder, manifest)
+        return mapping
+
+    def _load_manifest(self, folder):
+        try:
+            with open(os.path.join(folder, MANIFEST_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, folder, manifest):
+        if not os.path.isdir(folder):
+            return
+        with open(os.path.join(folder, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
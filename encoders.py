@@ -0,0 +1,136 @@
+import io
+import os
+import re
+
+from PIL import Image
+
+# Formats wkhtmltopdf's WebKit can decode; anything else is transcoded for export
+PDF_SAFE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+class EncodedImage:
+    """Encoded bytes of one screenshot plus the settings that produced them."""
+
+    def __init__(self, data, extension, quality=None, over_budget=False):
+        self.data = data
+        self.extension = extension
+        self.quality = quality
+        self.over_budget = over_budget
+
+
+class ImageEncoder:
+    """Base class for screenshot encoders.
+
+    Lossy encoders honour `max_bytes` by stepping the quality down until the
+    image fits or `min_quality` is reached; lossless encoders only report when
+    they go over the budget.
+    """
+
+    extension = ".png"
+    lossy = False
+
+    def __init__(self, quality=90, max_bytes=None, min_quality=40, dpi=(600, 600)):
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.min_quality = min_quality
+        self.dpi = dpi
+
+    def encode(self, image):
+        quality = self.quality if self.lossy else None
+        data = self._encode(image, quality)
+        if self.max_bytes and self.lossy:
+            while len(data) > self.max_bytes and quality > self.min_quality:
+                quality = max(self.min_quality, quality - 10)
+                data = self._encode(image, quality)
+        over_budget = bool(self.max_bytes) and len(data) > self.max_bytes
+        return EncodedImage(data, self.extension, quality, over_budget)
+
+    def save(self, image, path):
+        """Encodes the image and writes it to path. Returns the EncodedImage."""
+        encoded = self.encode(image)
+        with open(path, "wb") as f:
+            f.write(encoded.data)
+        return encoded
+
+    def _encode(self, image, quality):
+        raise NotImplementedError
+
+
+class PngEncoder(ImageEncoder):
+    extension = ".png"
+
+    def __init__(self, compress_level=6, **kwargs):
+        super().__init__(**kwargs)
+        self.compress_level = compress_level
+
+    def _encode(self, image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', optimize=False, compress_level=self.compress_level, dpi=self.dpi)
+        return buffer.getvalue()
+
+
+class WebpEncoder(ImageEncoder):
+    extension = ".webp"
+
+    def __init__(self, lossless=False, method=4, **kwargs):
+        super().__init__(**kwargs)
+        self.lossless = lossless
+        self.lossy = not lossless
+        self.method = method
+
+    def _encode(self, image, quality):
+        buffer = io.BytesIO()
+        if self.lossless:
+            image.save(buffer, format='WEBP', lossless=True, quality=100, method=self.method)
+        else:
+            image.save(buffer, format='WEBP', quality=quality, method=self.method)
+        return buffer.getvalue()
+
+
+class JpegEncoder(ImageEncoder):
+    extension = ".jpg"
+    lossy = True
+
+    def _encode(self, image, quality):
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=False, dpi=self.dpi)
+        return buffer.getvalue()
+
+
+# Named profiles selectable per deployment
+ENCODER_PROFILES = {
+    "png": lambda **kwargs: PngEncoder(compress_level=6, **kwargs),  # Pillow's default, as before
+    "png-fast": lambda **kwargs: PngEncoder(compress_level=1, **kwargs),
+    "webp-lossless": lambda **kwargs: WebpEncoder(lossless=True, method=0, **kwargs),
+    "webp": lambda **kwargs: WebpEncoder(**kwargs),
+    "jpeg": lambda **kwargs: JpegEncoder(**kwargs),
+}
+
+
+def create_encoder(profile="png", quality=90, max_bytes=None):
+    """Returns the encoder for a profile name from ENCODER_PROFILES."""
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown image format '{profile}', expected one of {', '.join(ENCODER_PROFILES)}")
+    return ENCODER_PROFILES[profile](quality=quality, max_bytes=max_bytes)
+
+
+def pdf_safe_image(image_path, export_dir):
+    """Returns a path wkhtmltopdf can render, transcoding to PNG when needed."""
+    if os.path.splitext(image_path)[1].lower() in PDF_SAFE_EXTENSIONS or not os.path.exists(image_path):
+        return image_path
+    os.makedirs(export_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(image_path))[0] + ".png"
+    export_path = os.path.join(export_dir, name)
+    if not os.path.exists(export_path) or os.path.getmtime(export_path) < os.path.getmtime(image_path):
+        with Image.open(image_path) as image:
+            image.save(export_path, format='PNG', compress_level=1)
+    return export_path
+
+
+def make_images_pdf_safe(html, export_dir):
+    """Rewrites <img src> paths in html so every image is in a PDF-safe format."""
+    def replace(match):
+        return match.group(1) + pdf_safe_image(match.group(2), export_dir) + match.group(3)
+    return re.sub(r'(<img\s[^>]*src=")([^"]+)(")', replace, html)
@@ -0,0 +1,403 @@
+import codecs
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+from journal import MARKDOWN_HEADER, event_to_markdown, read_journal
+
+logger = logging.getLogger(__name__)
+
+PDF_FILE_NAME = "installation_steps.pdf"
+FRAGMENT_CACHE_DIR = os.path.join("export", "pdf_fragments")
+MARKDOWN_ENCODINGS = ("utf-8", "latin-1", "cp1252")
+READ_BLOCK = 1024 * 1024
+IMG_SRC = re.compile(r'(<img\s[^>]*src=")([^"]+)(")')
+WINDOWS_WKHTMLTOPDF = 'C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe'
+
+# The lines older versions wrote to the markdown file, for reading those sessions back as events
+MARKDOWN_STEP = re.compile(r"## Step (\d+):\s?(.*)")
+MARKDOWN_CLICKED = re.compile(r"Clicked on: \*\*(.*)\*\*")
+MARKDOWN_TYPED = re.compile(r"\*\*Typed:\*\* (.*)")
+MARKDOWN_PRESSED = re.compile(r"\*\*Pressed:\*\* `(.*)`(?: ×(\d+))?")
+MARKDOWN_SHORTCUT = re.compile(r"\*\*Keyboard Shortcut:\*\* `([^`]*)`(?: \((.*?)\))?(?: ×(\d+))?")
+MARKDOWN_CLIPBOARD = re.compile(r"\*\*(Copied to|Pasted from) clipboard:\*\* ```(.*)```", re.S)
+CLIPBOARD_PREFIXES = ("**Copied to clipboard:** ```", "**Pasted from clipboard:** ```")
+
+# Add CSS for image handling
+CSS = """
+<style>
+    img { max-width: 100%; height: auto; display: block; margin: 0 auto; }
+    body { max-width: 1000px; margin: 0 auto; padding: 20px; }
+</style>
+"""
+
+# Update options to use only supported parameters
+PDF_OPTIONS = {
+    'enable-local-file-access': None,
+    'encoding': 'UTF-8',
+    'image-quality': 100,    # Maximum image quality
+    'margin-top': '20mm',
+    'margin-right': '20mm',
+    'margin-bottom': '20mm',
+    'margin-left': '20mm',
+    'quiet': None,
+    'page-size': 'A4', # change to different size if needed
+    'dpi': 600              # Set DPI to 600
+}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def find_wkhtmltopdf():
+    """Returns the wkhtmltopdf executable, or None if it isn't installed."""
+    if os.path.exists(WINDOWS_WKHTMLTOPDF):
+        return WINDOWS_WKHTMLTOPDF
+    return shutil.which("wkhtmltopdf")
+
+
+def markdown_encoding(markdown_file):
+    """The first of a few encodings that decodes a markdown file written by older versions.
+
+    The file is checked in blocks, so it's never read into memory whole.
+    """
+    for encoding in MARKDOWN_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(markdown_file, "rb") as f:
+                for block in iter(lambda: f.read(READ_BLOCK), b""):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+            logger.debug("Reading the markdown file as %s", encoding)
+            return encoding
+        except UnicodeDecodeError:
+            logger.debug("Failed to read with %s encoding, trying next...", encoding)
+    raise Exception("Could not read the markdown file with any supported encoding")
+
+
+def session_sections(journal_file=None, markdown_file=None):
+    """Yields the session as one markdown section per step, reading it as it goes.
+
+    Keystrokes recorded after a step belong to that step's section; anything
+    before the first step (and the document header) goes into the first one.
+    """
+    if journal_file and os.path.exists(journal_file):
+        session_dir = os.path.dirname(journal_file)
+        parts = ((event.get("type") == "step", event_to_markdown(event, session_dir))
+                 for event in read_journal(journal_file))
+        return split_sections(parts, MARKDOWN_HEADER)
+    # Sessions recorded before the journal only have the markdown file
+    return markdown_sections(markdown_file)
+
+
+def markdown_sections(markdown_file):
+    with open(markdown_file, "r", encoding=markdown_encoding(markdown_file)) as f:
+        yield from split_sections((line.startswith("## Step "), line) for line in f)
+
+
+def markdown_events(markdown_file):
+    """Reads a markdown file written before the journal back into journal events.
+
+    The file is read line by line, like markdown_sections, so sessions
+    that only have the markdown can be packed and indexed like journaled
+    ones. Step images keep the path written in the file (absolute, for
+    those versions).
+    """
+    step = None
+    pending = ""  # Clipboard text that spans lines
+    with open(markdown_file, "r", encoding=markdown_encoding(markdown_file)) as f:
+        for line in f:
+            if pending and MARKDOWN_STEP.fullmatch(line.rstrip("\n")):
+                pending = ""  # Clipboard text that was never closed; don't swallow the steps after it
+            if pending or line.startswith(CLIPBOARD_PREFIXES):
+                pending += line
+                if not MARKDOWN_CLIPBOARD.fullmatch(pending.rstrip("\n")):
+                    continue
+                line, pending = pending, ""
+            text = line.rstrip("\n")
+            match = MARKDOWN_STEP.fullmatch(text)
+            if match:
+                if step:
+                    yield step
+                step = {"type": "step", "step": int(match.group(1)), "window_title": match.group(2)}
+                continue
+            if step:
+                # A step's clicked and typed text come before its image, which ends it
+                match = IMG_SRC.search(text)
+                if match:
+                    step["image"] = match.group(2)
+                    yield step
+                    step = None
+                    continue
+                match = MARKDOWN_CLICKED.fullmatch(text)
+                if match:
+                    step["clicked_text"] = match.group(1)
+                    continue
+                match = MARKDOWN_TYPED.fullmatch(text)
+                if match:
+                    step["typed_text"] = match.group(1)
+                    continue
+            event = markdown_event(text)
+            if event:
+                if step:
+                    yield step
+                    step = None
+                yield event
+    if step:
+        yield step
+
+
+def markdown_event(text):
+    """The journal event for one line of an old markdown file outside a step, or None."""
+    match = MARKDOWN_TYPED.fullmatch(text)
+    if match:
+        return {"type": "typed", "text": match.group(1)}
+    match = MARKDOWN_PRESSED.fullmatch(text)
+    if match:
+        event = {"type": "key", "key": match.group(1)}
+        if match.group(2):
+            event["count"] = int(match.group(2))
+        return event
+    match = MARKDOWN_SHORTCUT.fullmatch(text)
+    if match:
+        event = {"type": "shortcut", "keys": match.group(1)}
+        if match.group(2):
+            event["description"] = match.group(2)
+        if match.group(3):
+            event["count"] = int(match.group(3))
+        return event
+    match = MARKDOWN_CLIPBOARD.fullmatch(text)
+    if match:
+        return {"type": "clipboard", "action": "copy" if match.group(1) == "Copied to" else "paste",
+                "text": match.group(2)}
+    return None
+
+
+def split_sections(parts, header=""):
+    """Joins (starts a step, text) pairs into per-step sections."""
+    current = [header]
+    has_step = False
+    for starts_step, text in parts:
+        if starts_step:
+            if has_step:
+                yield "".join(current)
+                current = []
+            has_step = True
+        current.append(text)
+    yield "".join(current)
+
+
+def section_chunks(sections, chunk_size):
+    """Groups sections into lists of `chunk_size`."""
+    chunk = []
+    for section in sections:
+        chunk.append(section)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def chunk_html(sections):
+    from markdown2 import markdown
+    return CSS + markdown("".join(sections))
+
+
+def fragment_key(html, options):
+    """Content hash of a chunk: its HTML, the render options and every image it embeds."""
+    digest = hashlib.sha256()
+    digest.update(html.encode("utf-8"))
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    for _, image, _ in IMG_SRC.findall(html):
+        if os.path.exists(image):
+            stat = os.stat(image)
+            digest.update(f"{image}:{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def render_fragment(html, fragment_path, wkhtmltopdf_path, options):
+    """Renders one chunk with its own wkhtmltopdf process."""
+    import pdfkit
+    config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
+    temp_path = fragment_path + ".part"
+    pdfkit.from_string(html, temp_path, configuration=config, options=options)
+    os.replace(temp_path, fragment_path)
+
+
+def merge_pdfs(fragment_paths, pdf_file):
+    """Concatenates the fragments one at a time, streaming each into the output file."""
+    from native_pdf import PdfStreamWriter
+    temp_path = pdf_file + ".part"
+    writer = PdfStreamWriter(temp_path)
+    completed = False
+    try:
+        for fragment_path in fragment_paths:
+            writer.append_pdf(fragment_path)
+        completed = True
+    finally:
+        writer.close()
+        if not completed:
+            os.remove(temp_path)
+    os.replace(temp_path, pdf_file)
+
+
+def use_derivatives(html, derivatives):
+    """Points every <img> at its page-fit rendition, where one exists."""
+    def replace(match):
+        return match.group(1) + derivatives.get(match.group(2), match.group(2)) + match.group(3)
+    return IMG_SRC.sub(replace, html)
+
+
+def export_phase(metrics, name, phases):
+    """Times one export phase into `phases` when instrumentation is on."""
+    return metrics.measure(name, phases) if metrics else nullcontext()
+
+
+def export_pdf(working_directory, journal_file=None, markdown_file=None, chunk_size=10,
+               workers=None, progress=None, is_cancelled=None, options=None, image_dpi=200,
+               backend="wkhtmltopdf", metrics=None):
+    """Renders the session to PDF in chunks of `chunk_size` steps.
+
+    Chunks render in parallel, each through its own wkhtmltopdf process, and
+    the fragments are cached under export/pdf_fragments by content hash, so
+    re-exporting after recording more steps only renders the chunks that
+    changed. `progress(done, total)` is called as chunks complete and
+    `is_cancelled()` is checked at every chunk boundary.
+
+    With `image_dpi` set, screenshots are embedded as page-fit renditions at
+    that DPI (see derivatives.py) instead of the full-resolution originals.
+
+    backend="native" skips HTML and wkhtmltopdf and streams the PDF straight
+    from the journal (see native_pdf.py); sessions without a journal always
+    use wkhtmltopdf.
+    With a SessionMetrics in `metrics`, the time spent in each phase is
+    recorded as an "export" line in the session's metrics file.
+    `working_directory` may also be a single-file session container (see
+    container.py); its PDF is written next to it.
+    Returns the PDF path, or None if wkhtmltopdf isn't installed.
+    """
+    from container import export_container_pdf, is_container
+    if is_container(working_directory):
+        return export_container_pdf(working_directory, backend=backend, image_dpi=image_dpi, workers=workers,
+                                    progress=progress, is_cancelled=is_cancelled, metrics=metrics,
+                                    chunk_size=chunk_size, options=options)
+
+    # Imported here so the recorder and the batch exporter start without PIL and numpy
+    from dedup import materialize_frames
+    from derivatives import DerivativeCache
+    from encoders import make_images_pdf_safe
+
+    phases = {}
+    if journal_file and os.path.exists(journal_file):
+        # Steps recorded with frame dedup need their full images composited first
+        with export_phase(metrics, "export.materialize", phases):
+            materialize_frames(journal_file)
+    if backend == "native":
+        if journal_file and os.path.exists(journal_file):
+            from native_pdf import export_native_pdf
+            pdf_file = export_native_pdf(journal_file, os.path.join(working_directory, PDF_FILE_NAME),
+                                         image_dpi=image_dpi, workers=workers, progress=progress,
+                                         is_cancelled=is_cancelled, metrics=metrics, phases=phases)
+            if metrics:
+                metrics.export(backend, phases)
+            return pdf_file
+        logger.info("Session has no journal, using the wkhtmltopdf backend")
+        backend = "wkhtmltopdf"
+    elif backend != "wkhtmltopdf":
+        raise ValueError(f"Unknown PDF backend '{backend}', expected wkhtmltopdf or native")
+
+    options = dict(options or PDF_OPTIONS)
+    if image_dpi:
+        # No point rasterizing at a higher DPI than the images carry
+        options['dpi'] = image_dpi
+    is_cancelled = is_cancelled or (lambda: False)
+    wkhtmltopdf_path = find_wkhtmltopdf()
+    if wkhtmltopdf_path is None:
+        logger.error("wkhtmltopdf not found at %s or on PATH", WINDOWS_WKHTMLTOPDF)
+        return None
+
+    # A first pass only collects the screenshots and counts the steps; the
+    # markdown, HTML and fragments are produced chunk by chunk in the second
+    sections = 0
+    sources = []
+    with export_phase(metrics, "export.sections", phases):
+        for section in session_sections(journal_file, markdown_file):
+            sections += 1
+            sources.extend(source for _, source, _ in IMG_SRC.findall(section))
+    export_dir = os.path.join(working_directory, "export")
+    cache_dir = os.path.join(working_directory, FRAGMENT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    derivatives = None
+    if image_dpi:
+        with export_phase(metrics, "export.derivatives", phases):
+            derivatives = DerivativeCache(dpi=image_dpi, workers=workers).prepare(sources)
+        if is_cancelled():
+            raise ExportCancelled()
+    del sources
+
+    total = -(-sections // chunk_size)
+    done = 0
+    fragments = []
+    if progress:
+        progress(done, total)
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    logger.info("Converting %d chunks...", total)
+    with export_phase(metrics, "export.render", phases):
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-chunk")
+        try:
+            pending = set()
+            chunks = section_chunks(session_sections(journal_file, markdown_file), chunk_size)
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    html = chunk_html(chunk)
+                    if derivatives is not None:
+                        html = use_derivatives(html, derivatives)
+                    # wkhtmltopdf can't decode WebP, so those steps get a PNG copy for export
+                    html = make_images_pdf_safe(html, export_dir)
+                    fragment_path = os.path.join(cache_dir, fragment_key(html, options) + ".pdf")
+                    fragments.append(fragment_path)
+                    if os.path.exists(fragment_path):
+                        done += 1
+                        if progress:
+                            progress(done, total)
+                    else:
+                        pending.add(executor.submit(render_fragment, html, fragment_path, wkhtmltopdf_path,
+                                                    options))
+                # Keep only `workers` chunks in flight (and in memory) so the HTML never piles up
+                # and cancelling doesn't leave a backlog to drain; after the last chunk, wait for all
+                while pending and (len(pending) >= workers or chunk is None):
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                        done += 1
+                    if progress:
+                        progress(done, total)
+                    if is_cancelled():
+                        raise ExportCancelled()
+                if is_cancelled():
+                    raise ExportCancelled()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    pdf_file = os.path.join(working_directory, PDF_FILE_NAME)
+    with export_phase(metrics, "export.merge", phases):
+        merge_pdfs(fragments, pdf_file)
+
+    # Drop fragments no chunk of this document uses any more
+    in_use = {os.path.basename(path) for path in fragments}
+    for name in os.listdir(cache_dir):
+        if name not in in_use:
+            os.remove(os.path.join(cache_dir, name))
+    logger.info("PDF successfully saved to %s", pdf_file)
+    if metrics:
+        metrics.export(backend, phases)
+    return pdf_file
@@ -0,0 +1,235 @@
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+WINDOWS_FONTS = os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts")
+# (regular, bold) TrueType fonts the native PDF export embeds for text outside WinAnsi, first found wins
+UNICODE_FONTS = [
+    (os.path.join(WINDOWS_FONTS, "arial.ttf"), os.path.join(WINDOWS_FONTS, "arialbd.ttf")),
+    (os.path.join(WINDOWS_FONTS, "segoeui.ttf"), os.path.join(WINDOWS_FONTS, "segoeuib.ttf")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/System/Library/Fonts/Supplemental/Arial.ttf", "/System/Library/Fonts/Supplemental/Arial Bold.ttf"),
+]
+
+# Tables a PDF viewer needs to draw the glyphs of an embedded TrueType font
+SUBSET_TABLES = (b"head", b"hhea", b"maxp", b"hmtx", b"loca", b"glyf", b"cvt ", b"fpgm", b"prep")
+
+# Composite glyph flags
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+def find_unicode_fonts():
+    """Returns (regular, bold) TrueTypeFonts, bold falling back to regular, or None if none loads."""
+    for regular_path, bold_path in UNICODE_FONTS:
+        if not os.path.exists(regular_path):
+            continue
+        try:
+            regular = TrueTypeFont(regular_path)
+        except (OSError, ValueError, struct.error):
+            logger.exception("Error reading the font %s", regular_path)
+            continue
+        bold = regular
+        if os.path.exists(bold_path):
+            try:
+                bold = TrueTypeFont(bold_path)
+            except (OSError, ValueError, struct.error):
+                logger.exception("Error reading the font %s", bold_path)
+        return regular, bold
+    return None
+
+
+class TrueTypeFont:
+    """The metrics, character map and glyph outlines of a TrueType (glyf) font file.
+
+    subset() writes a copy that keeps only the outlines of the glyphs used,
+    with the glyph ids unchanged, for embedding as a PDF CIDFontType2.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = f.read()
+        version, table_count = struct.unpack_from(">IH", self.data, 0)
+        if version not in (0x00010000, 0x74727565):  # "true"; CFF fonts and collections aren't supported
+            raise ValueError(f"{path} is not a TrueType font")
+        self.tables = {}
+        for index in range(table_count):
+            tag, _, offset, length = struct.unpack_from(">4sIII", self.data, 12 + 16 * index)
+            self.tables[tag] = (offset, length)
+        if b"glyf" not in self.tables or b"cmap" not in self.tables:
+            raise ValueError(f"{path} has no TrueType outlines")
+
+        head = self.table(b"head")
+        self.units_per_em = struct.unpack_from(">H", head, 18)[0]
+        self.bbox = [self.scale(value) for value in struct.unpack_from(">4h", head, 36)]
+        self.long_offsets = struct.unpack_from(">h", head, 50)[0] == 1
+        self.glyph_count = struct.unpack_from(">H", self.table(b"maxp"), 4)[0]
+        hhea = self.table(b"hhea")
+        ascent, descent = struct.unpack_from(">hh", hhea, 4)
+        self.ascent, self.descent = self.scale(ascent), self.scale(descent)
+        metric_count = struct.unpack_from(">H", hhea, 34)[0]
+        advances = struct.unpack_from(">%dH" % (2 * metric_count), self.table(b"hmtx"))[::2]
+        # Glyphs past the last full metric share its advance
+        self.widths = [self.scale(advance) for advance in advances]
+        self.widths += self.widths[-1:] * (self.glyph_count - metric_count)
+        self.cap_height = self.ascent
+        os2 = self.table(b"OS/2")
+        if len(os2) >= 90 and struct.unpack_from(">H", os2, 0)[0] >= 2:
+            self.cap_height = self.scale(struct.unpack_from(">h", os2, 88)[0])
+        post = self.table(b"post")
+        self.italic_angle = struct.unpack_from(">i", post, 4)[0] / 65536 if len(post) >= 8 else 0
+        self.name = self.postscript_name() or os.path.splitext(os.path.basename(path))[0]
+        self.glyphs = self.character_map()
+
+    def table(self, tag):
+        offset, length = self.tables.get(tag, (0, 0))
+        return self.data[offset:offset + length]
+
+    def scale(self, value):
+        """Font units to 1/1000 em, the unit of PDF glyph widths."""
+        return round(value * 1000 / self.units_per_em)
+
+    def glyph(self, char):
+        """The glyph id of a character; 0 (the missing glyph box) when the font hasn't got it."""
+        return self.glyphs.get(ord(char), 0)
+
+    def width(self, text, size):
+        return sum(self.widths[self.glyph(char)] for char in text) * size / 1000
+
+    def postscript_name(self):
+        data = self.table(b"name")
+        if len(data) < 6:
+            return None
+        count, strings = struct.unpack_from(">HH", data, 2)
+        for index in range(count):
+            platform, _, _, name_id, length, offset = struct.unpack_from(">6H", data, 6 + 12 * index)
+            if name_id != 6:
+                continue
+            raw = data[strings + offset:strings + offset + length]
+            name = raw.decode("utf-16-be" if platform in (0, 3) else "latin-1", "replace")
+            name = "".join(char for char in name if 33 <= ord(char) <= 126 and char not in "[](){}<>/%#")
+            if name:
+                return name
+        return None
+
+    def character_map(self):
+        """Maps code points to glyph ids from the font's Unicode cmap (format 12, else format 4)."""
+        cmap = self.table(b"cmap")
+        subtables = {}
+        for index in range(struct.unpack_from(">H", cmap, 2)[0]):
+            platform, encoding, offset = struct.unpack_from(">HHI", cmap, 4 + 8 * index)
+            subtables.setdefault((struct.unpack_from(">H", cmap, offset)[0], platform, encoding), offset)
+        glyphs = {}
+        for key in ((12, 3, 10), (12, 0, 4), (12, 0, 6)):
+            if key in subtables:
+                offset = subtables[key]
+                for group in range(struct.unpack_from(">I", cmap, offset + 12)[0]):
+                    start, end, first = struct.unpack_from(">III", cmap, offset + 16 + 12 * group)
+                    for code in range(start, min(end, start + self.glyph_count - first - 1) + 1):
+                        glyphs[code] = first + code - start
+                return glyphs
+        for key in ((4, 3, 1), (4, 0, 3), (4, 0, 4), (4, 3, 0)):
+            if key in subtables:
+                offset = subtables[key]
+                segments = struct.unpack_from(">H", cmap, offset + 6)[0] // 2
+                ends = struct.unpack_from(">%dH" % segments, cmap, offset + 14)
+                starts = struct.unpack_from(">%dH" % segments, cmap, offset + 16 + 2 * segments)
+                deltas = struct.unpack_from(">%dh" % segments, cmap, offset + 16 + 4 * segments)
+                range_offsets_at = offset + 16 + 6 * segments
+                range_offsets = struct.unpack_from(">%dH" % segments, cmap, range_offsets_at)
+                for segment in range(segments):
+                    for code in range(starts[segment], min(ends[segment], 0xFFFE) + 1):
+                        if range_offsets[segment]:
+                            at = (range_offsets_at + 2 * segment + range_offsets[segment]
+                                  + 2 * (code - starts[segment]))
+                            glyph = struct.unpack_from(">H", cmap, at)[0]
+                            if glyph:
+                                glyph = (glyph + deltas[segment]) & 0xFFFF
+                        else:
+                            glyph = (code + deltas[segment]) & 0xFFFF
+                        if 0 < glyph < self.glyph_count:
+                            glyphs[code] = glyph
+                return glyphs
+        raise ValueError(f"{self.path} has no Unicode character map")
+
+    def glyph_offsets(self):
+        loca = self.table(b"loca")
+        if self.long_offsets:
+            return struct.unpack_from(">%dI" % (self.glyph_count + 1), loca)
+        return [offset * 2 for offset in struct.unpack_from(">%dH" % (self.glyph_count + 1), loca)]
+
+    def subset(self, glyph_ids):
+        """A font file with the outlines of glyph_ids (and the glyphs they're built from) only."""
+        offsets = self.glyph_offsets()
+        glyf = self.table(b"glyf")
+        keep = set()
+        pending = [0] + [glyph for glyph in glyph_ids if 0 <= glyph < self.glyph_count]
+        while pending:
+            glyph = pending.pop()
+            if glyph in keep:
+                continue
+            keep.add(glyph)
+            outline = glyf[offsets[glyph]:offsets[glyph + 1]]
+            if len(outline) < 10 or struct.unpack_from(">h", outline, 0)[0] >= 0:
+                continue
+            at = 10  # A composite glyph: collect its components
+            while True:
+                flags, component = struct.unpack_from(">HH", outline, at)
+                pending.append(component)
+                at += 4 + (4 if flags & ARG_1_AND_2_ARE_WORDS else 2)
+                if flags & WE_HAVE_A_SCALE:
+                    at += 2
+                elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                    at += 4
+                elif flags & WE_HAVE_A_TWO_BY_TWO:
+                    at += 8
+                if not flags & MORE_COMPONENTS:
+                    break
+
+        outlines = []
+        loca = [0]
+        for glyph in range(self.glyph_count):
+            outline = glyf[offsets[glyph]:offsets[glyph + 1]] if glyph in keep else b""
+            outline += b"\0" * (-len(outline) % 4)
+            outlines.append(outline)
+            loca.append(loca[-1] + len(outline))
+        head = bytearray(self.table(b"head"))
+        struct.pack_into(">I", head, 8, 0)  # checkSumAdjustment, set once the file is complete
+        struct.pack_into(">h", head, 50, 1)  # Long loca offsets
+        tables = {tag: self.table(tag) for tag in SUBSET_TABLES if tag in self.tables}
+        tables.update({b"head": bytes(head), b"glyf": b"".join(outlines),
+                       b"loca": struct.pack(">%dI" % len(loca), *loca)})
+        return build_font_file(tables)
+
+
+def checksum(data):
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(">%dI" % (len(data) // 4), data)) & 0xFFFFFFFF
+
+
+def build_font_file(tables):
+    """Assembles an sfnt file from {tag: data}, with the table and whole-file checksums."""
+    tags = sorted(tables)
+    power = 1
+    while power * 2 <= len(tags):
+        power *= 2
+    header = struct.pack(">IHHHH", 0x00010000, len(tags), power * 16, power.bit_length() - 1,
+                         (len(tags) - power) * 16)
+    offset = len(header) + 16 * len(tags)
+    records = []
+    bodies = []
+    for tag in tags:
+        data = tables[tag]
+        records.append(struct.pack(">4sIII", tag, checksum(data), offset, len(data)))
+        bodies.append(data + b"\0" * (-len(data) % 4))
+        offset += len(bodies[-1])
+    font = bytearray(header + b"".join(records) + b"".join(bodies))
+    head_at = struct.unpack_from(">I", font, len(header) + 16 * tags.index(b"head") + 8)[0]
+    struct.pack_into(">I", font, head_at + 8, (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
@@ -0,0 +1,141 @@
+"""The Tk window around InstallationRecorder. Run it through main.py."""
+import os
+import logging
+import threading
+import tkinter as tk
+from tkinter import filedialog, ttk
+from recorder import InstallationRecorder
+
+logger = logging.getLogger(__name__)
+
+recorder = None
+root = None
+
+def open_pdf():
+    """Opens the most recently created PDF."""
+    if recorder.working_directory:
+        pdf_file = recorder.pdf_path()
+        if os.path.exists(pdf_file):
+            os.startfile(pdf_file)  # For Windows
+        else:
+            logger.warning("PDF file not found")
+
+def browse_directory():
+    directory = filedialog.askdirectory()
+    if directory:
+        working_directory_label.config(text=directory)
+        recorder.set_working_directory(directory)
+        start_button.config(state=tk.NORMAL)
+
+def start_recording():
+    recorder.start_recording()
+    start_button.config(state=tk.DISABLED)
+    stop_button.config(state=tk.NORMAL)
+    if recorder.live_summary:
+        summary_label.pack()
+        refresh_summary()
+
+def stop_recording():
+    recorder.stop_recording()
+    start_button.config(state=tk.NORMAL)
+    stop_button.config(state=tk.DISABLED)
+
+def refresh_summary():
+    """Shows the pipeline's queue depth, drops and slowest stages while recording."""
+    pipeline = recorder.pipeline
+    if pipeline is None:
+        summary_label.pack_forget()
+        return
+    stats = pipeline.stats()
+    stages = sorted(stats["stages"].items(), key=lambda item: item[1]["avg_ms"], reverse=True)[:3]
+    summary_label.config(text=(
+        f"{stats['written_steps']} steps, queue {stats['queue_depth']} (max {stats['max_queue_depth']}), "
+        f"{stats['dropped']} dropped\n"
+        + ", ".join(f"{stage} {values['avg_ms']:.0f} ms" for stage, values in stages)))
+    root.after(1000, refresh_summary)
+
+def cancel_conversion():
+    recorder.cancel_requested = True
+    pdf_button.config(state=tk.NORMAL, text="Convert to PDF")
+    progress_bar.pack_forget()
+    cancel_button.pack_forget()
+    
+def update_progress(done, total):
+    progress_bar.config(maximum=max(total, 1), value=done)
+
+def convert_to_pdf():
+    def report_progress(done, total):
+        # Called from the conversion thread; Tk must be updated from the main loop
+        root.after(0, update_progress, done, total)
+
+    def conversion_thread():
+        try:
+            pdf_file = recorder.convert_to_pdf(progress=report_progress)
+            if pdf_file:
+                # Open the PDF after successful conversion
+                os.startfile(pdf_file)  # For Windows
+        except Exception:
+            logger.exception("Error in conversion thread")
+        finally:
+            pdf_button.config(state=tk.NORMAL, text="Convert to PDF")
+            progress_bar.pack_forget()
+            cancel_button.pack_forget()
+            root.update()
+
+    pdf_button.config(state=tk.DISABLED, text="Converting...")
+    progress_bar.config(value=0)
+    progress_bar.pack()
+    cancel_button.pack()
+    root.update()
+
+    thread = threading.Thread(target=conversion_thread)
+    thread.daemon = True
+    thread.start()
+
+def build_window(installation_recorder=None):
+    """Creates the recorder and the window around it; returns the Tk root."""
+    global recorder, root, working_directory_label, start_button, stop_button, pdf_button
+    global progress_bar, cancel_button, summary_label
+    recorder = installation_recorder or InstallationRecorder()
+
+    root = tk.Tk()
+    root.title("Screen Scribe")
+    root.minsize(400, 230)  # Set minimum width to 400px
+
+    working_directory_label = tk.Label(root, text="Select working directory:")
+    working_directory_label.pack()
+
+    browse_button = tk.Button(root, text="Browse", command=browse_directory)
+    browse_button.pack()
+
+    start_button = tk.Button(root, text="Start Recording", command=start_recording, state=tk.DISABLED)
+    start_button.pack()
+
+    stop_button = tk.Button(root, text="Stop Recording", command=stop_recording, state=tk.DISABLED)
+    stop_button.pack()
+
+    pdf_button = tk.Button(root, text="Convert to PDF", command=convert_to_pdf)
+    pdf_button.pack()
+
+    open_pdf_button = tk.Button(root, text="Open PDF", command=open_pdf)
+    open_pdf_button.pack()
+
+    progress_bar = ttk.Progressbar(
+        root, 
+        mode='determinate',
+        length=200
+    )
+    progress_bar.pack_forget()  # Hide initially
+
+    cancel_button = tk.Button(root, text="Cancel Conversion", command=cancel_conversion)
+    cancel_button.pack()
+    cancel_button.pack_forget()  # Hide initially
+
+    summary_label = tk.Label(root, text="", justify=tk.LEFT)
+    summary_label.pack_forget()  # Shown while recording when live_summary is on
+    return root
+
+
+def run():
+    build_window().mainloop()
+
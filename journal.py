@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE_NAME = "journal.jsonl"
+
+MARKDOWN_HEADER = "# Software Installation Steps\n\n"
+
+
+class StepJournal:
+    """Append-only JSONL journal of everything recorded in a session.
+
+    The journal is the live storage format; markdown, HTML and PDF are all
+    rendered from it afterwards. It has exactly one writer (the pipeline's
+    writer thread), so there is no locking: events are buffered and flushed
+    in batches, and every step event is an fsync point so a crash loses at
+    most the keystrokes typed since the last click.
+    """
+
+    def __init__(self, path, flush_every=64, flush_interval=1.0):
+        self.path = path
+        self.session_dir = os.path.dirname(path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = None
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+        self.events_written = 0
+        self.bytes_written = 0
+
+    def open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, event, sync=False):
+        """Buffers one event. sync=True flushes and fsyncs everything written so far."""
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        self.file.write(line)
+        self.unflushed += 1
+        self.events_written += 1
+        self.bytes_written += len(line.encode("utf-8"))
+        if sync:
+            self.flush(sync=True)
+        elif self.unflushed >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, sync=False):
+        if self.file is None:
+            return
+        if self.unflushed:
+            self.file.flush()
+            self.unflushed = 0
+        if sync:
+            os.fsync(self.file.fileno())
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.flush(sync=True)
+            self.file.close()
+            self.file = None
+
+    def relative_path(self, path):
+        """Stores image paths relative to the session so the folder can be moved."""
+        try:
+            return os.path.relpath(path, self.session_dir)
+        except ValueError:  # Different drive on Windows
+            return path
+
+
+def read_journal(path):
+    """Yields the events of a journal. A torn final line from a crash is skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("Skipping unreadable journal line in %s", path)
+
+
+def resolve_image_path(event, session_dir):
+    image = event.get("image")
+    if image and not os.path.isabs(image):
+        image = os.path.join(session_dir, image)
+    return image
+
+
+def repeat_suffix(event):
+    """Suffix such as " ×3" for a key or shortcut folded from repeated presses."""
+    count = event.get("count", 1)
+    return f" ×{count}" if count > 1 else ""
+
+
+def event_to_markdown(event, session_dir):
+    """Renders a single journal event as markdown (empty string for unknown events)."""
+    kind = event.get("type")
+    if kind == "step":
+        text = f"## Step {event['step']}: {event.get('window_title', '')}\n\n"
+        if event.get("clicked_text"):
+            text += f"Clicked on: **{event['clicked_text']}**\n\n"
+        if event.get("typed_text"):
+            text += f"**Typed:** {event['typed_text']}\n\n"
+        image = resolve_image_path(event, session_dir)
+        text += f'<div style="text-align: center;"><img src="{image}" style="max-width: 100%; height: auto;"></div>\n\n'
+        return text
+    if kind == "typed":
+        return f"**Typed:** {event['text']}\n\n"
+    if kind == "key":
+        return f"**Pressed:** `{event['key']}`{repeat_suffix(event)}\n\n"
+    if kind == "clipboard":
+        if event.get("action") == "copy":
+            return f"**Copied to clipboard:** ```{event['text']}```\n\n"
+        return f"**Pasted from clipboard:** ```{event['text']}```\n\n"
+    if kind == "shortcut":
+        description = f" ({event['description']})" if event.get("description") else ""
+        return f"**Keyboard Shortcut:** `{event['keys']}`{description}{repeat_suffix(event)}\n\n"
+    return ""
+
+
+def render_markdown(journal_path):
+    """Renders the whole journal to a markdown string."""
+    session_dir = os.path.dirname(journal_path)
+    parts = [MARKDOWN_HEADER]
+    for event in read_journal(journal_path):
+        parts.append(event_to_markdown(event, session_dir))
+    return "".join(parts)
+
+
+def write_markdown(journal_path, markdown_path):
+    """Renders the journal into a markdown file next to it."""
+    session_dir = os.path.dirname(journal_path)
+    with open(markdown_path, "w", encoding="utf-8") as f:
+        f.write(MARKDOWN_HEADER)
+        for event in read_journal(journal_path):
+            f.write(event_to_markdown(event, session_dir))
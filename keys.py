@@ -0,0 +1,167 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Label recorded for each special key, by pynput key name
+KEY_LABELS = {
+    "enter": "Enter", "tab": "Tab", "esc": "Esc", "delete": "Delete", "backspace": "Backspace",
+    "space": "Space", "insert": "Insert", "home": "Home", "end": "End", "page_up": "Page Up",
+    "page_down": "Page Down", "up": "↑", "down": "↓", "left": "←", "right": "→",
+    "caps_lock": "Caps Lock", "num_lock": "Num Lock", "scroll_lock": "Scroll Lock",
+    "print_screen": "Print Screen", "pause": "Pause", "menu": "Menu",
+}
+KEY_LABELS.update({f"f{number}": f"F{number}" for number in range(1, 25)})
+
+# Modifier keys by pynput name; left/right variants fold into one
+MODIFIERS = {
+    "ctrl": "Ctrl", "ctrl_l": "Ctrl", "ctrl_r": "Ctrl",
+    "alt": "Alt", "alt_l": "Alt", "alt_r": "Alt", "alt_gr": "Alt",
+    "shift": "Shift", "shift_l": "Shift", "shift_r": "Shift",
+    "cmd": "Windows Key", "cmd_l": "Windows Key", "cmd_r": "Windows Key",
+}
+MODIFIER_ORDER = ("Ctrl", "Alt", "Shift", "Windows Key")
+
+# Descriptions for well-known chords; the clipboard ones also record the clipboard text
+SHORTCUTS = {
+    "Ctrl+A": "Select All", "Ctrl+X": "Cut", "Ctrl+Z": "Undo", "Ctrl+Y": "Redo",
+    "Ctrl+S": "Save", "Ctrl+F": "Find", "Alt+F4": "Close Window", "Alt+Tab": "Switch Window",
+}
+CLIPBOARD_SHORTCUTS = {"Ctrl+C": "copy", "Ctrl+V": "paste"}
+
+
+def key_label(name):
+    return KEY_LABELS.get(name) or name.replace("_", " ").title()
+
+
+def normalize_key(key):
+    """Returns (name, char) for a pynput-style key: a special key name or a typed character.
+
+    With Ctrl held, Windows reports letters as control characters ("\\x03"
+    for C) or only as a virtual key code; both are turned back into letters.
+    """
+    name = getattr(key, "name", None)
+    if name is not None:
+        return name, None
+    char = getattr(key, "char", None)
+    if char is not None and len(char) == 1 and ord(char) < 32:
+        char = chr(ord(char) + 96)
+    if char is None:
+        vk = getattr(key, "vk", None)
+        if vk is not None and (0x30 <= vk <= 0x39 or 0x41 <= vk <= 0x5A):
+            char = chr(vk).lower()
+    return None, char
+
+
+class KeyCoalescer:
+    """Turns raw key presses and releases into the journal's keyboard events.
+
+    Modifier state comes from the press/release events themselves, so no
+    key is ever polled. Characters typed without Ctrl/Alt/Windows build up
+    the typed text (handed to the next step, or recorded as one "typed"
+    event on Enter); keys pressed with a modifier become one "shortcut" event
+    such as "Ctrl+Shift+T"; a modifier pressed and released on its own is
+    recorded as a key; and the same key or chord repeated within
+    `repeat_window` seconds is folded into a single event with a count.
+
+    press() and release() return the events that are complete; the last
+    repeatable one is held back until something else happens or flush().
+    """
+
+    def __init__(self, repeat_window=1.0):
+        self.repeat_window = repeat_window
+        self.held = set()
+        self.lone_modifier = None
+        self.typed = ""
+        self.pending = None
+        self.pending_at = 0.0
+
+    def press(self, key, now=None):
+        now = time.time() if now is None else now
+        name, char = normalize_key(key)
+        modifier = MODIFIERS.get(name)
+        if modifier:
+            if modifier not in self.held:  # Held modifiers auto-repeat
+                self.lone_modifier = modifier if not self.held else None
+                self.held.add(modifier)
+            return []
+        self.lone_modifier = None
+
+        modifiers = [held for held in MODIFIER_ORDER if held in self.held]
+        if char is not None and not (set(modifiers) - {"Shift"}):
+            # Plain typing (Shift only changes the character)
+            self.typed += char
+            return self.flush()
+        if modifiers:
+            keys = "+".join(modifiers + [char.upper() if char is not None else key_label(name)])
+            if keys in CLIPBOARD_SHORTCUTS:
+                # The text is filled in later, off the listener thread
+                return self.flush() + [{"type": "clipboard", "time": now, "action": CLIPBOARD_SHORTCUTS[keys]}]
+            return self._repeatable({"type": "shortcut", "time": now, "keys": keys,
+                                     "description": SHORTCUTS.get(keys, "")}, now)
+        if name == "space":
+            self.typed += " "
+            return self.flush()
+        if name == "backspace":
+            self.typed = self.typed[:-1]
+            return self.flush()
+        events = []
+        if name == "enter" and self.typed:
+            events = self.flush() + [{"type": "typed", "time": now, "text": self.typed}]
+            self.typed = ""
+        return events + self._repeatable({"type": "key", "time": now, "key": key_label(name)}, now)
+
+    def release(self, key, now=None):
+        now = time.time() if now is None else now
+        name, _ = normalize_key(key)
+        modifier = MODIFIERS.get(name)
+        if not modifier:
+            return []
+        self.held.discard(modifier)
+        if modifier == self.lone_modifier:
+            self.lone_modifier = None
+            return self._repeatable({"type": "key", "time": now, "key": modifier}, now)
+        return []
+
+    def consume(self, text):
+        """Removes text handed to a step from the front of the typed buffer."""
+        if self.typed.startswith(text):
+            self.typed = self.typed[len(text):]
+        else:  # Edited with backspace in the meantime
+            self.typed = ""
+
+    def flush(self):
+        """Returns the held-back repeatable event, if any."""
+        if self.pending is None:
+            return []
+        event = self.pending
+        self.pending = None
+        return [event]
+
+    def _repeatable(self, event, now):
+        pending = self.pending
+        if (pending is not None and now - self.pending_at <= self.repeat_window
+                and pending["type"] == event["type"] and pending.get("key") == event.get("key")
+                and pending.get("keys") == event.get("keys")):
+            pending["count"] = pending.get("count", 1) + 1
+            self.pending_at = now
+            return []
+        events = self.flush()
+        self.pending = event
+        self.pending_at = now
+        return events
+
+
+def read_clipboard(clipboard, event, delay=0.1):
+    """Fills in a clipboard event's text. Runs off the listener thread.
+
+    The short delay gives the application time to put copied text on the
+    clipboard before it is read.
+    """
+    time.sleep(delay)
+    try:
+        event["text"] = clipboard.paste()
+    except Exception as e:
+        logger.error("Error reading the clipboard: %s", e)
+        event["text"] = ""
+    return event
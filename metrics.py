@@ -0,0 +1,93 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE_NAME = "metrics.jsonl"
+
+
+class SessionMetrics:
+    """Per-step stage timings, queue depth and drops for one session.
+
+    Every record is a line in the session's metrics.jsonl: one "step" line per
+    written step with its stage timings in milliseconds, "drop" lines for
+    frames the pipeline had no room for, "export" lines with the phases of
+    each PDF export, and a "summary" line with percentiles when recording
+    stops. Components take metrics=None when instrumentation is off and skip
+    all of this.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.file = None
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def measure(self, stage, phases=None):
+        """Times the block as `stage`; also stores it in the `phases` dict if given."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.record(stage, seconds)
+            if phases is not None:
+                phases[stage] = round(seconds * 1000, 3)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line)
+
+    def step(self, step, timings, queue_depth):
+        for stage, seconds in timings.items():
+            self.record(stage, seconds)
+        self.write({"type": "step", "step": step, "time": time.time(), "queue_depth": queue_depth,
+                    "ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}})
+
+    def drop(self, step, queue_depth):
+        self.write({"type": "drop", "step": step, "time": time.time(), "queue_depth": queue_depth})
+
+    def export(self, backend, phases):
+        # Exports run after recording stopped, so the file isn't kept open
+        self.write({"type": "export", "backend": backend, "time": time.time(), "ms": phases})
+        self._close_file()
+
+    def summary(self):
+        """Count, average, p50, p95 and max in milliseconds for every stage seen so far."""
+        with self.lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        summary = {}
+        for stage, values in samples.items():
+            summary[stage] = {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(values[len(values) // 2] * 1000, 3),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return summary
+
+    def _close_file(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def close(self, **fields):
+        """Writes the summary line (plus any extra fields) and closes the file."""
+        record = {"type": "summary", "time": time.time(), "stages": self.summary()}
+        record.update(fields)
+        self.write(record)
+        self._close_file()
+        logger.info("Session metrics written to %s", self.path)
@@ -0,0 +1,551 @@
+import gc
+import io
+import logging
+import os
+import unicodedata
+import zlib
+
+from PIL import Image
+
+from derivatives import DerivativeCache
+from export import ExportCancelled, export_phase
+from journal import read_journal, repeat_suffix, resolve_image_path
+
+logger = logging.getLogger(__name__)
+
+# A4 in points with the same 20mm margins as the wkhtmltopdf export
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 56.69
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+# Helvetica advance widths (1/1000 em) for ASCII 32..126, from the standard AFM
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+BOLD_WIDTH_FACTOR = 1.08
+
+STREAM_CHUNK = 256 * 1024
+
+# Stand-ins for the arrow key labels when there's no Unicode font to draw them with
+WINANSI_FALLBACKS = str.maketrans({"↑": "Up", "↓": "Down", "←": "Left", "→": "Right"})
+
+
+def text_width(text, size, bold=False):
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += HELVETICA_WIDTHS[code - 32] if 32 <= code <= 126 else 556
+    return total * size / 1000 * (BOLD_WIDTH_FACTOR if bold else 1)
+
+
+def wrap_text(text, size, width, bold=False, measure=None):
+    """Greedy word wrap using the Helvetica metrics, or measure(text) in points.
+
+    A word wider than a whole line (a path, a licence key) is broken between characters.
+    """
+    measure = measure or (lambda part: text_width(part, size, bold))
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = word if not line else line + " " + word
+            if measure(candidate) <= width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            line = word
+            head = fitting_prefix(line, width, measure)
+            while head < len(line):
+                lines.append(line[:head])
+                line = line[head:]
+                head = fitting_prefix(line, width, measure)
+        lines.append(line)
+    return lines
+
+
+def fitting_prefix(text, width, measure):
+    """Length of the longest start of text that fits in width, at least one character."""
+    total = 0
+    for index, char in enumerate(text):
+        total += measure(char)
+        if total > width:
+            return max(index, 1)
+    return len(text)
+
+
+def winansi_text(text):
+    """text with the characters Windows-1252 lacks spelled out, stripped of accents or replaced by "?"."""
+    text = text.translate(WINANSI_FALLBACKS)
+    try:
+        text.encode("cp1252")
+        return text
+    except UnicodeEncodeError:
+        pass
+    chars = []
+    for char in text:
+        try:
+            char.encode("cp1252")
+        except UnicodeEncodeError:
+            base = "".join(part for part in unicodedata.normalize("NFKD", char) if not unicodedata.combining(part))
+            try:
+                base.encode("cp1252")
+                char = base or "?"
+            except UnicodeEncodeError:
+                char = "?"
+        chars.append(char)
+    return "".join(chars)
+
+
+def pdf_string(text):
+    data = text.encode("cp1252", "replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def pdf_text_string(text):
+    """A PDF text string that keeps any character (UTF-16 with a byte order mark)."""
+    return b"<FEFF" + text.encode("utf-16-be").hex().upper().encode() + b">"
+
+
+def pdf_value(value, reference):
+    """Serializes a pypdf object, numbering indirect references through reference(indirect)."""
+    from pypdf.generic import ArrayObject, IndirectObject, StreamObject
+
+    if isinstance(value, IndirectObject):
+        return b"%d 0 R" % reference(value)
+    if isinstance(value, StreamObject):
+        data = value._data  # Still encoded; copied as is
+        return (pdf_dictionary(value, reference, b"/Length %d" % len(data), skip=("/Length",))
+                + b"\nstream\n" + data + b"\nendstream")
+    if isinstance(value, dict):
+        return pdf_dictionary(value, reference)
+    if isinstance(value, (list, ArrayObject)):
+        return b"[" + b" ".join(pdf_value(item, reference) for item in value) + b"]"
+    stream = io.BytesIO()
+    value.write_to_stream(stream)
+    return stream.getvalue()
+
+
+def pdf_dictionary(value, reference, extra=None, skip=()):
+    entries = [pdf_value(key, reference) + b" " + pdf_value(item, reference)
+               for key, item in dict.items(value) if key not in skip]
+    if extra:
+        entries.append(extra)
+    return b"<< " + b" ".join(entries) + b" >>"
+
+
+class StandardFont:
+    """Helvetica (or Helvetica-Bold) with WinAnsiEncoding, which every PDF reader has built in."""
+
+    def __init__(self, resource, bold):
+        self.resource = resource
+        self.bold = bold
+
+    def width(self, text, size):
+        return text_width(text, size, self.bold)
+
+    def encode(self, text):
+        return pdf_string(text)
+
+
+STANDARD_FONTS = {False: StandardFont(b"F1", False), True: StandardFont(b"F2", True)}
+
+
+class EmbeddedFont:
+    """A TrueType font drawn by glyph id (Identity-H); the glyphs used are embedded when the PDF is closed."""
+
+    def __init__(self, font, resource, object_id):
+        self.font = font
+        self.resource = resource
+        self.object_id = object_id
+        self.used = {}  # Glyph id -> character, for the subset and the ToUnicode map
+
+    def width(self, text, size):
+        return self.font.width(text, size)
+
+    def encode(self, text):
+        glyphs = [self.font.glyph(char) for char in text]
+        for glyph, char in zip(glyphs, text):
+            self.used.setdefault(glyph, char)
+        return b"<" + "".join("%04X" % glyph for glyph in glyphs).encode() + b">"
+
+
+class PdfStreamWriter:
+    """Minimal PDF writer that streams every object to disk as soon as it's complete.
+
+    Only the object offsets and page ids are kept in memory, so the memory
+    used doesn't grow with the images: each page's images are copied into the
+    file in chunks as JPEG (DCTDecode) streams and never decoded.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.offsets = [0]
+        self.page_ids = []
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.pages_id = self._reserve()
+        # (title, page id, top, children) of the bookmarks copied from appended PDFs
+        self.outline = []
+        self.regular_font = self._write_object(
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self.bold_font = self._write_object(
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        # (regular, bold) TrueTypeFonts for text outside WinAnsi, found when first needed; False if none is installed
+        self.unicode_fonts = None
+        self.embedded_fonts = {}  # TrueTypeFont -> EmbeddedFont
+
+    def _reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _begin_object(self, object_id=None):
+        if object_id is None:
+            object_id = self._reserve()
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % object_id)
+        return object_id
+
+    def _write_object(self, body, object_id=None):
+        object_id = self._begin_object(object_id)
+        self.file.write(body + b"\nendobj\n")
+        return object_id
+
+    def add_jpeg(self, source):
+        """Embeds a JPEG (a path or a seekable binary file) as an image XObject.
+
+        Returns (object id, width, height).
+        """
+        f = open(source, "rb") if isinstance(source, str) else source
+        try:
+            with Image.open(f) as image:  # Reads the header only
+                width, height = image.size
+                color_space = b"/DeviceGray" if image.mode == "L" else b"/DeviceRGB"
+            length = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            object_id = self._begin_object()
+            self.file.write(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+                            b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n"
+                            % (width, height, color_space, length))
+            while True:
+                chunk = f.read(STREAM_CHUNK)
+                if not chunk:
+                    break
+                self.file.write(chunk)
+        finally:
+            if f is not source:
+                f.close()
+        self.file.write(b"\nendstream\nendobj\n")
+        return object_id, width, height
+
+    def text_font(self, text, bold=False):
+        """Helvetica when WinAnsi has every character of text, else the embedded Unicode font.
+
+        Returns None when text needs a Unicode font and none is installed.
+        """
+        try:
+            text.encode("cp1252")
+            return STANDARD_FONTS[bold]
+        except UnicodeEncodeError:
+            pass
+        if self.unicode_fonts is None:
+            from fonts import find_unicode_fonts
+            self.unicode_fonts = find_unicode_fonts() or False
+            if not self.unicode_fonts:
+                logger.warning("No Unicode TrueType font found, characters outside Windows-1252 are replaced")
+        if not self.unicode_fonts:
+            return None
+        font = self.unicode_fonts[bold]
+        if font not in self.embedded_fonts:
+            resource = b"F%d" % (3 + len(self.embedded_fonts))
+            self.embedded_fonts[font] = EmbeddedFont(font, resource, self._reserve())
+        return self.embedded_fonts[font]
+
+    def add_page(self, content, images):
+        """Writes one page. content is the page's drawing operators, images maps names to ids."""
+        content_id = self._write_object(
+            b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        xobjects = b" ".join(b"/%s %d 0 R" % (name.encode(), image_id) for name, image_id in images.items())
+        embedded = b"".join(b" /%s %d 0 R" % (font.resource, font.object_id)
+                            for font in self.embedded_fonts.values())
+        page_id = self._write_object(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R /F2 %d 0 R%s >> /XObject << %s >> >> >>"
+            % (self.pages_id, PAGE_WIDTH, PAGE_HEIGHT, content_id, self.regular_font,
+               self.bold_font, embedded, xobjects))
+        self.page_ids.append(page_id)
+
+    def append_pdf(self, source):
+        """Copies every page of another PDF (a wkhtmltopdf fragment, say) and its bookmarks.
+
+        Objects are written out as soon as they're copied, with their
+        references renumbered, so memory is bounded by the largest source
+        rather than by everything appended so far.
+        """
+        self._copy_pdf(source)
+        # pypdf's objects point back at their reader, so only the cycle collector
+        # frees the source's data, and only once _copy_pdf's locals are gone
+        gc.collect()
+
+    def _copy_pdf(self, source):
+        from pypdf import PdfReader
+
+        reader = PdfReader(source)
+        ids = {reader.trailer["/Root"].raw_get("/Pages").idnum: self.pages_id}
+        queue = []
+
+        def reference(indirect):
+            if indirect.idnum not in ids:
+                ids[indirect.idnum] = self._reserve()
+                queue.append(indirect)
+            return ids[indirect.idnum]
+
+        page_ids = [reference(page.indirect_reference) for page in reader.pages]
+        self.page_ids.extend(page_ids)
+        while queue:
+            indirect = queue.pop()
+            value = indirect.get_object()
+            if isinstance(value, dict) and value.get("/Type") == "/Page":
+                # pypdf has already copied what the page inherits from its page tree onto it
+                body = pdf_dictionary(value, reference, b"/Parent %d 0 R" % self.pages_id, skip=("/Parent",))
+            else:
+                body = pdf_value(value, reference)
+            self._write_object(body, ids[indirect.idnum])
+
+        def bookmarks(items):
+            entries = []
+            for item in items:
+                if isinstance(item, list):
+                    if entries:
+                        entries[-1][3].extend(bookmarks(item))
+                    continue
+                page = reader.get_destination_page_number(item)
+                if page is not None and page >= 0:
+                    entries.append((item.title, page_ids[page], item.top, []))
+            return entries
+
+        self.outline.extend(bookmarks(reader.outline))
+
+    def _write_outline(self, entries, parent_id):
+        """Writes one level of bookmarks. Returns (first id, last id, items including descendants)."""
+        item_ids = [self._reserve() for _ in entries]
+        count = len(entries)
+        for index, (title, page_id, top, children) in enumerate(entries):
+            body = b"<< /Title %s /Parent %d 0 R /Dest [%d 0 R /XYZ null %s null]" % (
+                pdf_text_string(title), parent_id, page_id, b"null" if top is None else b"%.2f" % float(top))
+            if index:
+                body += b" /Prev %d 0 R" % item_ids[index - 1]
+            if index + 1 < len(entries):
+                body += b" /Next %d 0 R" % item_ids[index + 1]
+            if children:
+                first, last, descendants = self._write_outline(children, item_ids[index])
+                body += b" /First %d 0 R /Last %d 0 R /Count %d" % (first, last, descendants)
+                count += descendants
+            self._write_object(body + b" >>", item_ids[index])
+        return item_ids[0], item_ids[-1], count
+
+    def _write_embedded_font(self, embedded):
+        """Writes a Type0 font with the subset of its TrueType font that was drawn, and its ToUnicode map."""
+        font = embedded.font
+        glyphs = sorted(embedded.used)
+        # Subsets are named with six letters that differ with the glyphs they hold
+        tag_number = zlib.crc32(repr(glyphs).encode())
+        tag = ""
+        for _ in range(6):
+            tag_number, letter = divmod(tag_number, 26)
+            tag += chr(65 + letter)
+        name = f"{tag}+{font.name}".encode()
+        data = font.subset(glyphs)
+        compressed = zlib.compress(data)
+        file_id = self._write_object(b"<< /Length %d /Length1 %d /Filter /FlateDecode >>\nstream\n"
+                                     % (len(compressed), len(data)) + compressed + b"\nendstream")
+        descriptor_id = self._write_object(
+            b"<< /Type /FontDescriptor /FontName /%s /Flags 32 /FontBBox [%d %d %d %d] /ItalicAngle %d "
+            b"/Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>"
+            % (name, *font.bbox, font.italic_angle, font.ascent, font.descent, font.cap_height, file_id))
+        widths = b" ".join(b"%d [%d]" % (glyph, font.widths[glyph]) for glyph in glyphs)
+        cid_font_id = self._write_object(
+            b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s "
+            b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            b"/FontDescriptor %d 0 R /W [%s] /CIDToGIDMap /Identity >>" % (name, descriptor_id, widths))
+        mapped = [(glyph, embedded.used[glyph]) for glyph in glyphs if glyph]
+        blocks = []
+        for start in range(0, len(mapped), 100):  # At most 100 entries per bfchar block
+            block = mapped[start:start + 100]
+            blocks.append(b"%d beginbfchar\n" % len(block) + b"".join(
+                b"<%04X> <%s>\n" % (glyph, char.encode("utf-16-be").hex().upper().encode())
+                for glyph, char in block) + b"endbfchar")
+        cmap = (b"/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+                b"/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+                b"/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+                b"1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+                + b"\n".join(blocks)
+                + b"\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend")
+        to_unicode_id = self._write_object(b"<< /Length %d >>\nstream\n" % len(cmap) + cmap + b"\nendstream")
+        self._write_object(b"<< /Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H "
+                           b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>"
+                           % (name, cid_font_id, to_unicode_id), embedded.object_id)
+
+    def close(self):
+        for embedded in self.embedded_fonts.values():
+            self._write_embedded_font(embedded)
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self._write_object(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)),
+                           self.pages_id)
+        outlines = b""
+        if self.outline:
+            outlines_id = self._reserve()
+            first, last, count = self._write_outline(self.outline, outlines_id)
+            self._write_object(b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>"
+                               % (first, last, count), outlines_id)
+            outlines = b" /Outlines %d 0 R /PageMode /UseOutlines" % outlines_id
+        catalog_id = self._write_object(b"<< /Type /Catalog /Pages %d 0 R%s >>" % (self.pages_id, outlines))
+        xref_offset = self.file.tell()
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self.file.write(b"%010d 00000 n \n" % offset)
+        self.file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                        % (len(self.offsets), catalog_id, xref_offset))
+        self.file.close()
+
+
+class PageLayout:
+    """Flows headings, paragraphs and images down A4 pages, flushing each page when full."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.content = []
+        self.images = {}
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def new_page(self):
+        if self.content or self.images:
+            self.writer.add_page(b"\n".join(self.content), self.images)
+        self.content = []
+        self.images = {}
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure_space(self, height):
+        if self.y - height < MARGIN and self.y < PAGE_HEIGHT - MARGIN:
+            self.new_page()
+
+    def text(self, text, size=11, bold=False, space_after=8):
+        leading = size * 1.3
+        font = self.writer.text_font(text, bold)
+        if font is None:
+            text = winansi_text(text)
+            font = STANDARD_FONTS[bold]
+        for line in wrap_text(text, size, CONTENT_WIDTH, bold, lambda part: font.width(part, size)):
+            self.ensure_space(leading)
+            self.y -= leading
+            self.content.append(b"BT /%s %.1f Tf %.2f %.2f Td %s Tj ET"
+                                % (font.resource, size, MARGIN, self.y, font.encode(line)))
+        self.y -= space_after
+
+    def image(self, path):
+        image_id, width, height = self.writer.add_jpeg(path)
+        # Scale to the content width (never up), and down further if taller than a page
+        scale = min(1.0, CONTENT_WIDTH / width, (PAGE_HEIGHT - 2 * MARGIN) / height)
+        draw_width = width * scale
+        draw_height = height * scale
+        self.ensure_space(draw_height)
+        self.y -= draw_height
+        name = "Im%d" % image_id
+        self.images[name] = image_id
+        left = MARGIN + (CONTENT_WIDTH - draw_width) / 2  # Centered like the HTML export
+        self.content.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /%s Do Q"
+                            % (draw_width, draw_height, left, self.y, name.encode()))
+        self.y -= 12
+
+    def close(self):
+        self.new_page()
+
+
+def render_event(layout, event, image):
+    kind = event.get("type")
+    if kind == "step":
+        layout.ensure_space(120)  # Keep a heading together with the start of its step
+        layout.text(f"Step {event['step']}: {event.get('window_title', '')}", size=15, bold=True)
+        if event.get("clicked_text"):
+            layout.text(f"Clicked on: {event['clicked_text']}")
+        if event.get("typed_text"):
+            layout.text(f"Typed: {event['typed_text']}")
+        if image:
+            layout.image(image)
+    elif kind == "typed":
+        layout.text(f"Typed: {event['text']}")
+    elif kind == "key":
+        layout.text(f"Pressed: {event['key']}{repeat_suffix(event)}")
+    elif kind == "clipboard":
+        label = "Copied to clipboard" if event.get("action") == "copy" else "Pasted from clipboard"
+        layout.text(f"{label}: {event['text']}")
+    elif kind == "shortcut":
+        description = f" ({event['description']})" if event.get("description") else ""
+        layout.text(f"Keyboard Shortcut: {event['keys']}{description}{repeat_suffix(event)}")
+
+
+def export_native_pdf(journal_file, pdf_file, image_dpi=200, workers=None, progress=None,
+                      is_cancelled=None, metrics=None, phases=None):
+    """Builds the PDF straight from the journal, one page at a time.
+
+    Screenshots are embedded as page-fit JPEG renditions copied into the file
+    without re-encoding. is_cancelled() is checked before every step.
+    Phase timings go to `metrics` and the `phases` dict when given.
+    """
+    phases = {} if phases is None else phases
+    session_dir = os.path.dirname(journal_file)
+    sources = []
+    total = 0
+    for event in read_journal(journal_file):
+        if event.get("type") == "step":
+            total += 1
+            image = resolve_image_path(event, session_dir)
+            if image:
+                sources.append(image)
+    with export_phase(metrics, "export.derivatives", phases):
+        derivatives = DerivativeCache(dpi=image_dpi or 200, workers=workers).prepare(sources)
+    del sources
+
+    images = (derivatives.get(resolve_image_path(event, session_dir))
+              for event in read_journal(journal_file) if event.get("type") == "step")
+    with export_phase(metrics, "export.pages", phases):
+        write_native_pdf(read_journal(journal_file), images, pdf_file, total, progress, is_cancelled)
+    return pdf_file
+
+
+def write_native_pdf(events, images, pdf_file, total, progress=None, is_cancelled=None):
+    """Writes the events to pdf_file, taking each step's image (a JPEG path or file, or None) from `images`."""
+    is_cancelled = is_cancelled or (lambda: False)
+    if progress:
+        progress(0, total)
+    temp_path = pdf_file + ".part"
+    writer = PdfStreamWriter(temp_path)
+    layout = PageLayout(writer)
+    completed = False
+    try:
+        layout.text("Software Installation Steps", size=22, bold=True, space_after=14)
+        done = 0
+        for event in events:
+            image = None
+            if event.get("type") == "step":
+                if is_cancelled():
+                    raise ExportCancelled()
+                image = next(images, None)
+            render_event(layout, event, image)
+            if event.get("type") == "step":
+                done += 1
+                if progress:
+                    progress(done, total)
+        layout.close()
+        completed = True
+    finally:
+        writer.close()
+        if not completed:
+            os.remove(temp_path)
+    os.replace(temp_path, pdf_file)
+    logger.info("PDF successfully saved to %s", pdf_file)
@@ -0,0 +1,368 @@
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+WINDOWS_TESSERACT_DIR = r'C:\Program Files\Tesseract-OCR'
+
+# Gap between stacked crops when a batch goes through a single tesseract call
+BATCH_GAP = 20
+
+# Adaptive click regions: how far from the click an element may extend
+# (half width, half height), how close its first ink must be, and the
+# padding left around the detected box
+SEARCH_MARGIN = (320, 96)
+SEED_RADIUS = 24
+CROP_PADDING = 4
+MAX_GROW_PASSES = 8
+# Ink covering this much of its box is a filled element rather than text
+SOLID_FILL = 0.6
+MIN_ELEMENT_HEIGHT = 16
+# Its inside is cropped 2 px in from each edge, so it must be wider than this
+MIN_SOLID_WIDTH = 4
+# Caps the gap bridged when the seed is a large outline rather than a glyph
+MAX_LINE_HEIGHT = 32
+# The "fixed" region: this far from the click in each direction (a 100x100 crop)
+FIXED_MARGIN = 50
+# Crops whose darkest and lightest pixels differ by less than this hold no text
+MIN_CONTRAST = 32
+# Rows/columns with more ink than this are separators or panel edges
+LINE_FILL = 0.9
+
+
+class OcrEngine:
+    """Base class for OCR backends. Engines are created once and reused for the whole recording."""
+
+    name = None
+
+    def __init__(self, lang="eng", psm=3):
+        self.lang = lang
+        self.psm = psm
+
+    def recognize(self, image):
+        return self.recognize_batch([image])[0]
+
+    def recognize_batch(self, images):
+        return [self.recognize(image) for image in images]
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine(OcrEngine):
+    """Long-lived Tesseract API handle: language data is loaded once, no subprocess per call."""
+
+    name = "tesserocr"
+
+    def __init__(self, lang="eng", psm=3, tessdata_path=None):
+        super().__init__(lang, psm)
+        import tesserocr
+        if tessdata_path is None and os.path.isdir(os.path.join(WINDOWS_TESSERACT_DIR, "tessdata")):
+            tessdata_path = os.path.join(WINDOWS_TESSERACT_DIR, "tessdata")
+        kwargs = {"lang": lang, "psm": psm}
+        if tessdata_path:
+            kwargs["path"] = tessdata_path
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        # The API object isn't thread-safe; engines are per thread but guard anyway
+        self.lock = threading.Lock()
+
+    def recognize(self, image):
+        if image.mode == '1':
+            image = image.convert('L')
+        with self.lock:
+            self.api.SetImage(image)
+            return self.api.GetUTF8Text()
+
+    def close(self):
+        self.api.End()
+
+
+class PytesseractEngine(OcrEngine):
+    """Fallback that shells out to the tesseract binary.
+
+    A batch is stacked into one tall image so the binary is launched and the
+    language data loaded once per batch rather than once per crop.
+    """
+
+    name = "pytesseract"
+
+    def __init__(self, lang="eng", psm=3):
+        super().__init__(lang, psm)
+        import pytesseract
+        self.pytesseract = pytesseract
+        windows_cmd = os.path.join(WINDOWS_TESSERACT_DIR, "tesseract.exe")
+        if os.path.exists(windows_cmd):
+            pytesseract.pytesseract.tesseract_cmd = windows_cmd
+        self.config = f"--psm {psm}"
+
+    def recognize(self, image):
+        return self.pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+    def recognize_batch(self, images):
+        if len(images) == 1:
+            return [self.recognize(images[0])]
+
+        # Stack the crops vertically and remember which rows belong to which crop
+        width = max(image.width for image in images)
+        height = sum(image.height for image in images) + BATCH_GAP * (len(images) + 1)
+        sheet = Image.new("L", (width, height), 255)
+        bands = []
+        top = BATCH_GAP
+        for image in images:
+            sheet.paste(image.convert("L"), (0, top))
+            bands.append((top, top + image.height))
+            top += image.height + BATCH_GAP
+
+        data = self.pytesseract.image_to_data(sheet, lang=self.lang, config=self.config,
+                                              output_type=self.pytesseract.Output.DICT)
+        words = [[] for _ in images]
+        for text, word_top, word_height in zip(data["text"], data["top"], data["height"]):
+            if not text.strip():
+                continue
+            middle = word_top + word_height / 2
+            for index, (band_top, band_bottom) in enumerate(bands):
+                if band_top - BATCH_GAP / 2 <= middle < band_bottom + BATCH_GAP / 2:
+                    words[index].append(text)
+                    break
+        return [" ".join(crop_words) for crop_words in words]
+
+
+ENGINES = {
+    "tesserocr": TesserocrEngine,
+    "pytesseract": PytesseractEngine,
+}
+
+_local = threading.local()
+_engines = []
+_engines_lock = threading.Lock()
+
+
+def create_ocr_engine(engine="auto", lang="eng", psm=3):
+    """Creates an OCR engine. "auto" prefers the resident tesserocr API and
+    falls back to pytesseract when tesserocr isn't installed."""
+    if engine == "auto":
+        try:
+            return TesserocrEngine(lang, psm)
+        except Exception as e:
+            logger.info("tesserocr unavailable (%s), falling back to pytesseract", e)
+            return PytesseractEngine(lang, psm)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown OCR engine '{engine}', expected auto or one of {', '.join(ENGINES)}")
+    return ENGINES[engine](lang, psm)
+
+
+def get_ocr_engine(engine="auto", lang="eng", psm=3):
+    """Returns this thread's warm engine for the given settings, creating it on first use.
+
+    Pipeline workers call this for every step, so each worker thread (or
+    process) keeps one engine alive for the life of the recording.
+    """
+    key = (engine, lang, psm)
+    engines = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    if key not in engines:
+        engines[key] = create_ocr_engine(engine, lang, psm)
+        with _engines_lock:
+            _engines.append(engines[key])
+    return engines[key]
+
+
+def close_ocr_engines():
+    """Releases every engine created in this process."""
+    with _engines_lock:
+        for engine in _engines:
+            try:
+                engine.close()
+            except Exception as e:
+                logger.warning("Error closing OCR engine: %s", e)
+        _engines.clear()
+    _local.engines = {}
+
+
+def crop_click_region(screenshot, x, y, region="adaptive"):
+    """Crops and binarizes the region around a click for OCR.
+
+    region="adaptive" OCRs only the text block or UI element under the click
+    (see find_click_region); "fixed" is the original 100x100 crop with a
+    global threshold.
+    """
+    if region == "fixed":
+        return fixed_click_crop(screenshot, x, y)
+    if region != "adaptive":
+        raise ValueError(f"Unknown OCR region '{region}', expected adaptive or fixed")
+    width, height = screenshot.size
+    x = min(max(int(x), 0), width - 1)
+    y = min(max(int(y), 0), height - 1)
+    left = max(0, x - SEARCH_MARGIN[0])
+    top = max(0, y - SEARCH_MARGIN[1])
+    gray = np.asarray(screenshot.crop((left, top, min(width, x + SEARCH_MARGIN[0]),
+                                       min(height, y + SEARCH_MARGIN[1]))).convert("L"))
+    box = find_click_region(gray, x - left, y - top)
+    if box is None or box[2] <= box[0] or box[3] <= box[1]:
+        return fixed_click_crop(screenshot, x, y)
+    box_left, box_top, box_right, box_bottom = box
+    return binarize(gray[box_top:box_bottom, box_left:box_right])
+
+
+def region_settings(region):
+    """The crop settings of an OCR region mode, for keys of cached OCR results."""
+    if region == "fixed":
+        return f"fixed-{2 * FIXED_MARGIN}"
+    return f"{region}-{SEARCH_MARGIN[0]}x{SEARCH_MARGIN[1]}+{CROP_PADDING}"
+
+
+def fixed_click_crop(screenshot, x, y):
+    width, height = screenshot.size
+    # Create a larger region around the click (100x100 pixels)
+    margin = FIXED_MARGIN
+    left = max(0, x - margin)
+    top = max(0, y - margin)
+    right = min(width, x + margin)
+    bottom = min(height, y + margin)
+
+    # Additional validation to ensure proper coordinates
+    if right <= left:
+        right = left + 100  # Add minimum width
+    if bottom <= top:
+        bottom = top + 40   # Add minimum height
+
+    # Crop the region around the click
+    cropped_image = screenshot.crop((left, top, right, bottom))
+
+    # Enhance the image for better OCR
+    enhanced_image = cropped_image.convert('L')  # Convert to grayscale
+    return enhanced_image.point(lambda x: 0 if x < 128 else 255, '1')  # Increase contrast
+
+
+def otsu_threshold(gray):
+    """Otsu's threshold of a uint8 array: pixels <= the result are the dark class."""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    dark_count = np.cumsum(histogram)
+    dark_sum = np.cumsum(histogram * np.arange(256))
+    light_count = dark_count[-1] - dark_count
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (dark_sum[-1] * dark_count - dark_sum * dark_count[-1]) ** 2 / (dark_count * light_count)
+    return int(np.argmax(np.nan_to_num(between, nan=0.0, posinf=0.0)))
+
+
+def ink_mask(gray):
+    """True where the foreground is, by a per-region Otsu threshold.
+
+    The background is whichever side of the threshold covers more pixels,
+    so light text on a dark theme or a dark button comes out as ink too.
+    Returns None for regions too flat to hold any text.
+    """
+    if not gray.size or int(gray.max()) - int(gray.min()) < MIN_CONTRAST:
+        return None
+    dark = gray <= otsu_threshold(gray)
+    return dark if np.count_nonzero(dark) * 2 < dark.size else ~dark
+
+
+def grow_span(profile, start, end, gap):
+    """Grows [start, end) over a 1D ink profile to every run of ink at most `gap` away."""
+    ink = np.flatnonzero(profile)
+    if not len(ink):
+        return start, end
+    breaks = np.flatnonzero(np.diff(ink) > gap)
+    run_starts = np.concatenate((ink[:1], ink[breaks + 1]))
+    run_ends = np.concatenate((ink[breaks], ink[-1:])) + 1
+    while True:
+        touching = (run_starts <= end + gap) & (run_ends >= start - gap)
+        grown = (min(start, int(run_starts[touching].min())), max(end, int(run_ends[touching].max()))) \
+            if touching.any() else (start, end)
+        if grown == (start, end):
+            return start, end
+        start, end = grown
+
+
+def grow_box(ink, box, column_gap, row_gap):
+    """Grows a (left, top, right, bottom) box over the ink until it stops changing."""
+    for _ in range(MAX_GROW_PASSES):
+        left, top, right, bottom = box
+        top, bottom = grow_span(ink[:, left:right].any(axis=1), top, bottom, row_gap)
+        left, right = grow_span(ink[top:bottom].any(axis=0), left, right, column_gap)
+        if (left, top, right, bottom) == box:
+            break
+        box = (left, top, right, bottom)
+    return box
+
+
+def find_click_region(gray, x, y):
+    """Bounding box (left, top, right, bottom) of the text block or element under (x, y).
+
+    Starting from the ink pixel nearest the click, the box first grows over
+    the ink touching it. A solid block (a filled button, say) is the element
+    itself; anything else is text or an outline, and the box keeps growing
+    over row and column ink profiles, bridging gaps smaller than that text's
+    height, to take in the whole word, label or checkbox caption. Rows and
+    columns that are almost all ink, like separators and panel edges, are
+    ignored so they don't connect neighbouring elements. Returns None if
+    there's no ink near the click.
+    """
+    ink = ink_mask(gray)
+    if ink is None:
+        return None
+    height, width = ink.shape
+    ink = ink & (ink.mean(axis=1) < LINE_FILL)[:, None] & (ink.mean(axis=0) < LINE_FILL)[None, :]
+
+    seed_top, seed_left = max(0, y - SEED_RADIUS), max(0, x - SEED_RADIUS)
+    seed_rows, seed_columns = np.nonzero(ink[seed_top:y + SEED_RADIUS + 1, seed_left:x + SEED_RADIUS + 1])
+    if not len(seed_rows):
+        return None
+    nearest = np.argmin((seed_rows + seed_top - y) ** 2 + (seed_columns + seed_left - x) ** 2)
+    top = int(seed_rows[nearest]) + seed_top
+    left = int(seed_columns[nearest]) + seed_left
+
+    # First only what touches the seed: one glyph, a checkbox, or a button's whole fill
+    left, top, right, bottom = grow_box(ink, (left, top, left + 1, top + 1), 1, 1)
+    solid = np.count_nonzero(ink[top:bottom, left:right]) >= SOLID_FILL * (right - left) * (bottom - top)
+    # A caret, splitter or separator is solid but has no inside to read
+    if not solid or bottom - top < MIN_ELEMENT_HEIGHT or right - left <= MIN_SOLID_WIDTH:
+        # Letters, words and the label next to a checkbox are closer than a line
+        # height, neighbouring elements further
+        line_height = min(bottom - top, MAX_LINE_HEIGHT)
+        left, top, right, bottom = grow_box(ink, (left, top, right, bottom),
+                                            max(4, line_height), max(2, line_height // 2))
+    else:
+        # Just the inside of the button, so its border isn't read as a letter
+        return left + 2, top + 2, right - 2, bottom - 2
+    return (max(0, left - CROP_PADDING), max(0, top - CROP_PADDING),
+            min(width, right + CROP_PADDING), min(height, bottom + CROP_PADDING))
+
+
+def binarize(gray):
+    """Black text on white for OCR, with a threshold picked for this crop alone."""
+    ink = ink_mask(gray)
+    if ink is None:
+        return Image.new("1", (gray.shape[1], gray.shape[0]), 1)
+    return Image.fromarray(~ink)
+
+
+def recognize_crop(crop, engine):
+    """Runs OCR on an already cropped region and normalizes the whitespace.
+
+    Returns None when OCR itself failed, so callers can tell that apart from
+    a region that simply has no text.
+    """
+    try:
+        text = engine.recognize(crop)
+
+        # Clean up the text
+        cleaned_text = ' '.join(text.split())  # Remove extra whitespace
+        if cleaned_text:
+            logger.debug("OCR detected text: %s", cleaned_text)
+            return cleaned_text
+        return ""
+    except Exception as e:
+        logger.error("Error performing OCR: %s", e)
+        return None
+
+
+def get_text_around_click(x, y, screenshot, engine):
+    """Grabs the text around the click region with the given OCR engine."""
+    return recognize_crop(crop_click_region(screenshot, x, y), engine) or ""
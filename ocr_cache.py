@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = "ocr_cache.json"
+
+# Size the crop is reduced to for the perceptual key (bits = width * height)
+PERCEPTUAL_HASH_SIZE = (32, 16)
+
+
+class OcrCache:
+    """Bounded LRU cache of OCR results keyed by a hash of the binarized click crop.
+
+    Installation wizards put "Next" in the same place on every page, so most
+    clicks produce a crop OCR has already seen. "exact" keys hash the crop
+    pixels; "perceptual" keys hash a downscaled average-hash so crops that
+    differ by a few anti-aliased pixels still hit.
+    """
+
+    def __init__(self, max_entries=512, key_mode="exact", namespace=""):
+        self.max_entries = max_entries
+        self.key_mode = key_mode
+        # Results depend on the engine and crop region settings, so they're part of every key
+        self.namespace = namespace
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, crop):
+        if self.key_mode == "perceptual":
+            small = crop.convert("L").resize(PERCEPTUAL_HASH_SIZE)
+            pixels = small.tobytes()
+            average = sum(pixels) / len(pixels)
+            bits = "".join("1" if pixel > average else "0" for pixel in pixels)
+            digest = "%0*x" % (len(bits) // 4, int(bits, 2))
+        else:
+            digest = hashlib.blake2b(crop.tobytes(), digest_size=16,
+                                     person=b"%dx%d" % crop.size).hexdigest()
+        return f"{self.namespace}:{self.key_mode}:{digest}"
+
+    def get(self, key):
+        """Returns the cached text for key, or None on a miss."""
+        with self.lock:
+            text = self.entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def merge(self, key, text, hit):
+        """Folds a lookup made by a worker process back into this cache."""
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if key is not None:
+            self.put(key, text)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+    def load(self, path):
+        """Loads entries saved by a previous session. Missing or unreadable files are ignored."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable OCR cache %s: %s", path, e)
+            return
+        for key, text in entries:
+            self.put(key, text)
+
+    def save(self, path):
+        # Write then rename so a crash never leaves a half-written cache behind
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+
+_worker_cache = None
+
+
+def install_worker_cache(cache):
+    """Makes cache the one pipeline workers in this process look up."""
+    global _worker_cache
+    _worker_cache = cache
+
+
+def init_process_worker_cache(max_entries, key_mode, namespace, entries):
+    """ProcessPoolExecutor initializer: seeds a worker process with the parent's entries."""
+    cache = OcrCache(max_entries, key_mode, namespace)
+    for key, text in entries:
+        cache.put(key, text)
+    install_worker_cache(cache)
+
+
+def worker_cache():
+    return _worker_cache
@@ -0,0 +1,244 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from ocr import close_ocr_engines
+from ocr_cache import OcrCache, init_process_worker_cache, install_worker_cache
+from processing import ProcessingOptions, process_frame, warm_up_worker
+
+logger = logging.getLogger(__name__)
+
+
+class CapturePipeline:
+    """Bounded worker pipeline between the input listeners and the session journal.
+
+    The listener threads only enqueue work: captured frames are processed on a
+    thread or process pool, and a single writer thread appends the results to
+    the journal in the order they were submitted, so step ordering is
+    preserved no matter which worker finishes first.
+    """
+
+    def __init__(self, journal, options=None, workers=2, mode="thread", max_pending=32,
+                 enqueue_timeout=0.005, ocr_cache_file=None, metrics=None, index=None):
+        self.journal = journal
+        self.options = options or ProcessingOptions()
+        self.ocr_cache = None
+        if self.options.ocr_cache_size:
+            self.ocr_cache = OcrCache(self.options.ocr_cache_size, self.options.ocr_cache_key,
+                                      self.options.ocr_namespace())
+        # Optional file the OCR cache is loaded from and saved back to
+        self.ocr_cache_file = ocr_cache_file
+        # Optional SessionMetrics that gets every step's timings and every drop
+        self.metrics = metrics
+        # Optional search.SessionIndexer that gets every journaled event
+        self.index = index
+        self.workers = workers
+        self.mode = mode
+        self.max_pending = max_pending
+        # Seconds submit_frame waits for a free slot before dropping the step; it runs on
+        # the input listener, so this stays a few milliseconds (0 drops at once)
+        self.enqueue_timeout = enqueue_timeout
+        self.executor = None
+        self.writer_thread = None
+        self._pending = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._stats_lock = threading.Lock()
+        self._stage_stats = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.dropped = 0
+        self.written_steps = 0
+        self.image_bytes = 0
+        # Optional callback(result) run on the writer thread after each step is written
+        self.on_step = None
+        # Per storage mode ("full", "delta", "ref"): steps, bytes written, encode seconds
+        self._storage = {}
+
+    def start(self):
+        if self.ocr_cache and self.ocr_cache_file:
+            self.ocr_cache.load(self.ocr_cache_file)
+        if self.mode == "process":
+            # Each worker process gets its own copy of the cache; lookups are merged back in _writer
+            initializer, initargs = None, ()
+            if self.ocr_cache:
+                initializer = init_process_worker_cache
+                initargs = (self.ocr_cache.max_entries, self.ocr_cache.key_mode,
+                            self.ocr_cache.namespace, self.ocr_cache.snapshot())
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer,
+                                                initargs=initargs)
+        else:
+            install_worker_cache(self.ocr_cache)
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="capture-worker")
+        # Load the OCR engines now rather than on the first click
+        for _ in range(self.workers):
+            self.executor.submit(warm_up_worker, self.options)
+        self.journal.open()
+        self.writer_thread = threading.Thread(target=self._writer, name="journal-writer", daemon=True)
+        self.writer_thread.start()
+
+    def submit_frame(self, frame):
+        """Queues a captured frame for processing. Returns False if the frame was dropped."""
+        if self.enqueue_timeout > 0:
+            acquired = self._slots.acquire(timeout=self.enqueue_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._stats_lock:
+                self.dropped += 1
+            if self.metrics:
+                self.metrics.drop(frame.step, self.queue_depth)
+            logger.warning("Pipeline full (%d steps pending), dropped step %d", self.max_pending, frame.step)
+            return False
+        with self._stats_lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        self._pending.put((self.executor.submit(process_frame, frame, self.options), True))
+        return True
+
+    def submit_event(self, event):
+        """Queues a journal event behind any steps that are still being processed.
+
+        event may also be a Future of one, for events whose content is still
+        being gathered (the clipboard text of a copy, say).
+        """
+        future = event
+        if not isinstance(event, Future):
+            future = Future()
+            future.set_result(event)
+        self._pending.put((future, False))
+
+    def stop(self):
+        """Waits for every queued step to be written, then shuts the workers down."""
+        if self.writer_thread is None:
+            return
+        self._pending.put((None, False))
+        self.writer_thread.join()
+        self.journal.close()
+        if self.index:
+            self.index.close(self.journal.path)
+        self.executor.shutdown(wait=True)
+        if self.mode != "process":
+            close_ocr_engines()
+            install_worker_cache(None)
+        if self.ocr_cache and self.ocr_cache_file:
+            try:
+                self.ocr_cache.save(self.ocr_cache_file)
+            except OSError as e:
+                logger.error("Error saving OCR cache: %s", e)
+        self.writer_thread = None
+        self.executor = None
+
+    def record_timing(self, stage, seconds):
+        with self._stats_lock:
+            count, total, worst = self._stage_stats.get(stage, (0, 0.0, 0.0))
+            self._stage_stats[stage] = (count + 1, total + seconds, max(worst, seconds))
+
+    def stats(self):
+        """Returns queue depth, drop count and per-stage latency (avg/max in ms)."""
+        with self._stats_lock:
+            stages = {
+                stage: {"count": count, "avg_ms": total / count * 1000, "max_ms": worst * 1000}
+                for stage, (count, total, worst) in self._stage_stats.items()
+            }
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "dropped": self.dropped,
+                "written_steps": self.written_steps,
+                "image_bytes": self.image_bytes,
+                "stages": stages,
+                "ocr_cache": self.ocr_cache.stats() if self.ocr_cache else None,
+                "dedup": self._dedup_stats(),
+            }
+
+    def _dedup_stats(self):
+        """Disk and encode time saved by frame dedup, estimated from the average full frame."""
+        if not self.options.dedup:
+            return None
+        full_steps, full_bytes, full_encode = self._storage.get("full", (0, 0, 0.0))
+        delta_steps, delta_bytes, delta_encode = self._storage.get("delta", (0, 0, 0.0))
+        ref_steps = self._storage.get("ref", (0, 0, 0.0))[0]
+        saved_bytes = saved_encode = 0
+        if full_steps:
+            deduped = delta_steps + ref_steps
+            saved_bytes = deduped * full_bytes / full_steps - delta_bytes
+            saved_encode = deduped * full_encode / full_steps - delta_encode
+        return {"full": full_steps, "deltas": delta_steps, "refs": ref_steps,
+                "patch_bytes": delta_bytes, "saved_bytes": saved_bytes,
+                "saved_encode_ms": saved_encode * 1000}
+
+    def log_stats(self):
+        stats = self.stats()
+        lines = [f"Pipeline: {stats['written_steps']} steps written, max queue depth "
+                 f"{stats['max_queue_depth']}, {stats['dropped']} dropped"]
+        if stats["written_steps"]:
+            lines.append(f"  images     {stats['image_bytes'] / stats['written_steps'] / 1024:8.1f} KiB per step, "
+                         f"{stats['image_bytes'] / 1024 / 1024:.1f} MiB total")
+        lines.append(f"  journal    {self.journal.events_written} events, "
+                     f"{self.journal.bytes_written / 1024:.1f} KiB")
+        if stats["ocr_cache"]:
+            lines.append(f"  OCR cache  {stats['ocr_cache']['hits']} hits, {stats['ocr_cache']['misses']} misses, "
+                         f"{stats['ocr_cache']['entries']} entries")
+        if stats["dedup"]:
+            dedup = stats["dedup"]
+            lines.append(f"  dedup      {dedup['full']} full, {dedup['deltas']} patches, {dedup['refs']} references; "
+                         f"saved ~{dedup['saved_bytes'] / 1024 / 1024:.1f} MiB and "
+                         f"~{dedup['saved_encode_ms']:.0f} ms of encoding")
+        for stage, values in stats["stages"].items():
+            lines.append(f"  {stage:<10} avg {values['avg_ms']:8.1f} ms   max {values['max_ms']:8.1f} ms")
+        logger.info("\n".join(lines))
+
+    def _index(self, event):
+        # The journal is the record; a search index failure must not lose the step
+        if self.index:
+            try:
+                self.index.add(event)
+            except Exception:
+                logger.exception("Error indexing recorded event")
+
+    def _writer(self):
+        while True:
+            try:
+                future, is_frame = self._pending.get(timeout=self.journal.flush_interval)
+            except queue.Empty:
+                # Idle: make sure buffered keystrokes reach the disk
+                self.journal.flush()
+                continue
+            if future is None:
+                break
+            try:
+                result = future.result()
+                started = time.perf_counter()
+                if not is_frame:
+                    self.journal.append(result)
+                    self._index(result)
+                else:
+                    # Every step is a crash-safe sync point
+                    event = result.to_event(self.journal)
+                    self.journal.append(event, sync=True)
+                    result.timings["write"] = time.perf_counter() - started
+                    if self.mode == "process" and self.ocr_cache:
+                        self.ocr_cache.merge(result.ocr_key, result.clicked_text, result.ocr_cache_hit)
+                    for stage, seconds in result.timings.items():
+                        self.record_timing(stage, seconds)
+                    with self._stats_lock:
+                        self.written_steps += 1
+                        self.image_bytes += result.image_bytes
+                        mode = result.dedup["mode"] if result.dedup else "full"
+                        steps, size, encode = self._storage.get(mode, (0, 0, 0.0))
+                        self._storage[mode] = (steps + 1, size + result.image_bytes,
+                                               encode + result.timings.get("encode", 0.0))
+                    if self.metrics:
+                        self.metrics.step(result.step, result.timings, self.queue_depth)
+                    if self.on_step:
+                        self.on_step(result)
+                    self._index(event)
+            except Exception:
+                logger.exception("Error writing recorded step")
+            finally:
+                if is_frame:
+                    with self._stats_lock:
+                        self.queue_depth -= 1
+                    self._slots.release()
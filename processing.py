@@ -0,0 +1,243 @@
+import logging
+import time
+from PIL import Image
+
+from annotation import AnnotationStyle, annotate_image, annotation_bounds
+from dedup import compare_frames, patch_path
+from encoders import create_encoder
+from ocr import crop_click_region, get_ocr_engine, recognize_crop, region_settings
+from ocr_cache import worker_cache
+
+logger = logging.getLogger(__name__)
+
+# Resize image if too large (max width 3840px for 4K while maintaining aspect ratio)
+MAX_WIDTH = 3840
+
+
+class ProcessingOptions:
+    """Session-wide settings shipped to every pipeline worker alongside the frames."""
+
+    def __init__(self, annotation=None, encoder=None, ocr_engine="auto", ocr_lang="eng", ocr_psm=3,
+                 ocr_cache_size=512, ocr_cache_key="exact", dedup=False, dedup_threshold=0,
+                 dedup_max_fraction=0.5, ocr_region="adaptive"):
+        self.annotation = annotation or AnnotationStyle()
+        self.encoder = encoder or create_encoder("png")
+        # Engines aren't picklable, so workers create their own from these settings
+        self.ocr_engine = ocr_engine
+        self.ocr_lang = ocr_lang
+        self.ocr_psm = ocr_psm
+        # "adaptive" OCRs the element under the click, "fixed" a 100x100 crop
+        self.ocr_region = ocr_region
+        # 0 disables the OCR result cache; key is "exact" or "perceptual"
+        self.ocr_cache_size = ocr_cache_size
+        self.ocr_cache_key = ocr_cache_key
+        # Frame dedup: unchanged frames (or, opted into, frames with at most
+        # dedup_threshold changed pixels) are stored as a reference to the previous
+        # frame of their window, frames whose changes fit in dedup_max_fraction
+        # of the image as a patch
+        self.dedup = dedup
+        self.dedup_threshold = dedup_threshold
+        self.dedup_max_fraction = dedup_max_fraction
+        # Patches are lossless even for lossy formats: a patch stacks on earlier
+        # steps, and lossy ones would add their loss at every link of the chain
+        self.patch_encoder = create_encoder("png-fast") if self.encoder.lossy else self.encoder
+
+    def ocr_namespace(self):
+        # The region decides which pixels are read, so a crop cached under one
+        # mode or size isn't a hit for another
+        return f"{self.ocr_engine}/{self.ocr_lang}/{self.ocr_psm}/{region_settings(self.ocr_region)}"
+
+
+class CapturedFrame:
+    """Raw screenshot plus the click metadata grabbed inside the mouse listener."""
+
+    def __init__(self, step, image, x, y, window_left, window_top, window_width,
+                 window_height, window_title, typed_text, screenshot_path, previous=None,
+                 capture_timings=None, video_frame=None):
+        self.step = step
+        self.image = image
+        self.x = x
+        self.y = y
+        self.window_left = window_left
+        self.window_top = window_top
+        self.window_width = window_width
+        self.window_height = window_height
+        self.window_title = window_title
+        self.typed_text = typed_text
+        self.screenshot_path = screenshot_path
+        # PreviousFrame of the same window to diff against in dedup mode
+        self.previous = previous
+        # Seconds spent in the listener looking up the window and grabbing the screen
+        self.capture_timings = capture_timings or {}
+        # Index of the video frame on screen at the click, when recording video
+        self.video_frame = video_frame
+        self.captured_at = time.time()
+
+
+class StepResult:
+    """Everything the journal writer needs for one recorded step."""
+
+    def __init__(self, frame, clicked_text, image_x, image_y, timings, image_bytes=0,
+                 ocr_key=None, ocr_cache_hit=False, dedup=None):
+        self.step = frame.step
+        self.captured_at = frame.captured_at
+        self.window_title = frame.window_title
+        self.x = frame.x
+        self.y = frame.y
+        self.typed_text = frame.typed_text
+        self.screenshot_path = frame.screenshot_path
+        self.video_frame = frame.video_frame
+        self.clicked_text = clicked_text
+        # Click position in the saved image (after any resize)
+        self.image_x = image_x
+        self.image_y = image_y
+        self.timings = timings
+        self.image_bytes = image_bytes
+        self.ocr_key = ocr_key
+        self.ocr_cache_hit = ocr_cache_hit
+        # None for a full frame, else {"mode", "base_step", "base_image", "box", "patch"}
+        self.dedup = dedup
+
+    def to_event(self, journal):
+        event = {
+            "type": "step",
+            "step": self.step,
+            "time": self.captured_at,
+            "window_title": self.window_title,
+            "x": self.x,
+            "y": self.y,
+            "image_x": self.image_x,
+            "image_y": self.image_y,
+            "clicked_text": self.clicked_text,
+            "typed_text": self.typed_text,
+            "image": journal.relative_path(self.screenshot_path),
+        }
+        if self.video_frame is not None:
+            event["video_frame"] = self.video_frame
+        if self.dedup:
+            event["dedup"] = {
+                "mode": self.dedup["mode"],
+                "base": self.dedup["base_step"],
+                "base_image": journal.relative_path(self.dedup["base_image"]),
+            }
+            if self.dedup["mode"] == "delta":
+                event["dedup"]["box"] = list(self.dedup["box"])
+                event["dedup"]["patch"] = journal.relative_path(self.dedup["patch"])
+        return event
+
+
+def warm_up_worker(options):
+    """Loads the OCR engine on a worker before the first click needs it."""
+    get_ocr_engine(options.ocr_engine, options.ocr_lang, options.ocr_psm)
+
+
+def fit_width(image):
+    """Scales images wider than MAX_WIDTH down, keeping the aspect ratio."""
+    if image.width > MAX_WIDTH:
+        aspect_ratio = image.height / image.width
+        new_width = MAX_WIDTH
+        new_height = int(MAX_WIDTH * aspect_ratio)
+        image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    return image
+
+
+def image_position(frame, image_width):
+    """Click position in the (possibly resized) window image."""
+    # Adjust click coordinates relative to window
+    relative_x = frame.x - frame.window_left
+    relative_y = frame.y - frame.window_top
+
+    # Scale coordinates if image was resized
+    if image_width != frame.window_width:
+        scale_factor = image_width / frame.window_width
+        relative_x = int(relative_x * scale_factor)
+        relative_y = int(relative_y * scale_factor)
+    return relative_x, relative_y
+
+
+def process_frame(frame, options=None):
+    """Resizes, OCRs, annotates and saves a captured frame.
+
+    Runs on a pipeline worker (thread or process), never on the listener thread.
+    The annotation is drawn in memory so each step's image is encoded exactly once.
+    """
+    options = options or ProcessingOptions()
+    timings = dict(frame.capture_timings)
+    timings["queue_wait"] = time.time() - frame.captured_at
+    screenshot = frame.image
+
+    started = time.perf_counter()
+    screenshot = fit_width(screenshot)
+    timings["resize"] = time.perf_counter() - started
+    relative_x, relative_y = image_position(frame, screenshot.width)
+
+    # Get clicked element text (using OCR) before the marker is drawn over it
+    started = time.perf_counter()
+    ocr_key = None
+    ocr_cache_hit = False
+    try:
+        crop = crop_click_region(screenshot, relative_x, relative_y, options.ocr_region)
+        cache = worker_cache()
+        ocr_key = cache.key(crop) if cache else None
+        clicked_text = cache.get(ocr_key) if cache else None
+        ocr_cache_hit = clicked_text is not None
+        if not ocr_cache_hit:
+            engine = get_ocr_engine(options.ocr_engine, options.ocr_lang, options.ocr_psm)
+            clicked_text = recognize_crop(crop, engine)
+            if clicked_text is None:
+                # Don't cache failures, the next click should try again
+                clicked_text = ""
+                ocr_key = None
+            elif cache:
+                cache.put(ocr_key, clicked_text)
+    except Exception:
+        # The step itself matters more than its label
+        logger.exception("Error preparing the click region for OCR in step %d", frame.step)
+        clicked_text = ""
+        ocr_key = None
+        ocr_cache_hit = False
+    timings["ocr"] = time.perf_counter() - started
+
+    dedup = None
+    if options.dedup and frame.previous is not None:
+        # Compare raw pixels, before either frame has a marker drawn on it
+        started = time.perf_counter()
+        previous = frame.previous
+        previous_image = fit_width(previous.image)
+        previous_x, previous_y = image_position(previous, previous_image.width)
+        mode, box = compare_frames(
+            previous_image, screenshot,
+            annotation_bounds(previous_x, previous_y, options.annotation, previous.step),
+            annotation_bounds(relative_x, relative_y, options.annotation, frame.step),
+            near_duplicate_pixels=options.dedup_threshold,
+            max_delta_fraction=options.dedup_max_fraction,
+            numbered=options.annotation.step_badge)
+        if mode:
+            dedup = {"mode": mode, "base_step": previous.step, "base_image": previous.screenshot_path,
+                     "box": box, "patch": patch_path(frame.screenshot_path, options.patch_encoder.extension) if box else None}
+        timings["dedup"] = time.perf_counter() - started
+
+    if options.dedup and screenshot is frame.image:
+        # The recorder keeps the raw frame to diff the next step against
+        screenshot = screenshot.copy()
+
+    started = time.perf_counter()
+    annotate_image(screenshot, relative_x, relative_y, options.annotation, step_number=frame.step)
+    timings["annotate"] = time.perf_counter() - started
+
+    # Encode once with the session's encoder profile; deduplicated steps only
+    # store the changed region, or nothing at all
+    started = time.perf_counter()
+    image_bytes = 0
+    if dedup is None:
+        encoded = options.encoder.save(screenshot, frame.screenshot_path)
+        image_bytes = len(encoded.data)
+        if encoded.over_budget:
+            logger.warning("Step %d is %d bytes, over the %d byte budget", frame.step, image_bytes,
+                           options.encoder.max_bytes)
+    elif dedup["mode"] == "delta":
+        image_bytes = len(options.patch_encoder.save(screenshot.crop(dedup["box"]), dedup["patch"]).data)
+    timings["encode"] = time.perf_counter() - started
+
+    return StepResult(frame, clicked_text, relative_x, relative_y, timings, image_bytes=image_bytes,
+                      ocr_key=ocr_key, ocr_cache_hit=ocr_cache_hit, dedup=dedup)
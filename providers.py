@@ -0,0 +1,44 @@
+from capture import create_capture_backend
+
+
+class Window:
+    """Geometry and title of the window a click landed in."""
+
+    def __init__(self, title, left, top, width, height):
+        self.title = title
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+
+class DesktopWindows:
+    """Looks up the foreground window with pyautogui."""
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def active_window(self):
+        return self.pyautogui.getActiveWindow()
+
+
+class DesktopClipboard:
+    def paste(self):
+        import pyperclip
+        return pyperclip.paste()
+
+
+class Providers:
+    """Everything the recorder reads from the desktop besides the input listeners.
+
+    The defaults talk to the real desktop (the screen through a capture
+    backend, see capture.py); the replay harness (replay.py) swaps in
+    scripted ones so the recorder can run without a display.
+    """
+
+    def __init__(self, screen=None, windows=None, clipboard=None):
+        self.screen = screen or create_capture_backend()
+        self.windows = windows or DesktopWindows()
+        self.clipboard = clipboard or DesktopClipboard()
+
@@ -0,0 +1,420 @@
+"""The recorder core: InstallationRecorder, without any GUI.
+
+Importing this module is cheap. PIL, numpy, the capture backends, the
+OCR stack, the input listeners and the PDF export are imported when
+recording starts or a PDF is exported, so the GUI window shows without
+paying for them and headless tools can use the recorder as a library.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from annotation import AnnotationStyle
+from keys import KeyCoalescer, read_clipboard
+from ocr_cache import CACHE_FILE_NAME as OCR_CACHE_FILE_NAME
+from journal import JOURNAL_FILE_NAME, StepJournal, write_markdown
+from metrics import METRICS_FILE_NAME, SessionMetrics
+from export import ExportCancelled, PDF_FILE_NAME, export_pdf
+
+logger = logging.getLogger(__name__)
+
+class InstallationRecorder:
+    def __init__(self, providers=None):
+        self.working_directory = None
+        self.screenshots_dir = None
+        self.markdown_file = None
+        self.journal_file = None
+        self.container_file = None
+        self.recording = False
+        self.step_counter = 1
+        self.mouse_listener = None
+        self.keyboard_listener = None
+        # Folds key presses into typed text, chords and repeats (see keys.py)
+        self.keys = KeyCoalescer()
+        self.keys_lock = threading.Lock()
+        self.key_repeat_window = 1.0
+        # Clipboard text is read this long after Ctrl+C/V, off the listener thread
+        self.clipboard_delay = 0.1
+        self.clipboard_reader = None
+        self.cancel_requested = False
+        self.pipeline = None
+        # Screen, window and clipboard access (see providers.py);
+        # the desktop ones are created when recording starts
+        self.providers = providers
+        # Screen grabber: "auto" (mss, falling back to pyautogui), "mss" or "pyautogui"
+        self.capture_backend = "auto"
+        # Capture pipeline settings: "thread" or "process" workers doing
+        # resize/annotate/encode/OCR, and how many steps may be in flight.
+        self.worker_mode = "thread"
+        self.worker_count = 2
+        self.max_pending_steps = 32
+        # Click marker drawn onto each screenshot (ring, fill, crosshair, step badge)
+        self.annotation_style = AnnotationStyle()
+        # Screenshot encoder: "png", "png-fast", "webp-lossless", "webp" or "jpeg".
+        # quality applies to the lossy formats; max_image_bytes is an optional
+        # per-image budget the lossy formats step their quality down to meet.
+        self.image_format = "png"
+        self.image_quality = 90
+        self.max_image_bytes = None
+        # OCR backend: "auto" (resident tesserocr API, falling back to
+        # pytesseract), "tesserocr" or "pytesseract"; lang/psm are passed to tesseract.
+        self.ocr_engine = "auto"
+        self.ocr_lang = "eng"
+        self.ocr_psm = 3
+        # OCR crop: "adaptive" finds the text or element under the click (dark
+        # themes included), "fixed" is a 100x100 crop with a global threshold
+        self.ocr_region = "adaptive"
+        # LRU cache of OCR results for repeated click crops (0 disables it).
+        # "exact" or "perceptual" keys; persisted next to the session folders.
+        self.ocr_cache_size = 512
+        self.ocr_cache_key = "exact"
+        self.ocr_cache_persist = True
+        # Frame dedup: steps that barely change the previous screenshot of the
+        # same window are stored as a reference or a patch of the changed region,
+        # with a full frame at least every dedup_keyframe_interval steps
+        self.dedup_frames = False
+        # Changed pixels still stored as a reference; above 0 a blinking caret is
+        # ignored, but so is any change that small (a checkbox tick)
+        self.dedup_threshold = 0
+        self.dedup_keyframe_interval = 20
+        self.frame_tracker = None
+        # Per-step stage timings, queue depth and drops go to metrics.jsonl in
+        # the session folder; live_summary shows them in the window while recording
+        self.collect_metrics = True
+        self.live_summary = False
+        self.metrics = None
+        # Continuous video (needs ffmpeg) alongside the per-click screenshots:
+        # video_region is "window" (the active window when recording starts),
+        # "desktop" or a (left, top, width, height) tuple
+        self.record_video = False
+        self.video_fps = 10
+        self.video_region = "window"
+        self.video = None
+        self.processing_options = None
+        # PDF export renders this many steps per wkhtmltopdf chunk, with up to
+        # pdf_workers chunks at once (None = half the CPU cores)
+        self.pdf_chunk_size = 10
+        self.pdf_workers = None
+        # Screenshots are embedded in the PDF as page-fit copies at this DPI
+        # (None embeds the full-resolution originals)
+        self.export_dpi = 200
+        # "wkhtmltopdf" renders markdown -> HTML -> PDF; "native" writes the PDF
+        # directly from the journal, page by page, without wkhtmltopdf (text
+        # outside Windows-1252 is drawn with a TrueType font from fonts.UNICODE_FONTS)
+        self.pdf_backend = "wkhtmltopdf"
+        # Pack each finished session into a single <session>.scribe file (see
+        # container.py) and remove its folder
+        self.session_container = False
+        # Add every session's window titles, clicked and typed text to the
+        # full-text index next to the session folders (see search.py)
+        self.search_index = True
+        self.index = None
+
+    def set_working_directory(self, directory):
+        """Sets the working directory and creates necessary subdirectories with timestamp."""
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self.working_directory = os.path.join(directory, timestamp)
+        os.makedirs(self.working_directory, exist_ok=True)
+        self.screenshots_dir = os.path.join(self.working_directory, "screenshots")
+        os.makedirs(self.screenshots_dir, exist_ok=True)
+        self.markdown_file = os.path.join(self.working_directory, f"installation_steps_{timestamp}.md")
+        self.journal_file = os.path.join(self.working_directory, JOURNAL_FILE_NAME)
+        self.container_file = None
+
+    def start_recording(self, listeners=True):
+        """Starts recording mouse clicks, keyboard events, and screenshots.
+
+        With listeners=False no input hooks are installed and events have to be
+        fed to on_click/on_key_press directly, as the replay harness does.
+        """
+        # Create new timestamped directory before starting
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self.working_directory = os.path.join(os.path.dirname(self.working_directory), timestamp)
+        os.makedirs(self.working_directory, exist_ok=True)
+        
+        # Create new screenshots directory
+        self.screenshots_dir = os.path.join(self.working_directory, "screenshots")
+        os.makedirs(self.screenshots_dir, exist_ok=True)
+        
+        # Update markdown file path with new timestamp; the markdown is
+        # rendered from the journal when recording stops
+        self.markdown_file = os.path.join(self.working_directory, f"installation_steps_{timestamp}.md")
+        self.journal_file = os.path.join(self.working_directory, JOURNAL_FILE_NAME)
+        self.container_file = None
+        
+        # Start recording
+        self.recording = True
+        self.step_counter = 1
+        self.keys = KeyCoalescer(self.key_repeat_window)
+        self.clipboard_reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clipboard")
+
+        from capture import create_capture_backend
+        from dedup import FrameTracker
+        from encoders import create_encoder
+        from pipeline import CapturePipeline
+        from processing import ProcessingOptions
+        from providers import Providers
+        if self.providers is None:
+            self.providers = Providers(screen=create_capture_backend(self.capture_backend))
+
+        # Start the worker pipeline before the listeners that feed it
+        self.processing_options = ProcessingOptions(
+            annotation=self.annotation_style,
+            encoder=create_encoder(self.image_format, self.image_quality, self.max_image_bytes),
+            ocr_engine=self.ocr_engine,
+            ocr_lang=self.ocr_lang,
+            ocr_psm=self.ocr_psm,
+            ocr_region=self.ocr_region,
+            ocr_cache_size=self.ocr_cache_size,
+            ocr_cache_key=self.ocr_cache_key,
+            dedup=self.dedup_frames,
+            dedup_threshold=self.dedup_threshold,
+        )
+        self.frame_tracker = FrameTracker(self.dedup_keyframe_interval) if self.dedup_frames else None
+        self.metrics = None
+        if self.collect_metrics:
+            self.metrics = SessionMetrics(os.path.join(self.working_directory, METRICS_FILE_NAME))
+        self.pipeline = CapturePipeline(
+            StepJournal(self.journal_file),
+            options=self.processing_options,
+            workers=self.worker_count,
+            mode=self.worker_mode,
+            max_pending=self.max_pending_steps,
+            ocr_cache_file=os.path.join(os.path.dirname(self.working_directory), OCR_CACHE_FILE_NAME)
+            if self.ocr_cache_persist else None,
+            metrics=self.metrics,
+            index=self.open_session_index(),
+        )
+        self.pipeline.start()
+
+        if self.record_video:
+            from video import VIDEO_FILE_NAME, VideoRecorder
+            # A missing ffmpeg shouldn't stop the screenshots from being recorded
+            try:
+                video = VideoRecorder(os.path.join(self.working_directory, VIDEO_FILE_NAME),
+                                      self.providers.screen, self.video_capture_region(), fps=self.video_fps)
+                video.start()
+            except Exception:
+                logger.exception("Error starting the video recording, recording without video")
+            else:
+                self.video = video
+                self.record_event("video", file=VIDEO_FILE_NAME, fps=self.video_fps, region=list(video.region))
+
+        if not listeners:
+            return
+
+        # Start listeners
+        from pynput import mouse, keyboard as keyboard_listener
+        self.mouse_listener = mouse.Listener(on_click=self.on_click)
+        self.mouse_listener.start()
+        self.keyboard_listener = keyboard_listener.Listener(on_press=self.on_key_press,
+                                                            on_release=self.on_key_release)
+        self.keyboard_listener.start()
+
+    def stop_recording(self):
+        """Stops recording mouse clicks and keyboard events."""
+        self.recording = False
+        if self.mouse_listener:
+            self.mouse_listener.stop()
+            self.mouse_listener.join()  # A click still being handled may be grabbing the screen
+            self.mouse_listener = None
+        if self.keyboard_listener:
+            self.keyboard_listener.stop()
+            self.keyboard_listener.join()  # A key still being handled would miss the flush below
+            self.keyboard_listener = None
+        if self.pipeline:
+            with self.keys_lock:
+                events = self.keys.flush()
+            self.record_key_events(events)
+        video_stats = None
+        if self.video:
+            video_stats = self.video.stop()
+            self.record_event("video_stats", **video_stats)
+            self.video = None
+        if self.providers:
+            # The listener thread's grabber handle; the video thread released its own
+            self.providers.screen.close()
+        if self.pipeline:
+            # Flush steps that are still being processed
+            self.pipeline.stop()
+            self.clipboard_reader.shutdown()
+            self.pipeline.log_stats()
+            stats = self.pipeline.stats()
+            self.pipeline = None
+            self.frame_tracker = None
+            started = time.perf_counter()
+            write_markdown(self.journal_file, self.markdown_file)
+            if self.metrics:
+                self.metrics.record("markdown", time.perf_counter() - started)
+                self.metrics.close(written_steps=stats["written_steps"], dropped=stats["dropped"],
+                                   max_queue_depth=stats["max_queue_depth"], image_bytes=stats["image_bytes"],
+                                   video=video_stats)
+            if self.session_container:
+                from container import pack_session
+                try:
+                    self.container_file = pack_session(self.working_directory, remove=True)
+                except Exception:
+                    logger.exception("Error packing the session, it stays a folder")
+            if self.index:
+                try:
+                    if self.container_file:
+                        self.index.move_session(self.working_directory, self.container_file)
+                except Exception:
+                    logger.exception("Error updating the search index")
+                self.index.close()
+                self.index = None
+
+    def open_session_index(self):
+        """Opens the search index and returns the indexer for this session (None if disabled or unavailable)."""
+        if not self.search_index:
+            return None
+        from search import INDEX_FILE_NAME, SearchIndex, SessionIndexer
+        try:
+            self.index = SearchIndex(os.path.join(os.path.dirname(self.working_directory), INDEX_FILE_NAME))
+            return SessionIndexer(self.index, self.working_directory)
+        except Exception:
+            logger.exception("Error opening the search index, this session won't be searchable until indexed")
+            self.index = None
+            return None
+
+    def video_capture_region(self):
+        if self.video_region == "desktop":
+            return self.providers.screen.desktop()
+        if self.video_region == "window":
+            window = self.providers.windows.active_window()
+            if window is not None:
+                return window.left, window.top, window.width, window.height
+            return self.providers.screen.desktop()
+        return tuple(self.video_region)
+
+    def on_click(self, x, y, button, pressed):
+        """Handles mouse click events.
+
+        Only grabs the raw frame and click metadata here; resizing, annotation,
+        encoding and OCR run on the capture pipeline so the listener never stalls.
+        """
+        if pressed and self.recording:
+            from processing import CapturedFrame
+            try:
+                started = time.perf_counter()
+                # Get active window info
+                window = self.providers.windows.active_window()
+                if window is None:
+                    logger.warning("No active window found")
+                    return
+                found = time.perf_counter()
+
+                # Capture only the active window with high DPI awareness
+                screenshot = self.providers.screen.grab(
+                    window.left, window.top,
+                    window.width, window.height
+                )
+                grabbed = time.perf_counter()
+
+                frame = CapturedFrame(
+                    step=self.step_counter,
+                    image=screenshot,
+                    x=x,
+                    y=y,
+                    window_left=window.left,
+                    window_top=window.top,
+                    window_width=window.width,
+                    window_height=window.height,
+                    window_title=window.title,
+                    typed_text="",
+                    screenshot_path=os.path.join(
+                        self.screenshots_dir,
+                        f"step_{self.step_counter}{self.processing_options.encoder.extension}"),
+                    previous=self.frame_tracker.previous(window.title) if self.frame_tracker else None,
+                    capture_timings={"window": found - started, "grab": grabbed - found},
+                    video_frame=self.video.frame_index() if self.video else None,
+                )
+                with self.keys_lock:
+                    # Repeated keys pressed before the click go into the journal first
+                    events = self.keys.flush()
+                    frame.typed_text = self.keys.typed  # Add any pending typed text
+                self.record_key_events(events)
+                if self.pipeline.submit_frame(frame):
+                    if self.frame_tracker:
+                        self.frame_tracker.remember(frame)
+                    with self.keys_lock:
+                        self.keys.consume(frame.typed_text)  # Clear the buffer
+                    self.step_counter += 1
+            except Exception:
+                logger.exception("Error recording click")
+
+    def record_event(self, kind, **fields):
+        """Adds an event to the journal behind any steps still being processed."""
+        event = {"type": kind, "time": time.time()}
+        event.update(fields)
+        if self.video:
+            event["video_frame"] = self.video.frame_index(event["time"])
+        self.pipeline.submit_event(event)
+
+    def on_key_press(self, key):
+        """Handles keyboard press events."""
+        if self.recording:
+            try:
+                with self.keys_lock:
+                    events = self.keys.press(key)
+                self.record_key_events(events)
+            except Exception:
+                logger.exception("Error recording key press")
+
+    def on_key_release(self, key):
+        """Tracks modifier releases, which finish chords and lone modifier presses."""
+        if self.recording:
+            try:
+                with self.keys_lock:
+                    events = self.keys.release(key)
+                self.record_key_events(events)
+            except Exception:
+                logger.exception("Error recording key release")
+
+    def record_key_events(self, events):
+        for event in events:
+            if event["type"] == "clipboard":
+                # Read the clipboard on a worker; the journal keeps the event's place
+                event = dict(event, video_frame=self.video.frame_index(event["time"])) if self.video else event
+                self.pipeline.submit_event(self.clipboard_reader.submit(
+                    read_clipboard, self.providers.clipboard, event, self.clipboard_delay))
+            else:
+                kind = event.pop("type")
+                self.record_event(kind, **event)
+            logger.debug("Recorded %s", event)
+
+    def convert_to_pdf(self, progress=None):
+        """Converts the recorded steps to PDF and returns its path (None if it failed).
+
+        progress(done, total) is called as chunks of steps finish rendering.
+        """
+        self.cancel_requested = False
+        if self.markdown_file:
+            try:
+                logger.info("Starting PDF conversion...")
+                pdf_file = export_pdf(
+                    self.container_file or self.working_directory,
+                    journal_file=self.journal_file,
+                    markdown_file=self.markdown_file,
+                    chunk_size=self.pdf_chunk_size,
+                    workers=self.pdf_workers,
+                    progress=progress,
+                    is_cancelled=lambda: self.cancel_requested,
+                    image_dpi=self.export_dpi,
+                    backend=self.pdf_backend,
+                    metrics=SessionMetrics(os.path.join(self.working_directory, METRICS_FILE_NAME))
+                    if self.collect_metrics and not self.container_file else None,
+                )
+                return pdf_file
+            except ExportCancelled:
+                logger.info("Conversion cancelled by user")
+            except Exception:
+                logger.exception("Error converting to PDF")
+
+    def pdf_path(self):
+        """Where convert_to_pdf puts the current session's PDF."""
+        if self.container_file:
+            from container import container_pdf_path
+            return container_pdf_path(self.container_file)
+        return os.path.join(self.working_directory, PDF_FILE_NAME)
@@ -0,0 +1,277 @@
+"""Headless replay of recorded or synthetic sessions through the real recorder handlers.
+
+A script is a JSONL file (or list) of events:
+
+    {"type": "window", "title": "Setup", "left": 0, "top": 0, "width": 1280, "height": 800}
+    {"type": "frame", "image": "frames/welcome.png"}     # or {"type": "frame", "synthetic": 3}
+    {"type": "click", "x": 640, "y": 700}
+    {"type": "key", "char": "a"}                         # or {"type": "key", "name": "enter"}
+    {"type": "key", "char": "c", "modifiers": ["ctrl"]}  # "repeat": 3 presses it three times
+    {"type": "clipboard", "text": "copied text"}
+    {"type": "wait", "seconds": 0.5}
+
+Screen grabs return the current frame (resized to the window if needed),
+the active window is the last "window" event, and keys named in
+"modifiers" are pressed before the key and released after it.
+"""
+import os
+import random
+import time
+
+from PIL import Image, ImageDraw
+
+from journal import read_journal, resolve_image_path
+from keys import KEY_LABELS
+from providers import Providers, Window
+
+
+class ReplayKey:
+    """Stands in for a pynput key: `char` for character keys, `name` for special ones."""
+
+    def __init__(self, char=None, name=None):
+        if char is not None:
+            self.char = char
+        else:
+            self.name = name
+
+    def __str__(self):
+        return getattr(self, "char", None) or f"Key.{self.name}"
+
+
+class ReplayScreen:
+    def __init__(self):
+        self.frame = None
+        self._cache = {}
+
+    def show(self, image):
+        self.frame = image
+
+    def load(self, path):
+        """Shows an image file; files are decoded once and reused."""
+        if path not in self._cache:
+            with Image.open(path) as image:
+                self._cache[path] = image.convert("RGB")
+        self.frame = self._cache[path]
+
+    def grab(self, left, top, width, height, into=None):
+        if self.frame is None:
+            self.frame = Image.new("RGB", (width, height), (240, 240, 240))
+        frame = self.frame if self.frame.size == (width, height) else self.frame.resize((width, height))
+        if into is not None and into.size == frame.size:
+            into.paste(frame)
+            return into
+        # Workers draw on the grabbed image, so never hand out the cached frame itself
+        return frame.copy() if frame is self.frame else frame
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayWindows:
+    def __init__(self):
+        self.window = Window("Replay", 0, 0, 1280, 800)
+
+    def active_window(self):
+        return self.window
+
+
+class ReplayClipboard:
+    def __init__(self):
+        self.text = ""
+
+    def paste(self):
+        return self.text
+
+
+def replay_providers():
+    return Providers(screen=ReplayScreen(), windows=ReplayWindows(), clipboard=ReplayClipboard())
+
+
+def synthetic_frame(width, height, seed=0):
+    """A window-like image: title bar, panels and a row of buttons."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 30], fill=(30, 30, 60))
+    draw.text((10, 8), f"Setup Wizard - page {seed}", fill=(255, 255, 255))
+    for _ in range(12):
+        left = rng.randrange(0, max(1, width - 300))
+        top = rng.randrange(40, max(41, height - 120))
+        draw.rectangle([left, top, left + rng.randrange(80, 300), top + rng.randrange(24, 100)],
+                       fill=(rng.randrange(180, 255),) * 3, outline=(90, 90, 90))
+        draw.text((left + 6, top + 6), "Lorem ipsum %d" % rng.randrange(1000), fill=(20, 20, 20))
+    for index, label in enumerate(("< Back", "Next >", "Cancel")):
+        left = width - 330 + index * 105
+        draw.rectangle([left, height - 50, left + 95, height - 20], fill=(225, 225, 225), outline=(60, 60, 60))
+        draw.text((left + 25, height - 42), label, fill=(0, 0, 0))
+    return image
+
+
+def synthetic_script(steps=50, size=(1280, 800), windows=3, typed_every=5):
+    """Clicks through `windows` wizard windows, typing a path every `typed_every` steps."""
+    width, height = size
+    script = []
+    for step in range(steps):
+        window = step * windows // max(steps, 1)
+        if step == 0 or window != (step - 1) * windows // max(steps, 1):
+            script.append({"type": "window", "title": f"Setup Wizard {window}", "left": 0, "top": 0,
+                           "width": width, "height": height})
+        script.append({"type": "frame", "synthetic": step % 8})
+        if typed_every and step % typed_every == typed_every - 1:
+            for char in "C:\\Program Files\\Example":
+                script.append({"type": "key", "char": char})
+            script.append({"type": "key", "name": "tab"})
+        if step % 10 == 9:
+            script.append({"type": "clipboard", "text": "licence key 1234"})
+            script.append({"type": "key", "char": "v", "modifiers": ["ctrl"]})
+        script.append({"type": "click", "x": width - 190, "y": height - 35})
+    return script
+
+
+# Journal key labels back to key names ("Page Up" -> "page_up", "Windows Key" -> "cmd")
+KEY_NAMES = {label: name for name, label in KEY_LABELS.items()}
+KEY_NAMES.update({"Ctrl": "ctrl", "Alt": "alt", "Shift": "shift", "Windows Key": "cmd"})
+
+
+def journal_key_name(label):
+    """Maps a journal key label ("Enter", "Page Up", "Key.f5") back to its key name."""
+    if label.startswith("Key."):
+        return label[4:]
+    return KEY_NAMES.get(label, label.lower().replace(" ", "_"))
+
+
+def chord_to_key_event(keys, count=1):
+    """Script key event for a chord label such as "Ctrl+Shift+T"."""
+    *modifiers, last = keys.split("+")
+    event = {"type": "key", "modifiers": [KEY_NAMES[modifier] for modifier in modifiers]}
+    if len(last) == 1:
+        event["char"] = last.lower()
+    else:
+        event["name"] = journal_key_name(last)
+    if count > 1:
+        event["repeat"] = count
+    return event
+
+
+def session_to_script(journal_file):
+    """Turns a recorded session back into a script, using its saved screenshots as frames.
+
+    The screenshots already carry the click markers, so OCR and annotation
+    see slightly different pixels than during the original recording.
+    """
+    session_dir = os.path.dirname(journal_file)
+    script = []
+    for event in read_journal(journal_file):
+        kind = event.get("type")
+        if kind == "step":
+            image = resolve_image_path(event, session_dir)
+            if not image or not os.path.exists(image):
+                continue
+            with Image.open(image) as frame:
+                width, height = frame.size
+            # Text typed since the previous click is replayed before this one
+            script.extend({"type": "key", "char": char} for char in event.get("typed_text") or "")
+            script.append({"type": "window", "title": event.get("window_title", ""), "left": 0, "top": 0,
+                           "width": width, "height": height})
+            script.append({"type": "frame", "image": image})
+            script.append({"type": "click", "x": event.get("image_x", 0), "y": event.get("image_y", 0)})
+        elif kind == "typed":
+            script.extend({"type": "key", "char": char} for char in event["text"])
+            script.append({"type": "key", "name": "enter"})
+        elif kind == "key":
+            key_event = {"type": "key", "name": journal_key_name(event["key"])}
+            if event.get("count", 1) > 1:
+                key_event["repeat"] = event["count"]
+            script.append(key_event)
+        elif kind == "clipboard":
+            script.append({"type": "clipboard", "text": event["text"]})
+            script.append(chord_to_key_event("Ctrl+C" if event.get("action") == "copy" else "Ctrl+V"))
+        elif kind == "shortcut":
+            script.append(chord_to_key_event(event["keys"], event.get("count", 1)))
+    return script
+
+
+def load_script(path):
+    return list(read_journal(path))
+
+
+class ReplayDriver:
+    """Feeds a script through a recorder's on_click and on_key_press handlers.
+
+    The recorder must have been created with replay_providers() and started
+    with start_recording(listeners=False). Handler latencies are kept per
+    event kind in `latencies` (seconds).
+    """
+
+    def __init__(self, recorder, realtime=False):
+        self.recorder = recorder
+        self.providers = recorder.providers
+        self.realtime = realtime
+        self.latencies = {"click": [], "key": []}
+        self.events = 0
+        self.script_dir = ""
+        self._synthetic = {}
+
+    def run(self, script):
+        if isinstance(script, str):
+            self.script_dir = os.path.dirname(os.path.abspath(script))
+            script = load_script(script)
+        started = time.perf_counter()
+        for event in script:
+            self.dispatch(event)
+        return time.perf_counter() - started
+
+    def dispatch(self, event):
+        kind = event.get("type")
+        providers = self.providers
+        if kind == "window":
+            providers.windows.window = Window(event.get("title", ""), event.get("left", 0), event.get("top", 0),
+                                              event["width"], event["height"])
+        elif kind == "frame":
+            if "image" in event:
+                providers.screen.load(os.path.join(self.script_dir, event["image"]))
+            else:
+                window = providers.windows.window
+                key = (window.width, window.height, event.get("synthetic", 0))
+                if key not in self._synthetic:
+                    self._synthetic[key] = synthetic_frame(*key)
+                providers.screen.show(self._synthetic[key])
+        elif kind == "clipboard":
+            providers.clipboard.text = event["text"]
+        elif kind == "wait":
+            if self.realtime:
+                time.sleep(event["seconds"])
+        elif kind == "click":
+            window = providers.windows.window
+            x, y = window.left + event["x"], window.top + event["y"]
+            started = time.perf_counter()
+            self.recorder.on_click(x, y, None, True)
+            self.latencies["click"].append(time.perf_counter() - started)
+            self.recorder.on_click(x, y, None, False)
+            self.events += 1
+        elif kind == "key":
+            # Modifiers go down before the key and come up after it, like on a real keyboard
+            modifiers = [ReplayKey(name=name) for name in event.get("modifiers", ())]
+            key = ReplayKey(char=event.get("char"), name=event.get("name"))
+            for _ in range(event.get("repeat", 1)):
+                for modifier in modifiers:
+                    self.press(modifier)
+                self.press(key)
+                self.release(key)
+                for modifier in reversed(modifiers):
+                    self.release(modifier)
+
+    def press(self, key):
+        started = time.perf_counter()
+        self.recorder.on_key_press(key)
+        self.latencies["key"].append(time.perf_counter() - started)
+        self.events += 1
+
+    def release(self, key):
+        started = time.perf_counter()
+        self.recorder.on_key_release(key)
+        self.latencies["key"].append(time.perf_counter() - started)
+        self.events += 1
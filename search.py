@@ -0,0 +1,413 @@
+"""Full-text search over every recorded session.
+
+Usage: python search.py index ROOT [--rebuild]
+       python search.py query ROOT WORDS... [--limit 20] [--kind click] [--raw] [--thumbnails DIR] [--json]
+
+The index is an SQLite FTS5 table in ROOT/search_index.sqlite, next to the
+session folders. The recorder adds each session's window titles, clicked
+text, typed text, clipboard contents and shortcuts as they are journaled;
+"index" backfills sessions recorded before (or elsewhere), reading only the
+journal lines added since the last run, and drops sessions that are gone.
+Sessions recorded before the journal existed are read from their markdown.
+Every hit names its session, step and the step's screenshot.
+"""
+import argparse
+import io
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = "search_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE,
+                                     size INTEGER, mtime REAL, events INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, session INTEGER NOT NULL REFERENCES sessions (id),
+                                      step INTEGER, kind TEXT NOT NULL, image TEXT, text TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS documents_session ON documents (session);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    text, content='documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+"""
+
+# Steps commit right away; keystroke events in batches of this many
+COMMIT_EVERY = 64
+# Sessions indexed per transaction when backfilling
+BACKFILL_BATCH = 200
+# Matches ranked by relevance per query, newest first
+RANK_WINDOW = 500
+
+
+def event_documents(event):
+    """(kind, text) pairs worth searching for in one journal event."""
+    kind = event.get("type")
+    if kind == "step":
+        fields = (("window", event.get("window_title")), ("click", event.get("clicked_text")),
+                  ("typed", event.get("typed_text")))
+    elif kind == "typed":
+        fields = (("typed", event.get("text")),)
+    elif kind == "clipboard":
+        fields = (("clipboard", event.get("text")),)
+    elif kind == "shortcut":
+        fields = (("shortcut", " ".join(filter(None, (event.get("keys"), event.get("description"))))),)
+    else:
+        return []
+    return [(name, text) for name, text in fields if text and text.strip()]
+
+
+def match_expression(words):
+    """Quotes every word so user text never trips over FTS5 query syntax; all words must match."""
+    return " ".join('"%s"' % word.replace('"', '""') for word in words.split())
+
+
+class SearchResult:
+    """One matching field: which session and step it's in, and that step's screenshot."""
+
+    def __init__(self, session, step, kind, image, snippet, rank):
+        self.session = session
+        self.step = step
+        self.kind = kind
+        self.image = image
+        self.snippet = snippet
+        self.rank = rank
+
+    def image_path(self):
+        """The screenshot's path on disk, or None for sessions stored in a container."""
+        if not self.image or os.path.isfile(self.session):
+            return None
+        return os.path.join(self.session, self.image)
+
+    def open_image(self):
+        """The step's screenshot as a binary file, from either session layout."""
+        if os.path.isfile(self.session):
+            from container import SessionContainer
+            container = SessionContainer(self.session)
+            try:
+                with container.open_file(self.image) as blob:
+                    return io.BytesIO(blob.read())
+            finally:
+                container.close()
+        return open(self.image_path(), "rb")
+
+    def to_dict(self):
+        return {"session": self.session, "step": self.step, "kind": self.kind, "image": self.image,
+                "snippet": self.snippet, "rank": self.rank}
+
+
+class SearchIndex:
+    """The FTS5 index of one folder of sessions. Any number of processes may share it."""
+
+    def __init__(self, path):
+        self.path = path
+        # The pipeline's writer thread feeds it after the recorder created it
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def session_id(self, session_path):
+        session_path = os.path.abspath(session_path)
+        row = self.connection.execute("SELECT id FROM sessions WHERE path = ?", (session_path,)).fetchone()
+        if row:
+            return row[0]
+        return self.connection.execute("INSERT INTO sessions (path) VALUES (?)", (session_path,)).lastrowid
+
+    def add_events(self, session, events, step=None, image=None):
+        """Indexes events of the session with id `session`, continuing from step/image.
+
+        Text recorded after a step (typing, clipboard) is filed under that
+        step. Returns the step and image the next event continues from.
+        """
+        rows = []
+        count = 0
+        for event in events:
+            count += 1
+            if event.get("type") == "step":
+                step = event.get("step")
+                image = event.get("image")
+            rows.extend((session, step, kind, image, text) for kind, text in event_documents(event))
+        if rows:
+            self.connection.executemany("INSERT INTO documents (session, step, kind, image, text) "
+                                        "VALUES (?, ?, ?, ?, ?)", rows)
+            # The insert took the write lock until commit, so no other process can have added rows
+            # since: the newest len(rows) ids are the ones just inserted
+            last = self.connection.execute("SELECT MAX(id) FROM documents").fetchone()[0]
+            # One statement for the lot: row by row (as a trigger would), FTS5 flushes a segment per row
+            self.connection.execute("INSERT INTO documents_fts (rowid, text) SELECT id, text FROM documents "
+                                    "WHERE id > ?", (last - len(rows),))
+        self.connection.execute("UPDATE sessions SET events = events + ? WHERE id = ?", (count, session))
+        return step, image
+
+    def resume_point(self, session):
+        """Step and image the last indexed event of a session belongs to."""
+        row = self.connection.execute("SELECT step, image FROM documents WHERE session = ? AND step IS NOT NULL "
+                                      "ORDER BY id DESC LIMIT 1", (session,)).fetchone()
+        return row or (None, None)
+
+    def remove_documents(self, session):
+        self.connection.execute("INSERT INTO documents_fts (documents_fts, rowid, text) "
+                                "SELECT 'delete', id, text FROM documents WHERE session = ?", (session,))
+        self.connection.execute("DELETE FROM documents WHERE session = ?", (session,))
+
+    def remove_session(self, session):
+        self.remove_documents(session)
+        self.connection.execute("DELETE FROM sessions WHERE id = ?", (session,))
+
+    def move_session(self, old_path, new_path):
+        """Points a session's entries at its new location, after packing it into a container."""
+        stat = os.stat(new_path)
+        with self.connection:
+            self.connection.execute("UPDATE sessions SET path = ?, size = ?, mtime = ? WHERE path = ?",
+                                    (os.path.abspath(new_path), stat.st_size, stat.st_mtime,
+                                     os.path.abspath(old_path)))
+
+    def index_session(self, session_path, rebuild=False):
+        """Brings one session folder or container up to date. Returns the number of events read.
+
+        Sessions recorded before the journal are read from their markdown
+        file. Runs in the caller's transaction; backfill() commits sessions
+        in batches.
+        """
+        from batch_export import Session
+        from container import SessionContainer, session_image_name
+        from journal import read_journal
+
+        layout = Session(session_path)
+        source = layout.container_file or layout.journal_file or layout.markdown_file
+        if source is None:
+            raise ValueError(f"{session_path} has no journal or markdown file")
+        stat = os.stat(source)
+        session = self.session_id(session_path)
+        size, mtime, indexed = self.connection.execute(
+            "SELECT size, mtime, events FROM sessions WHERE id = ?", (session,)).fetchone()
+        if not rebuild and size == stat.st_size and mtime == stat.st_mtime:
+            return 0
+        # Journals only ever grow, so a longer one just has new lines at the end
+        append = not rebuild and source == layout.journal_file and size is not None and stat.st_size > size
+        if not append:
+            self.remove_documents(session)
+            self.connection.execute("UPDATE sessions SET events = 0 WHERE id = ?", (session,))
+            indexed = 0
+        step, image = self.resume_point(session) if append else (None, None)
+        if layout.container_file:
+            with SessionContainer(session_path) as container:
+                self.add_events(session, container.events())
+        elif source == layout.markdown_file:
+            from export import markdown_events
+            events = markdown_events(source)
+            # Their absolute screenshot paths go stale when the folder moves; find them like packing does
+            self.add_events(session, (dict(event, image=session_image_name(event["image"], session_path))
+                                      if event.get("image") else event for event in events))
+        else:
+            self.add_events(session, itertools.islice(read_journal(source), indexed, None), step, image)
+        self.connection.execute("UPDATE sessions SET size = ?, mtime = ? WHERE id = ?",
+                                (stat.st_size, stat.st_mtime, session))
+        return self.connection.execute("SELECT events FROM sessions WHERE id = ?", (session,)).fetchone()[0] - indexed
+
+    def backfill(self, root, rebuild=False, progress=None):
+        """Indexes every session under root and forgets sessions that no longer exist.
+
+        Returns (sessions seen, sessions updated, events read).
+        """
+        from batch_export import find_sessions
+
+        seen = set()
+        updated = events = 0
+        sessions = find_sessions(root)
+        for done, session in enumerate(sessions, 1):
+            seen.add(os.path.abspath(session.path))
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN")
+            # A session that can't be read is rolled back on its own, not with its batch
+            self.connection.execute("SAVEPOINT session")
+            try:
+                read = self.index_session(session.path, rebuild)
+            except (OSError, sqlite3.DatabaseError, ValueError) as e:
+                self.connection.execute("ROLLBACK TO session")
+                logger.warning("Couldn't index %s: %s", session.path, e)
+                read = 0
+            self.connection.execute("RELEASE session")
+            if read:
+                updated += 1
+                events += read
+            # Each commit flushes a new FTS segment, so fewer commits means fewer merges
+            if done % BACKFILL_BATCH == 0:
+                self.connection.commit()
+            if progress:
+                progress(done, len(sessions))
+        self.connection.commit()
+        if updated >= BACKFILL_BATCH:
+            # Merge the segments the batches left behind; queries read one b-tree per segment
+            with self.connection:
+                self.connection.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+        prefix = os.path.join(os.path.abspath(root), "")
+        with self.connection:
+            for session, path in self.connection.execute("SELECT id, path FROM sessions").fetchall():
+                if path.startswith(prefix) and path not in seen:
+                    self.remove_session(session)
+        return len(sessions), updated, events
+
+    def search(self, words, limit=20, kinds=None, raw=False):
+        """Best matches for `words` (all must match), as SearchResults.
+
+        raw=True passes `words` through as an FTS5 query (phrases, OR, NEAR,
+        prefix*). `kinds` limits the fields searched, e.g. ("click", "window").
+        Only the newest RANK_WINDOW matches are ranked, so a word found in
+        every session costs as much as one found in a few thousand.
+        """
+        query = words if raw else match_expression(words)
+        if not query:
+            return []
+        tables = "documents_fts JOIN documents ON documents.id = documents_fts.rowid"
+        where = "WHERE documents_fts MATCH ?"
+        parameters = [query]
+        if kinds:
+            where += " AND documents.kind IN (%s)" % ", ".join("?" * len(kinds))
+            parameters.extend(kinds)
+        # Walking the matches newest first is cheap; scoring all of them is not
+        oldest = self.connection.execute(
+            "SELECT documents_fts.rowid FROM %s %s ORDER BY documents_fts.rowid DESC LIMIT 1 OFFSET ?"
+            % (tables, where), parameters + [max(RANK_WINDOW, limit) - 1]).fetchone()
+        if oldest:
+            where += " AND documents_fts.rowid >= ?"
+            parameters.append(oldest[0])
+        ranked = self.connection.execute(
+            "SELECT documents_fts.rowid, bm25(documents_fts) FROM %s %s "
+            "ORDER BY bm25(documents_fts), documents_fts.rowid DESC LIMIT ?" % (tables, where),
+            parameters + [limit]).fetchall()
+        if not ranked:
+            return []
+        # Snippets are the slow part, so only the hits that are returned get one
+        results = []
+        for rowid, rank in ranked:
+            row = self.connection.execute(
+                "SELECT sessions.path, documents.step, documents.kind, documents.image, "
+                "snippet(documents_fts, 0, '[', ']', '...', 12) FROM %s "
+                "JOIN sessions ON sessions.id = documents.session "
+                "WHERE documents_fts MATCH ? AND documents_fts.rowid = ?" % tables, (query, rowid)).fetchone()
+            results.append(SearchResult(*row, rank))
+        return results
+
+    def stats(self):
+        sessions = self.connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        documents = self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {"sessions": sessions, "documents": documents}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class SessionIndexer:
+    """Adds one session's events to the index as the journal writer appends them.
+
+    Steps are committed right away so a search during recording finds them;
+    keystroke events are committed in batches and on close().
+    """
+
+    def __init__(self, index, session_dir):
+        self.index = index
+        with index.connection:
+            self.session = index.session_id(session_dir)
+        self.step = None
+        self.image = None
+        self.uncommitted = 0
+
+    def add(self, event):
+        self.step, self.image = self.index.add_events(self.session, [event], self.step, self.image)
+        self.uncommitted += 1
+        if event.get("type") == "step" or self.uncommitted >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.index.connection.commit()
+        self.uncommitted = 0
+
+    def close(self, journal_file=None):
+        """Commits the rest; with the journal given, marks it as fully indexed so backfill skips it."""
+        if journal_file and os.path.exists(journal_file):
+            stat = os.stat(journal_file)
+            self.index.connection.execute("UPDATE sessions SET size = ?, mtime = ? WHERE id = ?",
+                                          (stat.st_size, stat.st_mtime, self.session))
+        self.commit()
+
+
+def write_thumbnail(result, folder, width=240):
+    """Saves a small JPEG of the hit's screenshot into folder and returns its path."""
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    name = "%s-step%s.jpg" % (os.path.basename(os.path.normpath(result.session)), result.step)
+    target = os.path.join(folder, name)
+    if not os.path.exists(target):
+        with result.open_image() as f, Image.open(f) as image:
+            image.thumbnail((width, width * 4))
+            image.convert("RGB").save(target, format="JPEG", quality=80)
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    index_command = commands.add_parser("index", help="index new and changed sessions under ROOT")
+    index_command.add_argument("root")
+    index_command.add_argument("--rebuild", action="store_true", help="reindex every session from scratch")
+    query_command = commands.add_parser("query", help="search the sessions under ROOT")
+    query_command.add_argument("root")
+    query_command.add_argument("words", nargs="+")
+    query_command.add_argument("--limit", type=int, default=20)
+    query_command.add_argument("--kind", action="append",
+                               choices=("window", "click", "typed", "clipboard", "shortcut"),
+                               help="only search this field (repeatable)")
+    query_command.add_argument("--raw", action="store_true", help="WORDS is an FTS5 query")
+    query_command.add_argument("--thumbnails", help="write a thumbnail of each hit's screenshot here")
+    query_command.add_argument("--json", action="store_true", help="one JSON object per hit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    with SearchIndex(os.path.join(args.root, INDEX_FILE_NAME)) as index:
+        if args.command == "index":
+            started = time.perf_counter()
+            seen, updated, events = index.backfill(args.root, args.rebuild)
+            stats = index.stats()
+            print(f"{seen} sessions, {updated} updated ({events} events) in {time.perf_counter() - started:.1f} s; "
+                  f"{stats['documents']} entries indexed")
+            return 0
+
+        started = time.perf_counter()
+        try:
+            results = index.search(" ".join(args.words), args.limit, args.kind, args.raw)
+        except sqlite3.OperationalError as e:  # A malformed --raw query
+            parser.error(str(e))
+        elapsed = time.perf_counter() - started
+        for result in results:
+            thumbnail = None
+            if args.thumbnails and result.image:
+                try:
+                    thumbnail = write_thumbnail(result, args.thumbnails)
+                except OSError as e:  # Deduplicated frames only exist once the session is exported
+                    logger.warning("No thumbnail for %s step %s: %s", result.session, result.step, e)
+            if args.json:
+                print(json.dumps(dict(result.to_dict(), thumbnail=thumbnail), ensure_ascii=False))
+            else:
+                print(f"{result.session}  step {result.step}  [{result.kind}] {result.snippet}"
+                      f"  {thumbnail or result.image_path() or result.image or ''}")
+        if not args.json:
+            print(f"{len(results)} hits in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
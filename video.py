@@ -0,0 +1,187 @@
+import bisect
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+VIDEO_FILE_NAME = "recording.mp4"
+WINDOWS_FFMPEG = 'C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe'
+
+
+def find_ffmpeg():
+    """Returns the ffmpeg executable, or None if it isn't installed."""
+    if os.path.exists(WINDOWS_FFMPEG):
+        return WINDOWS_FFMPEG
+    return shutil.which("ffmpeg")
+
+
+class VideoRecorder:
+    """Records a screen region continuously to a video file.
+
+    A dedicated capture thread grabs the region `fps` times a second into a
+    small pool of preallocated buffers, and an encoder thread streams the raw
+    frames into ffmpeg's stdin, so memory stays bounded by `max_queue` frames
+    no matter how long the recording runs. When the encoder falls behind,
+    frames are dropped (and counted) instead of queueing up.
+
+    The capture time of every written frame is kept, so events can be mapped
+    to the frame on screen when they happened (frame_index) and are saved
+    next to the video as <video>.frames.json.
+    """
+
+    def __init__(self, path, screen, region, fps=10, ffmpeg_path=None, max_queue=8, crf=28,
+                 preset="ultrafast"):
+        self.path = path
+        self.screen = screen
+        # yuv420p needs even dimensions
+        left, top, width, height = region
+        self.region = (left, top, width - width % 2, height - height % 2)
+        self.fps = fps
+        self.ffmpeg_path = ffmpeg_path or find_ffmpeg()
+        self.max_queue = max_queue
+        self.crf = crf
+        self.preset = preset
+        self.process = None
+        # Bounded by the buffer pool: a frame is only queued once it has a free buffer
+        self.frames = queue.Queue()
+        self.free_buffers = queue.Queue()
+        self.frame_times = []
+        self.captured = 0
+        self.dropped = 0
+        self.late = 0
+        self.capture_cpu = 0.0
+        self.encoder_cpu = 0.0
+        self.ffmpeg_cpu = None
+        self.failed = False
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._capture_thread = None
+        self._encoder_thread = None
+
+    def start(self):
+        if self.ffmpeg_path is None:
+            raise RuntimeError(f"ffmpeg not found at {WINDOWS_FFMPEG} or on PATH")
+        _, _, width, height = self.region
+        command = [
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+            "-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf), "-pix_fmt", "yuv420p",
+            # A keyframe every second keeps seeking to any click's frame cheap
+            "-g", str(self.fps), self.path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        for _ in range(self.max_queue + 2):
+            self.free_buffers.put(Image.new("RGB", (width, height)))
+        self.started_at = time.time()
+        self._encoder_thread = threading.Thread(target=self._encode, name="video-encoder", daemon=True)
+        self._encoder_thread.start()
+        self._capture_thread = threading.Thread(target=self._capture, name="video-capture", daemon=True)
+        self._capture_thread.start()
+        logger.info("Recording video of %s at %d fps to %s", self.region, self.fps, self.path)
+
+    def frame_index(self, timestamp=None):
+        """Index of the last frame captured at or before `timestamp` (now by default), or None."""
+        index = bisect.bisect_right(self.frame_times, time.time() if timestamp is None else timestamp) - 1
+        return index if index >= 0 else None
+
+    def _capture(self):
+        interval = 1.0 / self.fps
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                buffer = self.free_buffers.get_nowait()
+            except queue.Empty:
+                buffer = None
+            if buffer is None:
+                self.dropped += 1  # Encoder is behind and every buffer is in use
+            else:
+                try:
+                    self.screen.grab(*self.region, into=buffer)
+                    captured_at = time.time()
+                    self.frames.put((buffer, captured_at))
+                    self.frame_times.append(captured_at)
+                    self.captured += 1
+                except Exception:
+                    logger.exception("Error capturing video frame")
+                    self.free_buffers.put(buffer)
+            deadline += interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Grabbing took longer than a frame: skip the ticks we missed
+                missed = int(-delay / interval)
+                self.late += missed
+                deadline += missed * interval
+        self.capture_cpu = time.thread_time()
+        self.frames.put((None, None))
+        try:
+            self.screen.release()  # This thread's grabber handle, which nothing else can close
+        except Exception:
+            logger.exception("Error releasing the video capture handle")
+
+    def _encode(self):
+        while True:
+            buffer, _ = self.frames.get()
+            if buffer is None:
+                break
+            try:
+                if not self.failed:
+                    self.process.stdin.write(buffer.tobytes())
+            except OSError as e:
+                logger.error("ffmpeg stopped accepting frames: %s", e)
+                self.failed = True
+                self._stop.set()
+            finally:
+                self.free_buffers.put(buffer)
+        self.encoder_cpu = time.thread_time()
+
+    def stop(self):
+        """Stops capturing, waits for ffmpeg to finish the file and returns the stats."""
+        if self._capture_thread is None:
+            return self.stats()
+        self._stop.set()
+        self._capture_thread.join()
+        self._encoder_thread.join()
+        self.stopped_at = time.time()
+        cpu_before = os.times()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        cpu_after = os.times()
+        if os.name != "nt":
+            # Child CPU time is only reported on Unix
+            self.ffmpeg_cpu = (cpu_after.children_user - cpu_before.children_user
+                               + cpu_after.children_system - cpu_before.children_system)
+        self._capture_thread = None
+        with open(self.path + ".frames.json", "w", encoding="utf-8") as f:
+            json.dump({"fps": self.fps, "region": self.region, "frame_times": self.frame_times}, f)
+        stats = self.stats()
+        logger.info("Video: %d frames written, %d dropped, %d late ticks; CPU capture %.1f s, "
+                    "encoder %.1f s, ffmpeg %s", stats["frames"], stats["dropped"], stats["late"],
+                    stats["capture_cpu_s"], stats["encoder_cpu_s"],
+                    "n/a" if stats["ffmpeg_cpu_s"] is None else f"{stats['ffmpeg_cpu_s']:.1f} s")
+        return stats
+
+    def stats(self):
+        duration = ((self.stopped_at or time.time()) - self.started_at) if self.started_at else 0
+        return {
+            "frames": self.captured,
+            "dropped": self.dropped,
+            "late": self.late,
+            "duration_s": round(duration, 3),
+            "capture_cpu_s": round(self.capture_cpu, 3),
+            "encoder_cpu_s": round(self.encoder_cpu, 3),
+            "ffmpeg_cpu_s": None if self.ffmpeg_cpu is None else round(self.ffmpeg_cpu, 3),
+        }